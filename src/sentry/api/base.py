@@ -183,6 +183,8 @@ class Endpoint(APIView):
             response['X-Hits'] = cursor_result.hits
         if cursor_result.max_hits is not None:
             response['X-Max-Hits'] = cursor_result.max_hits
+        if cursor_result.hits_estimated:
+            response['X-Hits-Estimated'] = '1'
         response['Link'] = ', '.join(
             [
                 self.build_cursor_link(
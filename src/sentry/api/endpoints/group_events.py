@@ -6,7 +6,7 @@ from sentry import tagstore
 from sentry.api.base import DocSection, EnvironmentMixin
 from sentry.api.bases import GroupEndpoint
 from sentry.api.serializers import serialize
-from sentry.api.paginator import DateTimePaginator
+from sentry.api.paginator import DateTimeKeysetPaginator
 from sentry.models import Environment, Event, Group
 from sentry.search.utils import parse_query
 from sentry.utils.apidocs import scenario, attach_scenarios
@@ -78,5 +78,5 @@ class GroupEventsEndpoint(GroupEndpoint, EnvironmentMixin):
             queryset=events,
             order_by='-datetime',
             on_results=lambda x: serialize(x, request.user),
-            paginator_cls=DateTimePaginator,
+            paginator_cls=DateTimeKeysetPaginator,
         )
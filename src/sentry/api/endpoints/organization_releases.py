@@ -8,7 +8,7 @@ from .project_releases import ReleaseSerializer
 from sentry.api.base import DocSection, EnvironmentMixin
 from sentry.api.bases.organization import OrganizationReleasesBaseEndpoint
 from sentry.api.exceptions import InvalidRepository
-from sentry.api.paginator import OffsetPaginator
+from sentry.api.paginator import DateTimeKeysetPaginator
 from sentry.api.serializers import serialize
 from sentry.api.serializers.rest_framework import (
     ReleaseHeadCommitSerializer, ReleaseHeadCommitSerializerDeprecated, ListField
@@ -96,7 +96,7 @@ class OrganizationReleasesEndpoint(OrganizationReleasesBaseEndpoint, Environment
             request=request,
             queryset=queryset,
             order_by='-sort',
-            paginator_cls=OffsetPaginator,
+            paginator_cls=DateTimeKeysetPaginator,
             on_results=lambda x: serialize(x, request.user),
         )
 
@@ -3,7 +3,7 @@ from __future__ import absolute_import
 from sentry.api.base import DocSection
 from sentry.api.bases.project import ProjectEndpoint
 from sentry.api.serializers import serialize
-from sentry.api.paginator import DateTimePaginator
+from sentry.api.paginator import DateTimeKeysetPaginator
 from sentry.models import Event
 from sentry.utils.apidocs import scenario, attach_scenarios
 
@@ -50,5 +50,5 @@ class ProjectEventsEndpoint(ProjectEndpoint):
             queryset=events,
             order_by='-datetime',
             on_results=lambda x: serialize(x, request.user),
-            paginator_cls=DateTimePaginator,
+            paginator_cls=DateTimeKeysetPaginator,
         )
@@ -18,7 +18,7 @@ from sentry.api.fields import ActorField, Actor
 from sentry.api.serializers import serialize
 from sentry.api.serializers.models.actor import ActorSerializer
 from sentry.api.serializers.models.group import (
-    SUBSCRIPTION_REASON_MAP, StreamGroupSerializer)
+    SUBSCRIPTION_REASON_MAP, StreamGroupSerializer, clear_user_state_cache)
 from sentry.constants import DEFAULT_SORT_OPTION
 from sentry.db.models.query import create_or_update
 from sentry.models import (
@@ -758,6 +758,11 @@ class ProjectGroupIndexEndpoint(ProjectEndpoint, EnvironmentMixin):
                 user=acting_user,
             ).delete()
 
+        if acting_user is not None and (
+            result.get('hasSeen') is not None or result.get('isBookmarked') is not None
+        ):
+            clear_user_state_cache(acting_user.id, group_ids)
+
         # TODO(dcramer): we could make these more efficient by first
         # querying for rich rows are present (if N > 2), flipping the flag
         # on those rows, and then creating the missing rows
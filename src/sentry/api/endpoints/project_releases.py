@@ -7,7 +7,7 @@ from rest_framework.response import Response
 
 from sentry.api.base import EnvironmentMixin
 from sentry.api.bases.project import ProjectEndpoint, ProjectReleasePermission
-from sentry.api.paginator import OffsetPaginator
+from sentry.api.paginator import DateTimeKeysetPaginator
 from sentry.api.fields.user import UserField
 from sentry.api.serializers import serialize
 from sentry.api.serializers.rest_framework import CommitSerializer, ListField
@@ -81,7 +81,7 @@ class ProjectReleasesEndpoint(ProjectEndpoint, EnvironmentMixin):
             request=request,
             queryset=queryset,
             order_by='-sort',
-            paginator_cls=OffsetPaginator,
+            paginator_cls=DateTimeKeysetPaginator,
             on_results=lambda x: serialize(x, request.user, project=project),
         )
 
@@ -7,14 +7,20 @@ sentry.api.paginator
 """
 from __future__ import absolute_import
 
+import calendar
 import math
 
-from datetime import datetime
+import six
+from datetime import datetime, timedelta
 from django.db import connections
+from django.db.models import Q
 from django.db.models.sql.datastructures import EmptyResultSet
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
+from sentry.utils import json
 from sentry.utils.cursors import build_cursor, Cursor, CursorResult
+from sentry.utils.db import is_postgres
 
 quote_name = connections['default'].ops.quote_name
 
@@ -220,3 +226,153 @@ class OffsetPaginator(BasePaginator):
             next=next_cursor,
             prev=prev_cursor,
         )
+
+
+class KeysetPaginator(BasePaginator):
+    """
+    Pages through results ordered by their key and their id, where the cursor
+    is the key and id of the last (or, for the previous page, the first)
+    result of a page. Every page is a range query on ``(key, id)``, so deep
+    pages cost the same as the first one.
+
+    Cursors are ``key:id:is_prev``, so the key has to be an integer (see
+    ``DateTimeKeysetPaginator`` for dates).
+
+    If there are more than ``max_hits`` results, the number of hits is
+    estimated (see ``estimate_hits``).
+    """
+
+    def get_item_key(self, item, for_prev=False):
+        return int(getattr(item, self.key))
+
+    def value_from_cursor(self, cursor):
+        return cursor.value
+
+    def _build_queryset(self, cursor):
+        queryset = self.queryset
+        asc = self._is_asc(cursor.is_prev)
+        if asc:
+            queryset = queryset.order_by(self.key, 'id')
+        else:
+            queryset = queryset.order_by('-%s' % self.key, '-id')
+
+        # an unset cursor (the first page) has no id
+        if not cursor.offset:
+            return queryset
+
+        value = self.value_from_cursor(cursor)
+        op = '>' if asc else '<'
+        # the key is also bounded on its own, which lets the database use an
+        # index range for the key
+        if self.key in queryset.query.extra:
+            col_query, col_params = queryset.query.extra[self.key]
+            id_col = '%s.%s' % (quote_name(queryset.model._meta.db_table), quote_name('id'))
+            return queryset.extra(
+                where=[
+                    '{col} {op}= %s AND ({col} {op} %s OR ({col} = %s AND {id} {op} %s))'.format(
+                        col=col_query, op=op, id=id_col,
+                    ),
+                ],
+                params=(
+                    list(col_params) + [value] + list(col_params) + [value] +
+                    list(col_params) + [value, cursor.offset]
+                ),
+            )
+
+        lookup = 'gt' if asc else 'lt'
+        return queryset.filter(
+            Q(**{'%s__%se' % (self.key, lookup): value}),
+            Q(**{'%s__%s' % (self.key, lookup): value}) |
+            Q(**{self.key: value, 'id__%s' % lookup: cursor.offset}),
+        )
+
+    def _get_cursor(self, item, is_prev, has_results):
+        return Cursor(self.get_item_key(item), item.id, is_prev, has_results)
+
+    def get_result(self, limit=100, cursor=None, count_hits=False):
+        if cursor is None:
+            cursor = Cursor(0, 0, 0)
+
+        limit = min(limit, self.max_limit)
+
+        hits_estimated = False
+        if count_hits:
+            max_hits = 1000
+            hits = self.count_hits(max_hits)
+            if hits >= max_hits:
+                estimate = self.estimate_hits()
+                if estimate is not None and estimate > hits:
+                    hits, hits_estimated = estimate, True
+        else:
+            hits = None
+            max_hits = None
+
+        # The + 1 is needed to know if there is another page.
+        results = list(self._build_queryset(cursor)[:limit + 1])
+        has_more = len(results) > limit
+        results = results[:limit]
+
+        has_cursor = bool(cursor.offset)
+        if not cursor.is_prev:
+            if results:
+                next_cursor = self._get_cursor(results[-1], False, has_more)
+                prev_cursor = self._get_cursor(results[0], True, has_cursor)
+            else:
+                next_cursor = Cursor(cursor.value, cursor.offset, False, False)
+                prev_cursor = Cursor(cursor.value, cursor.offset, True, has_cursor)
+        else:
+            results.reverse()
+            if results:
+                next_cursor = self._get_cursor(results[-1], False, True)
+                prev_cursor = self._get_cursor(results[0], True, has_more)
+            else:
+                # nothing comes before the cursor, so the next page is the
+                # first one
+                next_cursor = Cursor(0, 0, False, has_cursor)
+                prev_cursor = Cursor(cursor.value, cursor.offset, True, False)
+
+        return CursorResult(
+            results=results,
+            next=next_cursor,
+            prev=prev_cursor,
+            hits=hits,
+            max_hits=max_hits,
+            hits_estimated=hits_estimated,
+        )
+
+    def estimate_hits(self):
+        """
+        Returns the number of results estimated by the query planner, which
+        is only available on Postgres (``None`` otherwise).
+        """
+        if not is_postgres(self.queryset.db):
+            return None
+
+        hits_query = self.queryset.values('id').query
+        hits_query.clear_ordering(force_empty=True)
+        try:
+            h_sql, h_params = hits_query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        cursor = connections[self.queryset.db].cursor()
+        cursor.execute(u'EXPLAIN (FORMAT JSON) {}'.format(h_sql), h_params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, six.string_types):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class DateTimeKeysetPaginator(KeysetPaginator):
+    # the cursors keep the dates in microseconds, so that they are exact
+    multiplier = 1000000
+
+    def get_item_key(self, item, for_prev=False):
+        value = getattr(item, self.key)
+        # dates of extra selects aren't converted on SQLite
+        if isinstance(value, six.string_types):
+            value = parse_datetime(value)
+        return calendar.timegm(value.utctimetuple()) * self.multiplier + value.microsecond
+
+    def value_from_cursor(self, cursor):
+        return datetime(1970, 1, 1, tzinfo=timezone.utc) + \
+            timedelta(microseconds=cursor.value)
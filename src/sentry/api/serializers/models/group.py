@@ -1,7 +1,10 @@
 from __future__ import absolute_import, print_function
 
 import itertools
+import os
+import threading
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta
 
 import six
@@ -19,6 +22,7 @@ from sentry.models import (
     GroupShare, GroupStatus, GroupSubscription, GroupSubscriptionReason, User, UserOption,
     UserOptionValue
 )
+from sentry.utils.cache import cache
 from sentry.utils.db import attach_foreignkey
 from sentry.utils.http import absolute_uri
 from sentry.utils.safe import safe_execute
@@ -34,6 +38,37 @@ SUBSCRIPTION_REASON_MAP = {
 
 disabled = object()
 
+# the bookmarks and seen dates of a user are cached briefly, as the stream is
+# fetched repeatedly while it is open
+USER_STATE_CACHE_TTL = 60
+
+# the threads which fetch the stats of groups are kept per process
+STATS_CONCURRENCY = 4
+_stats_executor = None
+_stats_executor_lock = threading.Lock()
+
+
+def get_stats_executor():
+    global _stats_executor
+    pid = os.getpid()
+    with _stats_executor_lock:
+        # a forked process has to start its own threads
+        if _stats_executor is None or _stats_executor[0] != pid:
+            _stats_executor = (pid, ThreadPoolExecutor(STATS_CONCURRENCY))
+        return _stats_executor[1]
+
+
+def get_user_state_cache_key(user_id, group_id):
+    return 'group-user-state:{}:{}'.format(user_id, group_id)
+
+
+def clear_user_state_cache(user_id, group_ids):
+    """
+    Clears the cached bookmarks and seen dates of a user for the given groups,
+    which has to happen when they change.
+    """
+    cache.delete_many([get_user_state_cache_key(user_id, group_id) for group_id in group_ids])
+
 
 @register(Group)
 class GroupSerializer(Serializer):
@@ -113,31 +148,73 @@ class GroupSerializer(Serializer):
 
         return results
 
-    def get_attrs(self, item_list, user):
-        from sentry.plugins import plugins
-
-        GroupMeta.objects.populate_cache(item_list)
-
-        attach_foreignkey(item_list, Group.project)
+    def _get_user_states(self, item_list, user):
+        """
+        Returns the set of group IDs bookmarked by the provided user, and a
+        mapping of group IDs to the time the user last saw them, which are
+        cached for ``USER_STATE_CACHE_TTL`` seconds.
+        """
+        cache_keys = {
+            get_user_state_cache_key(user.id, group.id): group.id
+            for group in item_list
+        }
+        states = {
+            cache_keys[key]: state
+            for key, state in six.iteritems(cache.get_many(cache_keys.keys()))
+        }
 
-        if user.is_authenticated() and item_list:
+        missing = [group.id for group in item_list if group.id not in states]
+        if missing:
             bookmarks = set(
                 GroupBookmark.objects.filter(
                     user=user,
-                    group__in=item_list,
+                    group__in=missing,
                 ).values_list('group_id', flat=True)
             )
             seen_groups = dict(
                 GroupSeen.objects.filter(
                     user=user,
-                    group__in=item_list,
+                    group__in=missing,
                 ).values_list('group_id', 'last_seen')
             )
+            missing_states = {
+                group_id: (group_id in bookmarks, seen_groups.get(group_id))
+                for group_id in missing
+            }
+            cache.set_many({
+                get_user_state_cache_key(user.id, group_id): state
+                for group_id, state in six.iteritems(missing_states)
+            }, USER_STATE_CACHE_TTL)
+            states.update(missing_states)
+
+        return (
+            set(group_id for group_id, (is_bookmarked, _) in six.iteritems(states) if is_bookmarked),
+            {
+                group_id: last_seen for group_id, (_, last_seen) in six.iteritems(states)
+                if last_seen is not None
+            },
+        )
+
+    def get_attrs(self, item_list, user):
+        from sentry.plugins import plugins
+
+        GroupMeta.objects.populate_cache(item_list)
+
+        attach_foreignkey(item_list, Group.project)
+
+        if user.is_authenticated() and item_list:
+            bookmarks, seen_groups = self._get_user_states(item_list, user)
             subscriptions = self._get_subscriptions(item_list, user)
+            member_organization_ids = set(
+                user.get_orgs().filter(
+                    id__in=set(group.project.organization_id for group in item_list),
+                ).values_list('id', flat=True)
+            )
         else:
             bookmarks = set()
             seen_groups = {}
             subscriptions = defaultdict(lambda: (False, None))
+            member_organization_ids = set()
 
         assignees = {
             a.group_id: a.assigned_actor() for a in
@@ -249,6 +326,7 @@ class GroupSerializer(Serializer):
                 'resolution': resolution,
                 'resolution_actor': resolution_actor,
                 'share_id': share_ids.get(item.id),
+                'is_member': item.project.organization_id in member_organization_ids,
                 'times_seen': times_seen.get(item.id, 0),
                 'first_seen': first_seen.get(item.id),  # TODO: missing?
                 'last_seen': last_seen.get(item.id),
@@ -307,7 +385,7 @@ class GroupSerializer(Serializer):
 
         # If user is not logged in and member of the organization,
         # do not return the permalink which contains private information i.e. org name.
-        if user.is_authenticated() and user.get_orgs().filter(id=obj.organization.id).exists():
+        if attrs['is_member']:
             permalink = absolute_uri(
                 reverse('sentry-group', args=[obj.organization.slug, obj.project.slug, obj.id])
             )
@@ -379,33 +457,45 @@ class StreamGroupSerializer(GroupSerializer):
         self.stats_period = stats_period
         self.matching_event_id = matching_event_id
 
-    def get_attrs(self, item_list, user):
-        attrs = super(StreamGroupSerializer, self).get_attrs(item_list, user)
+    def _get_stats(self, item_list):
+        """
+        Returns a future of the mapping of group IDs to their stats, which
+        are fetched from tsdb in the background.
+        """
+        # we need to compute stats at 1d (1h resolution), and 14d
+        group_ids = [g.id for g in item_list]
+
+        segments, interval = self.STATS_PERIOD_CHOICES[self.stats_period]
+        now = timezone.now()
+        query_params = {
+            'start': now - ((segments - 1) * interval),
+            'end': now,
+            'rollup': int(interval.total_seconds()),
+        }
 
-        if self.stats_period:
-            # we need to compute stats at 1d (1h resolution), and 14d
-            group_ids = [g.id for g in item_list]
-
-            segments, interval = self.STATS_PERIOD_CHOICES[self.stats_period]
-            now = timezone.now()
-            query_params = {
-                'start': now - ((segments - 1) * interval),
-                'end': now,
-                'rollup': int(interval.total_seconds()),
-            }
+        try:
+            environment = self.environment_func()
+        except Environment.DoesNotExist:
+            stats = Future()
+            stats.set_result({key: tsdb.make_series(0, **query_params) for key in group_ids})
+            return stats
+
+        return get_stats_executor().submit(
+            tsdb.get_range,
+            model=tsdb.models.group,
+            keys=group_ids,
+            environment_id=environment and environment.id,
+            **query_params
+        )
 
-            try:
-                environment = self.environment_func()
-            except Environment.DoesNotExist:
-                stats = {key: tsdb.make_series(0, **query_params) for key in group_ids}
-            else:
-                stats = tsdb.get_range(
-                    model=tsdb.models.group,
-                    keys=group_ids,
-                    environment_id=environment and environment.id,
-                    **query_params
-                )
+    def get_attrs(self, item_list, user):
+        # the stats are fetched while the other attributes are queried
+        stats = self._get_stats(item_list) if self.stats_period else None
+
+        attrs = super(StreamGroupSerializer, self).get_attrs(item_list, user)
 
+        if stats is not None:
+            stats = stats.result()
             for item in item_list:
 
                 attrs[item].update({
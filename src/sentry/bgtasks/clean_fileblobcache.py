@@ -0,0 +1,9 @@
+from __future__ import absolute_import
+
+from sentry.bgtasks.api import bgtask
+from sentry.models.file import blob_cache
+
+
+@bgtask()
+def clean_fileblobcache():
+    blob_cache.clear_old_entries()
@@ -10,6 +10,9 @@ from __future__ import absolute_import
 import logging
 import six
 
+from collections import defaultdict, OrderedDict
+from functools import partial
+from django.db import connections, router
 from django.db.models import F
 
 from sentry.signals import buffer_incr_complete
@@ -71,3 +74,112 @@ class Buffer(Service):
             created=created,
             sender=model,
         )
+
+    def process_many(self, items):
+        """
+        Applies a batch of ``(model, columns, filters, extra)`` updates.
+
+        Updates of the same model which increment the same columns and only
+        filter on a single column are issued as one ``UPDATE``, which adds
+        the amounts of every row and sets its extra values with a ``CASE`` on
+        the filter column. Several updates of the same row are merged, and
+        the extra values of the latest one win. Everything else, including
+        rows which do not exist yet, goes through ``process``. Only integer
+        filter values are grouped so that they can be compared with what the
+        database returns.
+        """
+        # subclasses are free to change the signature of ``process``, so
+        # always go through the database implementation here
+        process = partial(Buffer.process, self)
+
+        groups = defaultdict(OrderedDict)
+        for model, columns, filters, extra in items:
+            column, value = list(filters.items())[0] if len(filters) == 1 else (None, None)
+            if not isinstance(value, six.integer_types):
+                process(model, columns, filters, extra)
+                continue
+
+            rows = groups[(model, column, frozenset(columns))]
+            if value in rows:
+                amounts, values = rows.pop(value)
+                columns = dict((c, amounts[c] + v) for c, v in six.iteritems(columns))
+                values.update(extra or {})
+                extra = values
+            rows[value] = (columns, dict(extra or {}))
+
+        for (model, column, _), rows in six.iteritems(groups):
+            if len(rows) == 1:
+                (value, (columns, extra)), = rows.items()
+                process(model, columns, {column: value}, extra)
+                continue
+
+            lookup = '{}__in'.format(column)
+            existing = set(
+                model.objects.filter(**{lookup: list(rows)}).values_list(column, flat=True)
+            )
+            if existing:
+                self._update_many(model, column, [
+                    (key, row) for key, row in six.iteritems(rows) if key in existing
+                ])
+
+            for value, (columns, extra) in six.iteritems(rows):
+                if value not in existing:
+                    process(model, columns, {column: value}, extra)
+                    continue
+
+                buffer_incr_complete.send_robust(
+                    model=model,
+                    columns=columns,
+                    filters={column: value},
+                    extra=extra,
+                    created=False,
+                    sender=model,
+                )
+
+    def _update_many(self, model, column, rows):
+        """
+        Applies the ``(value, (columns, extra))`` rows, which are selected by
+        their value of ``column`` and all increment the same columns, with a
+        single ``UPDATE``.
+        """
+        connection = connections[router.db_for_write(model)]
+        qn = connection.ops.quote_name
+        opts = model._meta
+
+        key = qn((opts.pk if column == 'pk' else opts.get_field(column)).column)
+
+        assignments = []
+        params = []
+        for name in sorted(rows[0][1][0]):
+            col = qn(opts.get_field(name).column)
+            whens = []
+            for value, (columns, _) in rows:
+                whens.append('WHEN %s THEN %s')
+                params.extend([value, columns[name]])
+            assignments.append(u'{0} = {0} + CASE {1} {2} END'.format(col, key, ' '.join(whens)))
+
+        # rows without an extra value keep their current one
+        for name in sorted(set(name for _, (_, extra) in rows for name in extra)):
+            field = opts.get_field(name)
+            col = qn(field.column)
+            whens = []
+            for value, (_, extra) in rows:
+                if name in extra:
+                    whens.append('WHEN %s THEN %s')
+                    params.extend([
+                        value,
+                        field.get_db_prep_save(extra[name], connection=connection),
+                    ])
+            assignments.append(u'{0} = CASE {1} {2} ELSE {0} END'.format(
+                col, key, ' '.join(whens)))
+
+        params.extend(value for value, _ in rows)
+        sql = u'UPDATE {} SET {} WHERE {} IN ({})'.format(
+            qn(opts.db_table),
+            ', '.join(assignments),
+            key,
+            ', '.join(['%s'] * len(rows)),
+        )
+
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
@@ -0,0 +1,213 @@
+"""
+sentry.buffer.coalescing
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import atexit
+import os
+import six
+import threading
+import weakref
+
+from time import time
+
+from django.db import models
+
+from sentry.buffer import Buffer
+from sentry.utils import metrics
+from sentry.utils.imports import import_string
+
+# the exit hooks are registered once per process and flush every buffer that
+# is still alive, buffers are only referenced weakly so they can be collected
+_buffers = weakref.WeakSet()
+_buffers_lock = threading.Lock()
+_hooks_registered = False
+
+
+def flush_all(**kwargs):
+    with _buffers_lock:
+        buffers = list(_buffers)
+    for buffer in buffers:
+        buffer.flush()
+
+
+def _register(buffer):
+    global _hooks_registered
+
+    with _buffers_lock:
+        _buffers.add(buffer)
+        if _hooks_registered:
+            return
+
+        atexit.register(flush_all)
+
+        from celery.signals import worker_process_shutdown
+        worker_process_shutdown.connect(flush_all, weak=False)
+        _hooks_registered = True
+
+
+def _unregister(buffer):
+    with _buffers_lock:
+        _buffers.discard(buffer)
+
+
+class CoalescingBuffer(Buffer):
+    """
+    In-process buffer which coalesces increments before handing them to
+    another buffer backend.
+
+    Increments for the same model and filters are summed up and their extra
+    values are merged (last write wins) inside of the current process. The
+    accumulated changes are passed on to the wrapped backend once
+    ``flush_interval`` seconds have passed since the last flush, once
+    ``max_size`` distinct keys are pending, and when the process exits.
+    ``close`` flushes the buffer and stops its timer, after which increments
+    go straight to the wrapped backend.
+
+    >>> CoalescingBuffer(
+    >>>     backend='sentry.buffer.redis.RedisBuffer',
+    >>>     backend_options={},
+    >>>     flush_interval=1,
+    >>>     max_size=1000,
+    >>> )
+    """
+    _setup_lock = threading.Lock()
+
+    def __init__(self, backend='sentry.buffer.redis.RedisBuffer', backend_options=None,
+                 flush_interval=1, max_size=1000):
+        if isinstance(backend, six.string_types):
+            backend = import_string(backend)
+        self.backend = backend(**(backend_options or {}))
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time()
+        self._stopped = threading.Event()
+        self._closed = False
+
+        _register(self)
+
+    def close(self):
+        self._closed = True
+        self._stopped.set()
+        _unregister(self)
+        self.flush()
+
+    def validate(self):
+        self.backend.validate()
+
+    def process_pending(self):
+        return self.backend.process_pending()
+
+    def process(self, *args, **kwargs):
+        return self.backend.process(*args, **kwargs)
+
+    def _make_key(self, model, filters):
+        return (model, tuple(sorted(
+            (k, v.pk if isinstance(v, models.Model) else v) for k, v in six.iteritems(filters)
+        )))
+
+    def incr(self, model, columns, filters, extra=None):
+        if self._closed:
+            self.backend.incr(model, columns, filters, extra)
+            return
+
+        try:
+            key = self._make_key(model, filters)
+            hash(key)
+        except TypeError:
+            # unhashable filter values can't be coalesced
+            self.backend.incr(model, columns, filters, extra)
+            return
+
+        self._ensure_process_state()
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = (model, dict(columns), filters, dict(extra or {}))
+            else:
+                _, pending_columns, _, pending_extra = pending
+                for column, amount in six.iteritems(columns):
+                    pending_columns[column] = pending_columns.get(column, 0) + amount
+                if extra:
+                    pending_extra.update(extra)
+                metrics.incr('buffer.coalesced')
+
+            should_flush = (
+                len(self._pending) >= self.max_size or
+                time() - self._last_flush >= self.flush_interval
+            )
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        # a forked process only owns the changes it buffered itself
+        if self._pid != os.getpid():
+            return
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time()
+
+        if not pending:
+            return
+
+        metrics.timing('buffer.coalesced-flush-size', len(pending))
+
+        for model, columns, filters, extra in six.itervalues(pending):
+            try:
+                self.backend.incr(model, columns, filters, extra or None)
+            except Exception:
+                self.logger.exception('buffer.flush.failed', extra={
+                    'model': model.__name__,
+                })
+
+    def _ensure_process_state(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with self._setup_lock:
+            if self._pid == pid:
+                return
+
+            # after a fork we must neither flush the changes which are still
+            # pending in the parent nor rely on its lock, and since threads
+            # don't survive forking every process needs its own timer which
+            # flushes while no increments arrive
+            self._lock = threading.Lock()
+            self._pending = {}
+            self._last_flush = time()
+            self._stopped = threading.Event()
+            self._pid = pid
+
+        thread = threading.Thread(
+            target=_run_timer,
+            args=(weakref.ref(self), pid, self._stopped),
+        )
+        thread.daemon = True
+        thread.start()
+
+
+def _run_timer(ref, pid, stopped):
+    # the timer must not keep the buffer alive, it stops once the buffer is
+    # closed or collected
+    buffer = ref()
+    while buffer is not None and buffer._pid == pid:
+        interval = buffer.flush_interval
+        del buffer
+        if stopped.wait(interval):
+            return
+
+        buffer = ref()
+        if buffer is not None and time() - buffer._last_flush >= buffer.flush_interval:
+            buffer.flush()
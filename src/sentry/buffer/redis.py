@@ -52,12 +52,26 @@ class PendingBuffer(object):
 
 
 class RedisBuffer(Buffer):
+    """
+    Buffers increments in Redis hashes which are flushed to the database
+    by ``process_pending``.
+
+    By default every pending key is handed to a ``process_incr`` task. With
+    the ``bulk_flush`` option enabled the pending set is instead drained
+    directly, ``pending_chunk_size`` keys at a time per host, and the
+    updates of each chunk are applied with ``Buffer.process_many``. A flush
+    stops after half of the lifetime of its lock, and leaves the remaining
+    keys to the next one.
+    """
     key_expire = 60 * 60  # 1 hour
     pending_key = 'b:p'
+    pending_lock_expire = 60
     incr_batch_size = 2
 
     def __init__(self, **options):
         self.cluster, options = get_cluster_from_options('SENTRY_BUFFER_OPTIONS', options)
+        self.bulk_flush = options.pop('bulk_flush', False)
+        self.pending_chunk_size = options.pop('pending_chunk_size', 1000)
 
     def validate(self):
         try:
@@ -118,7 +132,16 @@ class RedisBuffer(Buffer):
         client = self.cluster.get_routing_client()
         lock_key = self._make_lock_key(self.pending_key)
         # prevent a stampede due to celerybeat + periodic task
-        if not client.set(lock_key, '1', nx=True, ex=60):
+        if not client.set(lock_key, '1', nx=True, ex=self.pending_lock_expire):
+            return
+
+        if self.bulk_flush:
+            try:
+                # stop well before the lock expires, the remaining keys are
+                # flushed by the next run
+                self._process_pending_bulk(deadline=time() + self.pending_lock_expire / 2)
+            finally:
+                client.delete(lock_key)
             return
 
         pending_buffer = PendingBuffer(self.incr_batch_size)
@@ -153,6 +176,70 @@ class RedisBuffer(Buffer):
         finally:
             client.delete(lock_key)
 
+    def _process_pending_bulk(self, deadline):
+        now = time()
+        keycount = 0
+
+        for host_id in self.cluster.hosts:
+            if time() >= deadline:
+                metrics.incr('buffer.bulk-flush.deadline')
+                break
+
+            conn = self.cluster.get_local_client(host_id)
+
+            oldest = conn.zrange(self.pending_key, 0, 0, withscores=True)
+            if oldest:
+                metrics.timing('buffer.pending-age', now - oldest[0][1])
+
+            while True:
+                # only look at keys which were pending when we started so a
+                # constant stream of increments can't keep us here forever
+                keys = conn.zrangebyscore(
+                    self.pending_key, '-inf', now, start=0, num=self.pending_chunk_size,
+                )
+                if not keys:
+                    break
+                keycount += len(keys)
+
+                # fetching and removing the hashes happens in one transaction,
+                # increments arriving afterwards will recreate the key
+                pipe = conn.pipeline()
+                for key in keys:
+                    pipe.hgetall(key)
+                    pipe.delete(key)
+                pipe.zrem(self.pending_key, *keys)
+                results = pipe.execute()
+
+                # every key holds the merged increments of one model and
+                # filter combination, and as we only consider keys which were
+                # pending before we started no key is seen twice per flush
+                items = []
+                for values in results[:-1:2]:
+                    if not values:
+                        metrics.incr('buffer.revoked', tags={'reason': 'empty'})
+                        continue
+                    items.append(self._load_values(values))
+
+                self.process_many(items)
+                metrics.timing('buffer.bulk-flush.chunk-size', len(keys))
+
+                if time() >= deadline:
+                    break
+
+        metrics.timing('buffer.pending-size', keycount)
+
+    def _load_values(self, values):
+        model = import_string(values['m'])
+        filters = pickle.loads(values['f'])
+        incr_values = {}
+        extra_values = {}
+        for k, v in six.iteritems(values):
+            if k.startswith('i+'):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith('e+'):
+                extra_values[k[2:]] = pickle.loads(v)
+        return model, incr_values, filters, extra_values
+
     def process(self, key=None, batch_keys=None):
         assert not (key is None and batch_keys is None)
         assert not (key is not None and batch_keys is not None)
@@ -186,15 +273,7 @@ class RedisBuffer(Buffer):
                 self.logger.debug('buffer.revoked.empty', extra={'redis_key': key})
                 return
 
-            model = import_string(values['m'])
-            filters = pickle.loads(values['f'])
-            incr_values = {}
-            extra_values = {}
-            for k, v in six.iteritems(values):
-                if k.startswith('i+'):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith('e+'):
-                    extra_values[k[2:]] = pickle.loads(v)
+            model, incr_values, filters, extra_values = self._load_values(values)
 
             super(RedisBuffer, self).process(model, incr_values, filters, extra_values)
         finally:
@@ -434,7 +434,7 @@ CELERY_IMPORTS = (
     'sentry.tasks.process_buffer', 'sentry.tasks.reports', 'sentry.tasks.reprocessing',
     'sentry.tasks.scheduler', 'sentry.tasks.signals', 'sentry.tasks.store', 'sentry.tasks.unmerge',
     'sentry.tasks.symcache_update', 'sentry.tasks.servicehooks',
-    'sentry.tagstore.tasks', 'sentry.tasks.assemble'
+    'sentry.tagstore.tasks', 'sentry.tasks.assemble', 'sentry.tasks.tsdb'
 )
 CELERY_QUEUES = [
     Queue('activity.notify', routing_key='activity.notify'),
@@ -524,6 +524,14 @@ CELERYBEAT_SCHEDULE = {
             'queue': 'counters-0',
         }
     },
+    'compact-tsdb-rollups': {
+        'task': 'sentry.tasks.tsdb.compact_rollups',
+        'schedule': timedelta(seconds=30),
+        'options': {
+            'expires': 30,
+            'queue': 'stats',
+        }
+    },
     'sync-options': {
         'task': 'sentry.tasks.options.sync_options',
         'schedule': timedelta(seconds=10),
@@ -593,7 +601,11 @@ BGTASKS = {
     'sentry.bgtasks.clean_dsymcache:clean_dsymcache': {
         'interval': 5 * 60,
         'roles': ['worker'],
-    }
+    },
+    'sentry.bgtasks.clean_fileblobcache:clean_fileblobcache': {
+        'interval': 5 * 60,
+        'roles': ['web', 'worker'],
+    },
 }
 
 # Sentry logs to two major places: stdout, and it's internal project.
@@ -1005,6 +1017,14 @@ SENTRY_MAX_MESSAGE_LENGTH = 1024 * 8
 SENTRY_MAX_STACKTRACE_FRAMES = 50
 SENTRY_MAX_EXCEPTIONS = 25
 
+# Maximum size of an event payload after it was decompressed, larger events
+# are rejected before they are decoded
+SENTRY_MAX_EVENT_PAYLOAD_SIZE = 20 * 1024 * 1024
+
+# Number of queued events of a project which are stored together with
+# `EventManager.save_many`, 0 stores every event with its own task
+SENTRY_SAVE_EVENT_BATCH_SIZE = 0
+
 # Gravatar service base url
 SENTRY_GRAVATAR_BASE_URL = 'https://secure.gravatar.com'
 
@@ -1017,6 +1037,43 @@ SENTRY_SOURCE_FETCH_SOCKET_TIMEOUT = 2
 # Maximum content length for source files before we abort fetching
 SENTRY_SOURCE_FETCH_MAX_SIZE = 40 * 1024 * 1024
 
+# Maximum total size of the release artifacts whose parsed source and
+# sourcemap views are kept in every process
+SENTRY_JS_VIEW_CACHE_SIZE = 256 * 1024 * 1024
+
+# Maximum number of sources or sourcemaps that are scraped concurrently while
+# processing a JavaScript event
+SENTRY_JS_FETCH_CONCURRENCY = 8
+
+# Maximum total size of the symcache files that every process keeps mapped
+# for native symbolication
+SENTRY_SYMCACHE_POOL_SIZE = 1024 * 1024 * 1024
+
+# Number of stacktrace processors of an event (e.g. for the JavaScript and
+# native frames of a React Native event) whose preprocess steps run at the
+# same time, 1 runs them one after another
+SENTRY_STACKTRACE_PREPROCESS_CONCURRENCY = 1
+
+# Number of blobs of a file which are uploaded at the same time, and number
+# of blobs which are fetched ahead of the blob that is read once a file is
+# read sequentially
+SENTRY_FILE_BLOB_UPLOAD_CONCURRENCY = 4
+SENTRY_FILE_BLOB_READAHEAD = 2
+
+# Directory of a content addressed cache of file blobs on the local disk
+# (disabled if not set), and the maximum total size of the cached blobs
+SENTRY_FILE_BLOB_CACHE_PATH = None
+SENTRY_FILE_BLOB_CACHE_SIZE = 1024 * 1024 * 1024
+
+# Seconds that processed frames are cached for by stacktrace processor class
+# name, processors which are not listed use their own default
+SENTRY_FRAME_CACHE_TTLS = {}
+
+# Maximum number of processed frames that are additionally memoized in every
+# process, and the number of seconds they are memoized for
+SENTRY_FRAME_CACHE_LOCAL_SIZE = 10000
+SENTRY_FRAME_CACHE_LOCAL_TTL = 300
+
 # List of IP subnets which should not be accessible
 SENTRY_DISALLOWED_IPS = ()
 
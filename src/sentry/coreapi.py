@@ -11,6 +11,7 @@ sentry.coreapi
 from __future__ import absolute_import, print_function
 
 import base64
+import importlib
 import jsonschema
 import logging
 import re
@@ -18,9 +19,9 @@ import six
 import zlib
 
 from collections import MutableMapping
+from django.conf import settings
 from django.core.exceptions import SuspiciousOperation
 from django.utils.crypto import constant_time_compare
-from gzip import GzipFile
 from six import BytesIO
 from time import time
 
@@ -35,12 +36,28 @@ from sentry.utils import json
 from sentry.utils.auth import parse_auth_header
 from sentry.utils.http import origin_from_request
 from sentry.utils.data_filters import is_valid_ip, \
-    is_valid_release, is_valid_error_message, FilterStatKeys
-from sentry.utils.strings import decompress
+    is_valid_release, is_valid_error_message, FilterStatKeys, FilterTypes
 
 
 _dist_re = re.compile(r'^[a-zA-Z0-9_.-]+$')
 
+# Size of the chunks that payloads are decompressed in
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+def _load_ijson():
+    # only the C backends are faster than loading the whole payload, which is
+    # then kept for decoding the event
+    for backend in ('yajl2_c', 'yajl2_cffi'):
+        try:
+            return importlib.import_module('ijson.backends.{}'.format(backend))
+        except Exception:
+            continue
+    return None
+
+
+ijson = _load_ijson()
+
 
 class APIError(Exception):
     http_status = 400
@@ -57,6 +74,11 @@ class APIError(Exception):
         return self.msg or ''
 
 
+class APIPayloadTooLarge(APIError):
+    http_status = 413
+    msg = 'Event payload is too large'
+
+
 class APIUnauthorized(APIError):
     http_status = 401
     msg = 'Unauthorized'
@@ -234,37 +256,65 @@ class ClientApiHelper(object):
             raise APIError('Bad data decoding request (%s, %s)' %
                            (type(e).__name__, e))
 
+    def inflate(self, encoded_data, wbits=zlib.MAX_WBITS):
+        """
+        Decompresses ``encoded_data`` in chunks and raises
+        ``APIPayloadTooLarge`` as soon as the output exceeds
+        ``SENTRY_MAX_EVENT_PAYLOAD_SIZE``, so that compression bombs are
+        never fully expanded.
+        """
+        max_size = settings.SENTRY_MAX_EVENT_PAYLOAD_SIZE
+        decompressor = zlib.decompressobj(wbits)
+        chunks = []
+        size = 0
+        while True:
+            chunk = decompressor.decompress(encoded_data, DECOMPRESS_CHUNK_SIZE)
+            size += len(chunk)
+            if size > max_size:
+                raise APIPayloadTooLarge()
+            chunks.append(chunk)
+            encoded_data = decompressor.unconsumed_tail
+            if not encoded_data and len(chunk) < DECOMPRESS_CHUNK_SIZE:
+                break
+
+        chunk = decompressor.flush()
+        if size + len(chunk) > max_size:
+            raise APIPayloadTooLarge()
+        chunks.append(chunk)
+        return b''.join(chunks)
+
     def decompress_deflate(self, encoded_data):
-        try:
-            return zlib.decompress(encoded_data).decode('utf-8')
-        except Exception as e:
-            # This error should be caught as it suggests that there's a
-            # bug somewhere in the client's code.
-            self.log.debug(six.text_type(e), exc_info=True)
-            raise APIError('Bad data decoding request (%s, %s)' %
-                           (type(e).__name__, e))
+        return self.decode_data(self.decompress_payload(encoded_data, 'deflate'))
 
     def decompress_gzip(self, encoded_data):
-        try:
-            fp = BytesIO(encoded_data)
-            try:
-                f = GzipFile(fileobj=fp)
-                return f.read().decode('utf-8')
-            finally:
-                f.close()
-        except Exception as e:
-            # This error should be caught as it suggests that there's a
-            # bug somewhere in the client's code.
-            self.log.debug(six.text_type(e), exc_info=True)
-            raise APIError('Bad data decoding request (%s, %s)' %
-                           (type(e).__name__, e))
+        return self.decode_data(self.decompress_payload(encoded_data, 'gzip'))
 
     def decode_and_decompress_data(self, encoded_data):
+        return self.decode_data(self.decompress_payload(encoded_data, 'base64'))
+
+    def decompress_payload(self, encoded_data, content_encoding):
+        """
+        Returns the uncompressed bytes of a binary payload. The encoding is
+        either a ``Content-Encoding`` (``gzip`` or ``deflate``), or
+        ``base64`` for optionally deflated base64 encoded data.
+        """
         try:
-            try:
-                return decompress(encoded_data).decode('utf-8')
-            except zlib.error:
-                return base64.b64decode(encoded_data).decode('utf-8')
+            if content_encoding == 'gzip':
+                return self.inflate(encoded_data, 16 + zlib.MAX_WBITS)
+            elif content_encoding == 'deflate':
+                return self.inflate(encoded_data)
+            elif content_encoding == 'base64':
+                encoded_data = base64.b64decode(encoded_data)
+                try:
+                    return self.inflate(encoded_data)
+                except zlib.error:
+                    pass
+
+            if len(encoded_data) > settings.SENTRY_MAX_EVENT_PAYLOAD_SIZE:
+                raise APIPayloadTooLarge()
+            return encoded_data
+        except APIError:
+            raise
         except Exception as e:
             # This error should be caught as it suggests that there's a
             # bug somewhere in the client's code.
@@ -301,6 +351,44 @@ class ClientApiHelper(object):
             'version': version,
         }
 
+    def should_filter_early(self, project, data, ip_address=None):
+        """
+        Checks the filters which only depend on the client's address and on
+        top-level values of the payload, without decoding it entirely if
+        possible. Returns the same tuple as ``should_filter``, though an
+        event which passes has to be checked with ``should_filter`` as well.
+        """
+        if ip_address and not is_valid_ip(project, ip_address):
+            return (True, FilterStatKeys.IP_ADDRESS)
+
+        names = []
+        if project.get_option('sentry:{}'.format(FilterTypes.RELEASES)):
+            names.append('release')
+        if project.get_option('sentry:{}'.format(FilterTypes.ERROR_MESSAGES)):
+            names.extend(['message', 'sentry.interfaces.Message', 'logentry'])
+        if not names or not isinstance(data, LazyData):
+            return (False, None)
+
+        values = data.peek(names)
+        if values is None:
+            return (False, None)
+
+        release = values.get('release')
+        if isinstance(release, six.string_types) and release and \
+                not is_valid_release(project, release):
+            return (True, FilterStatKeys.RELEASE_VERSION)
+
+        # a raw message only becomes the event's message if there is no
+        # message interface, and it is not trimmed if it is short enough
+        message = values.get('message')
+        if isinstance(message, six.string_types) and message and \
+                len(message) <= settings.SENTRY_MAX_MESSAGE_LENGTH and \
+                'sentry.interfaces.Message' not in values and 'logentry' not in values and \
+                not is_valid_error_message(project, message):
+            return (True, FilterStatKeys.ERROR_MESSAGE)
+
+        return (False, None)
+
     def should_filter(self, project, data, ip_address=None):
         """
         returns (result: bool, reason: string or None)
@@ -451,6 +539,9 @@ class SecurityApiHelper(ClientApiHelper):
         return data
 
 
+SCALAR_EVENTS = frozenset(['string', 'number', 'boolean', 'null'])
+
+
 class LazyData(MutableMapping):
     def __init__(self, data, content_encoding, helper, project, key, auth, client_ip):
         self._data = data
@@ -460,26 +551,89 @@ class LazyData(MutableMapping):
         self._key = key
         self._auth = auth
         self._client_ip = client_ip
+        self._decompressed = False
         self._decoded = False
 
-    def _decode(self):
+    def _get_payload(self):
         data = self._data
-        content_encoding = self._content_encoding
+        if isinstance(data, six.binary_type) and not self._decompressed:
+            content_encoding = self._content_encoding
+            if content_encoding not in ('gzip', 'deflate') and data[:1] != b'{':
+                content_encoding = 'base64'
+            data = self._data = self._helper.decompress_payload(data, content_encoding)
+            self._decompressed = True
+        return data
+
+    def peek(self, names):
+        """
+        Returns the top-level values for ``names`` without decoding the
+        payload into an event. Values which are objects or arrays are
+        returned as ``None``, missing values are omitted. Returns ``None``
+        if the payload can't be parsed incrementally.
+        """
+        if self._decoded:
+            return None
+
+        data = self._get_payload()
+        if isinstance(data, six.binary_type):
+            if ijson is not None:
+                return self._parse_values(data, set(names))
+
+            try:
+                loaded = json.loads(data.decode('utf-8'))
+            except Exception:
+                # invalid payloads are reported when they are decoded
+                return None
+            if not isinstance(loaded, dict):
+                return None
+            data = self._data = loaded
+
+        if not isinstance(data, dict):
+            return None
+
+        return {
+            name: data[name] if not isinstance(data[name], (dict, list)) else None
+            for name in names if name in data
+        }
+
+    def _parse_values(self, data, names):
+        values = {}
+        name = None
+        depth = 0
+        try:
+            for event, value in ijson.basic_parse(BytesIO(data)):
+                if event == 'start_map' or event == 'start_array':
+                    depth += 1
+                elif event == 'end_map' or event == 'end_array':
+                    depth -= 1
+                    if depth == 0:
+                        # the rest of the payload is never looked at
+                        break
+                    continue
+
+                if depth == 1 and event == 'map_key':
+                    name = value if value in names else None
+                elif name is not None:
+                    # nested values are only recorded as being present
+                    values[name] = value if event in SCALAR_EVENTS else None
+                    name = None
+                    if len(values) == len(names):
+                        break
+        except Exception:
+            # invalid payloads are reported when they are decoded
+            return None
+        return values
+
+    def _decode(self):
         helper = self._helper
         auth = self._auth
 
         # TODO(dcramer): CSP is passing already decoded JSON, which sort of
         # defeats the purpose of a lot of lazy evaluation. It needs refactored
         # to avoid doing that.
+        data = self._get_payload()
         if isinstance(data, six.binary_type):
-            if content_encoding == 'gzip':
-                data = helper.decompress_gzip(data)
-            elif content_encoding == 'deflate':
-                data = helper.decompress_deflate(data)
-            elif data[0] != b'{':
-                data = helper.decode_and_decompress_data(data)
-            else:
-                data = helper.decode_data(data)
+            data = helper.decode_data(data)
         if isinstance(data, six.text_type):
             data = helper.safely_load_json_string(data)
 
@@ -38,11 +38,15 @@ class GroupDeletionTask(ModelDeletionTask):
         return relations
 
     def delete_instance(self, instance):
+        from sentry import search, tagstore
         from sentry.similarity import features
 
         if not self.skip_models or features not in self.skip_models:
             features.delete(instance)
 
+        tagstore.delete_group_search_index(instance.project_id, instance.id)
+        search.unindex_group(instance)
+
         return super(GroupDeletionTask, self).delete_instance(instance)
 
     def mark_deletion_in_progress(self, instance_list):
@@ -50,3 +50,10 @@ class ProjectDeletionTask(ModelDeletionTask):
         )
 
         return relations
+
+    def delete_instance(self, instance):
+        from sentry import search
+
+        search.delete_index(instance)
+
+        return super(ProjectDeletionTask, self).delete_instance(instance)
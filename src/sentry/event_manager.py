@@ -20,7 +20,7 @@ from django.utils.encoding import force_bytes, force_text
 from hashlib import md5
 from uuid import uuid4
 
-from sentry import eventtypes, features, buffer
+from sentry import eventtypes, features, buffer, search
 # we need a bunch of unexposed functions from tsdb
 from sentry.tsdb import backend as tsdb
 from sentry.constants import (
@@ -474,10 +474,159 @@ class EventManager(object):
         return data
 
     def save(self, project, raw=False):
-        from sentry.tasks.post_process import index_event_tags
+        project = Project.objects.get_from_cache(id=project)
+
+        job = self._pull_out_data(project)
+        event = job['event']
+
+        self._save_job_aggregate(job)
+
+        # When an event was sampled, the canonical source of truth
+        # is the EventMapping table since we aren't going to be writing out an actual
+        # Event row. Otherwise, if the Event isn't being sampled, we can safely
+        # rely on the Event table itself as the source of truth and ignore
+        # EventMapping since it's redundant information.
+        if job['is_sample']:
+            try:
+                with transaction.atomic(using=router.db_for_write(EventMapping)):
+                    EventMapping.objects.create(
+                        project=project, group=job['group'], event_id=job['event_id'])
+            except IntegrityError:
+                self._log_duplicate(job, EventMapping, exc_info=True)
+                return event
+
+        # We now always need to check the Event table for dupes
+        # since EventMapping isn't exactly the canonical source of truth.
+        if Event.objects.filter(
+            project_id=project.id,
+            event_id=job['event_id'],
+        ).exists():
+            self._log_duplicate(job, Event)
+            return event
+
+        self._save_job_relations(job)
 
+        # save the event unless its been sampled
+        if not job['is_sample']:
+            try:
+                with transaction.atomic(using=router.db_for_write(Event)):
+                    event.save()
+            except IntegrityError:
+                self._log_duplicate(job, Event, exc_info=True)
+                return event
+
+        self._finish_job(job, raw=raw)
+
+        return event
+
+    @classmethod
+    def save_many(cls, project, events, raw=False):
+        """
+        Saves a batch of normalized event payloads belonging to ``project``.
+
+        The result is equivalent to calling ``save`` for every payload, but
+        releases, environments, event users and group hashes are resolved
+        once for the batch and the ``Event`` and ``EventMapping`` rows are
+        written with multi-row inserts. Returns a list aligned with ``events``
+        containing the saved ``Event``, or ``None`` if its hash was discarded.
+        """
         project = Project.objects.get_from_cache(id=project)
 
+        managers = [cls(data) for data in events]
+
+        releases = cls._get_releases_many(project, [m.data for m in managers])
+        user_hashes = cls._get_event_users_many(project, [m.data for m in managers])
+
+        jobs = [
+            manager._pull_out_data(project, releases=releases, user_hashes=user_hashes)
+            for manager in managers
+        ]
+
+        group_hashes = cls._find_hashes_many(
+            project,
+            set(hash for job in jobs for hash in job['hashes']),
+        )
+
+        existing_event_ids = set(
+            Event.objects.filter(
+                project_id=project.id,
+                event_id__in=set(job['event_id'] for job in jobs),
+            ).values_list('event_id', flat=True)
+        )
+
+        results = []
+        aggregated = []
+        for manager, job in zip(managers, jobs):
+            try:
+                manager._save_job_aggregate(job, group_hashes=group_hashes)
+            except HashDiscarded:
+                results.append(None)
+                continue
+
+            results.append(job['event'])
+            aggregated.append((manager, job))
+
+        # as in ``save``, the mappings of sampled events are written before
+        # anything else so that duplicates are not counted again
+        cls._bulk_insert_jobs(
+            project,
+            EventMapping,
+            [job for _, job in aggregated if job['is_sample']],
+            lambda job: EventMapping(
+                project_id=project.id,
+                group_id=job['group'].id,
+                event_id=job['event_id'],
+            ),
+        )
+
+        environments = cls._get_environments_many(
+            project,
+            [job for _, job in aggregated if not job['is_duplicate']],
+        )
+
+        pending = []
+        for manager, job in aggregated:
+            if job['is_duplicate']:
+                continue
+
+            if job['event_id'] in existing_event_ids:
+                manager._log_duplicate(job, Event)
+                continue
+            existing_event_ids.add(job['event_id'])
+
+            manager._save_job_relations(job, environments=environments)
+            pending.append((manager, job))
+
+        event_jobs = [job for _, job in pending if not job['is_sample']]
+        cls._bulk_insert_jobs(project, Event, event_jobs, lambda job: job['event'])
+
+        # bulk inserts do not hand back primary keys, so look them up through
+        # the unique (project_id, event_id) constraint
+        missing_ids = dict(
+            (job['event_id'], job['event']) for job in event_jobs
+            if not job['is_duplicate'] and job['event'].id is None
+        )
+        if missing_ids:
+            for event_id, id in Event.objects.filter(
+                project_id=project.id,
+                event_id__in=missing_ids.keys(),
+            ).values_list('event_id', 'id'):
+                missing_ids[event_id].id = id
+
+        for manager, job in pending:
+            if not job['is_duplicate']:
+                manager._finish_job(job, raw=raw)
+
+        metrics.timing('events.save_many.batch_size', len(events))
+
+        return results
+
+    def _pull_out_data(self, project, releases=None, user_hashes=None):
+        """
+        Builds the unsaved ``Event`` and everything derived from the payload
+        which is needed to save it. ``releases`` and ``user_hashes`` may hold
+        lookups which were already resolved for a whole batch.
+        """
         data = self.data.copy()
 
         # First we pull out our top-level (non-data attr) kwargs
@@ -548,11 +697,14 @@ class EventManager(object):
             # dont allow a conflicting 'release' tag
             if 'release' in tags:
                 del tags['release']
-            release = Release.get_or_create(
-                project=project,
-                version=release,
-                date_added=date,
-            )
+            if releases is not None and release in releases:
+                release = releases[release]
+            else:
+                release = Release.get_or_create(
+                    project=project,
+                    version=release,
+                    date_added=date,
+                )
 
             tags['sentry:release'] = release.version
 
@@ -562,7 +714,7 @@ class EventManager(object):
         else:
             dist = None
 
-        event_user = self._get_event_user(project, data)
+        event_user = self._get_event_user(project, data, known_hashes=user_hashes)
         if event_user:
             # dont allow a conflicting 'user' tag
             if 'user' in tags:
@@ -669,9 +821,34 @@ class EventManager(object):
         if release:
             group_kwargs['first_release'] = release
 
+        return {
+            'project': project,
+            'event': event,
+            'event_id': event_id,
+            'platform': platform,
+            'date': date,
+            'recorded_timestamp': recorded_timestamp,
+            'received_timestamp': received_timestamp,
+            'tags': tags,
+            'hashes': hashes,
+            'release': release,
+            'environment_name': environment,
+            'event_user': event_user,
+            'group_kwargs': group_kwargs,
+            'is_duplicate': False,
+        }
+
+    def _save_job_aggregate(self, job, group_hashes=None):
+        project = job['project']
+        event = job['event']
+
         try:
             group, is_new, is_regression, is_sample = self._save_aggregate(
-                event=event, hashes=hashes, release=release, **group_kwargs
+                event=event,
+                hashes=job['hashes'],
+                release=job['release'],
+                group_hashes=group_hashes,
+                **job['group_kwargs']
             )
         except HashDiscarded:
             event_discarded.send_robust(
@@ -684,7 +861,7 @@ class EventManager(object):
                 skip_internal=True,
                 tags={
                     'organization_id': project.organization_id,
-                    'platform': platform,
+                    'platform': job['platform'],
                 },
             )
             raise
@@ -698,50 +875,26 @@ class EventManager(object):
         # store a reference to the group id to guarantee validation of isolation
         event.data.bind_ref(event)
 
-        # When an event was sampled, the canonical source of truth
-        # is the EventMapping table since we aren't going to be writing out an actual
-        # Event row. Otherwise, if the Event isn't being sampled, we can safely
-        # rely on the Event table itself as the source of truth and ignore
-        # EventMapping since it's redundant information.
-        if is_sample:
-            try:
-                with transaction.atomic(using=router.db_for_write(EventMapping)):
-                    EventMapping.objects.create(project=project, group=group, event_id=event_id)
-            except IntegrityError:
-                self.logger.info(
-                    'duplicate.found',
-                    exc_info=True,
-                    extra={
-                        'event_uuid': event_id,
-                        'project_id': project.id,
-                        'group_id': group.id,
-                        'model': EventMapping.__name__,
-                    }
-                )
-                return event
-
-        # We now always need to check the Event table for dupes
-        # since EventMapping isn't exactly the canonical source of truth.
-        if Event.objects.filter(
-            project_id=project.id,
-            event_id=event_id,
-        ).exists():
-            self.logger.info(
-                'duplicate.found',
-                exc_info=True,
-                extra={
-                    'event_uuid': event_id,
-                    'project_id': project.id,
-                    'group_id': group.id,
-                    'model': Event.__name__,
-                }
+        job.update({
+            'group': group,
+            'is_new': is_new,
+            'is_regression': is_regression,
+            'is_sample': is_sample,
+        })
+
+    def _save_job_relations(self, job, environments=None):
+        project = job['project']
+        event = job['event']
+        group = job['group']
+        release = job['release']
+
+        if environments is not None and job['environment_name'] in environments:
+            environment = environments[job['environment_name']]
+        else:
+            environment = Environment.get_or_create(
+                project=project,
+                name=job['environment_name'],
             )
-            return event
-
-        environment = Environment.get_or_create(
-            project=project,
-            name=environment,
-        )
 
         group_environment, is_new_group_environment = GroupEnvironment.get_or_create(
             group_id=group.id,
@@ -756,14 +909,14 @@ class EventManager(object):
                 project=project,
                 release=release,
                 environment=environment,
-                datetime=date,
+                datetime=job['date'],
             )
 
             grouprelease = GroupRelease.get_or_create(
                 group=group,
                 release=release,
                 environment=environment,
-                datetime=date,
+                datetime=job['date'],
             )
 
         counters = [
@@ -807,30 +960,29 @@ class EventManager(object):
 
         UserReport.objects.filter(
             project=project,
-            event_id=event_id,
+            event_id=job['event_id'],
         ).update(
             group=group,
             environment=environment,
         )
 
-        # save the event unless its been sampled
-        if not is_sample:
-            try:
-                with transaction.atomic(using=router.db_for_write(Event)):
-                    event.save()
-            except IntegrityError:
-                self.logger.info(
-                    'duplicate.found',
-                    exc_info=True,
-                    extra={
-                        'event_uuid': event_id,
-                        'project_id': project.id,
-                        'group_id': group.id,
-                        'model': Event.__name__,
-                    }
-                )
-                return event
+        job.update({
+            'environment': environment,
+            'is_new_group_environment': is_new_group_environment,
+        })
 
+    def _finish_job(self, job, raw=False):
+        from sentry.tasks.post_process import index_event_tags
+
+        project = job['project']
+        event = job['event']
+        group = job['group']
+        release = job['release']
+        environment = job['environment']
+        event_user = job['event_user']
+        tags = job['tags']
+
+        if not job['is_sample']:
             index_event_tags.delay(
                 organization_id=project.organization_id,
                 project_id=project.id,
@@ -850,7 +1002,7 @@ class EventManager(object):
                 environment_id=environment.id,
             )
 
-        if is_new and release:
+        if job['is_new'] and release:
             buffer.incr(
                 ReleaseProject, {'new_groups': 1}, {
                     'release_id': release.id,
@@ -862,40 +1014,99 @@ class EventManager(object):
 
         if not raw:
             if not project.first_event:
-                project.update(first_event=date)
+                project.update(first_event=job['date'])
                 first_event_received.send(project=project, group=group, sender=Project)
 
             post_process_group.delay(
                 group=group,
                 event=event,
-                is_new=is_new,
-                is_sample=is_sample,
-                is_regression=is_regression,
-                is_new_group_environment=is_new_group_environment,
-                primary_hash=hashes[0],
+                is_new=job['is_new'],
+                is_sample=job['is_sample'],
+                is_regression=job['is_regression'],
+                is_new_group_environment=job['is_new_group_environment'],
+                primary_hash=job['hashes'][0],
             )
         else:
             self.logger.info('post_process.skip.raw_event', extra={'event_id': event.id})
 
         # TODO: move this to the queue
-        if is_regression and not raw:
+        if job['is_regression'] and not raw:
             regression_signal.send_robust(sender=Group, instance=group)
 
         metrics.timing(
             'events.latency',
-            received_timestamp - recorded_timestamp,
+            job['received_timestamp'] - job['recorded_timestamp'],
             tags={
                 'project_id': project.id,
             },
         )
 
-        return event
+    @classmethod
+    def _log_duplicate(cls, job, model, exc_info=False):
+        job['is_duplicate'] = True
+        cls.logger.info(
+            'duplicate.found',
+            exc_info=exc_info,
+            extra={
+                'event_uuid': job['event_id'],
+                'project_id': job['project'].id,
+                'group_id': job['group'].id,
+                'model': model.__name__,
+            }
+        )
 
-    def _get_event_user(self, project, data):
-        user_data = data.get('sentry.interfaces.User')
-        if not user_data:
+    @classmethod
+    def _bulk_insert_jobs(cls, project, model, jobs, get_instance):
+        """
+        Writes the ``model`` rows of ``jobs`` with one multi-row insert. If a
+        concurrent writer already stored one of the rows the batch is retried
+        row by row so that only the actual duplicates are skipped.
+        """
+        if not jobs:
             return
 
+        instances = [get_instance(job) for job in jobs]
+        try:
+            with transaction.atomic(using=router.db_for_write(model)):
+                model.objects.bulk_create(instances)
+        except IntegrityError:
+            for job, instance in zip(jobs, instances):
+                instance.id = None
+                try:
+                    with transaction.atomic(using=router.db_for_write(model)):
+                        instance.save()
+                except IntegrityError:
+                    cls._log_duplicate(job, model, exc_info=True)
+
+    @classmethod
+    def _get_releases_many(cls, project, datas):
+        dates = {}
+        for data in datas:
+            version = data.get('release')
+            if not version:
+                continue
+            date = datetime.fromtimestamp(data['timestamp']).replace(tzinfo=timezone.utc)
+            dates[version] = min(date, dates.get(version, date))
+
+        return dict(
+            (version, Release.get_or_create(
+                project=project,
+                version=version,
+                date_added=date,
+            )) for version, date in six.iteritems(dates)
+        )
+
+    @classmethod
+    def _get_environments_many(cls, project, jobs):
+        return dict(
+            (name, Environment.get_or_create(
+                project=project,
+                name=name,
+            )) for name in set(job['environment_name'] for job in jobs)
+        )
+
+    @staticmethod
+    def _make_event_user(project, user_data):
         euser = EventUser(
             project_id=project.id,
             ident=user_data.get('id'),
@@ -905,13 +1116,29 @@ class EventManager(object):
             name=user_data.get('name'),
         )
         euser.set_hash()
-        if not euser.hash:
-            return
+        return euser
 
-        cache_key = 'euserid:1:{}:{}'.format(
+    @staticmethod
+    def _get_event_user_cache_key(project, hash):
+        return 'euserid:1:{}:{}'.format(
             project.id,
-            euser.hash,
+            hash,
         )
+
+    def _get_event_user(self, project, data, known_hashes=None):
+        user_data = data.get('sentry.interfaces.User')
+        if not user_data:
+            return
+
+        euser = self._make_event_user(project, user_data)
+        if not euser.hash:
+            return
+
+        # the batch path already made sure these users are stored
+        if known_hashes is not None and euser.hash in known_hashes:
+            return euser
+
+        cache_key = self._get_event_user_cache_key(project, euser.hash)
         euser_id = default_cache.get(cache_key)
         if euser_id is None:
             try:
@@ -935,14 +1162,98 @@ class EventManager(object):
                 default_cache.set(cache_key, e_userid, 3600)
         return euser
 
-    def _find_hashes(self, project, hash_list):
-        return map(
-            lambda hash: GroupHash.objects.get_or_create(
+    @classmethod
+    def _get_event_users_many(cls, project, datas):
+        """
+        Makes sure an ``EventUser`` exists for every user referenced by
+        ``datas`` and returns the set of user hashes which are known to be
+        stored. Users which could not be resolved here (e.g. because of a
+        concurrent insert) are left to the per-event lookup.
+        """
+        eusers = {}
+        for data in datas:
+            user_data = data.get('sentry.interfaces.User')
+            if not user_data:
+                continue
+            euser = cls._make_event_user(project, user_data)
+            if euser.hash:
+                eusers[euser.hash] = euser
+
+        if not eusers:
+            return set()
+
+        cache_keys = dict(
+            (hash, cls._get_event_user_cache_key(project, hash)) for hash in eusers
+        )
+        cached = default_cache.get_many(cache_keys.values())
+        known = set(hash for hash, key in six.iteritems(cache_keys) if cached.get(key) is not None)
+
+        missing = dict((hash, euser) for hash, euser in six.iteritems(eusers) if hash not in known)
+        if not missing:
+            return known
+
+        for euser in EventUser.objects.filter(
+            project_id=project.id,
+            hash__in=missing.keys(),
+        ):
+            name = missing.pop(euser.hash).name
+            if euser.name != (name or euser.name):
+                euser.update(name=name)
+            default_cache.set(cache_keys[euser.hash], euser.id, 3600)
+            known.add(euser.hash)
+
+        if missing:
+            try:
+                with transaction.atomic(using=router.db_for_write(EventUser)):
+                    EventUser.objects.bulk_create(missing.values())
+            except IntegrityError:
+                pass
+            else:
+                known.update(missing)
+
+        return known
+
+    def _find_hashes(self, project, hash_list, group_hashes=None):
+        if group_hashes is None:
+            group_hashes = {}
+        return [
+            group_hashes.get(hash) or GroupHash.objects.get_or_create(
                 project=project,
                 hash=hash,
-            )[0],
-            hash_list,
-        )
+            )[0] for hash in hash_list
+        ]
+
+    @classmethod
+    def _find_hashes_many(cls, project, hash_list):
+        """
+        Returns a mapping of hash to ``GroupHash`` for all of ``hash_list``,
+        creating the missing ones with a single insert where possible.
+        """
+        hash_list = set(hash_list)
+
+        def fetch(hashes):
+            return dict(
+                (h.hash, h) for h in GroupHash.objects.filter(
+                    project=project,
+                    hash__in=hashes,
+                )
+            )
+
+        group_hashes = fetch(hash_list)
+        missing = hash_list - set(group_hashes)
+        if missing:
+            try:
+                with transaction.atomic(using=router.db_for_write(GroupHash)):
+                    GroupHash.objects.bulk_create([
+                        GroupHash(project=project, hash=hash) for hash in missing
+                    ])
+            except IntegrityError:
+                # someone else created some of them concurrently, the
+                # remaining ones are resolved one by one in ``_find_hashes``
+                pass
+            group_hashes.update(fetch(missing))
+
+        return group_hashes
 
     def _ensure_hashes_merged(self, group, hash_list):
         # TODO(dcramer): there is a race condition with selecting/updating
@@ -972,11 +1283,11 @@ class EventManager(object):
             group=group,
         )
 
-    def _save_aggregate(self, event, hashes, release, **kwargs):
+    def _save_aggregate(self, event, hashes, release, group_hashes=None, **kwargs):
         project = event.project
 
         # attempt to find a matching hash
-        all_hashes = self._find_hashes(project, hashes)
+        all_hashes = self._find_hashes(project, hashes, group_hashes=group_hashes)
 
         existing_group_id = None
         for h in all_hashes:
@@ -1013,6 +1324,8 @@ class EventManager(object):
                 tags={'platform': event.platform or 'unknown'}
             )
 
+            safe_execute(search.index_group, group, _with_transaction=False)
+
         else:
             group = Group.objects.get(id=existing_group_id)
 
@@ -1037,6 +1350,12 @@ class EventManager(object):
                 state=GroupHash.State.LOCKED_IN_MIGRATION,
             ).update(group=group)
 
+            # keep the instances in sync so that later events of the same
+            # batch which share these hashes end up in this group
+            for h in new_hashes:
+                if h.state != GroupHash.State.LOCKED_IN_MIGRATION:
+                    h.group_id = group.id
+
             if group_is_new and len(new_hashes) == len(all_hashes):
                 is_new = True
 
@@ -1170,6 +1489,15 @@ class EventManager(object):
         if group.culprit != data['culprit']:
             extra['culprit'] = data['culprit']
 
+        if 'message' in extra or 'culprit' in extra:
+            safe_execute(
+                search.index_group,
+                group,
+                message=extra.get('message'),
+                culprit=extra.get('culprit'),
+                _with_transaction=False,
+            )
+
         is_regression = self._handle_regression(group, event, release)
 
         group.last_seen = extra['last_seen']
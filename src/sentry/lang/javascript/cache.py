@@ -1,10 +1,15 @@
 from __future__ import absolute_import, print_function
 
+import threading
+
+from collections import OrderedDict
+from django.conf import settings
 from six import text_type
 from symbolic import SourceView
+from sentry.utils import metrics
 from sentry.utils.strings import codec_lookup
 
-__all__ = ['SourceCache', 'SourceMapCache']
+__all__ = ['SourceCache', 'SourceMapCache', 'ViewCache', 'view_cache']
 
 
 def is_utf8(codec):
@@ -84,3 +89,55 @@ class SourceMapCache(object):
             sourcemap = self.get(sourcemap_url)
             return (sourcemap_url, sourcemap)
         return (None, None)
+
+
+class ViewCache(object):
+    """
+    Process wide cache of parsed views of release artifacts, so that
+    artifacts which are used by many events are only parsed once per
+    process. Keys start with the kind of view, followed by the release id,
+    distribution id, file name and checksum of the artifact.
+
+    The cache is bounded by the total size of the files the views were
+    parsed from, as configured by ``SENTRY_JS_VIEW_CACHE_SIZE``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self._data[key] = item
+        metrics.incr(
+            'sourcemaps.view_cache.hit' if item is not None else 'sourcemaps.view_cache.miss',
+            instance=key[0],
+        )
+        if item is not None:
+            return item[1]
+
+    def set(self, key, value, size):
+        max_size = settings.SENTRY_JS_VIEW_CACHE_SIZE
+        if size > max_size:
+            return
+
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= previous[0]
+            self._data[key] = (size, value)
+            self.size += size
+            while self.size > max_size:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+view_cache = ViewCache()
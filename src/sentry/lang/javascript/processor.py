@@ -3,16 +3,21 @@ from __future__ import absolute_import, print_function
 __all__ = ['JavaScriptStacktraceProcessor']
 
 import logging
+import os
 import re
 import base64
 import six
+import threading
 import zlib
 
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from os.path import splitext
 from requests.utils import get_encoding_from_headers
 from six.moves.urllib.parse import urljoin, urlsplit
 from symbolic import SourceMapView
+from time import time
 
 # In case SSL is unavailable (light builds) we can't import this here.
 try:
@@ -25,15 +30,15 @@ except ImportError:
 
 from sentry import http
 from sentry.interfaces.stacktrace import Stacktrace
-from sentry.models import EventError, ReleaseFile
+from sentry.models import EventError, File, ReleaseFile
 from sentry.utils.cache import cache
 from sentry.utils.files import compress_file
 from sentry.utils.hashlib import md5_text
-from sentry.utils.http import is_valid_origin
+from sentry.utils.http import get_origins, is_valid_origin
 from sentry.utils import metrics
 from sentry.stacktraces import StacktraceProcessor
 
-from .cache import SourceCache, SourceMapCache
+from .cache import SourceCache, SourceMapCache, view_cache
 
 # number of surrounding lines (on each side) to fetch
 LINES_OF_CONTEXT = 5
@@ -65,6 +70,26 @@ MAX_RESOURCE_FETCHES = 100
 
 logger = logging.getLogger(__name__)
 
+# The project options which are used when scraping files.
+FetchOptions = namedtuple('FetchOptions', ['origins', 'verify_ssl', 'token', 'token_header'])
+
+# The threads that scrape files are kept per process.
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def get_fetch_executor():
+    global _fetch_executor
+    pid = os.getpid()
+    size = settings.SENTRY_JS_FETCH_CONCURRENCY
+    with _fetch_executor_lock:
+        # a forked process has to start its own threads
+        if _fetch_executor is None or _fetch_executor[:2] != (pid, size):
+            if _fetch_executor is not None and _fetch_executor[0] == pid:
+                _fetch_executor[2].shutdown(wait=False)
+            _fetch_executor = (pid, size, ThreadPoolExecutor(size))
+        return _fetch_executor[2]
+
 
 class UnparseableSourcemap(http.BadSource):
     error_type = EventError.JS_INVALID_SOURCEMAP
@@ -197,62 +222,75 @@ def discover_sourcemap(result):
     return sourcemap
 
 
-def fetch_release_file(filename, release, dist=None):
-    cache_key = 'releasefile:v1:%s:%s' % (release.id, md5_text(filename).hexdigest(), )
+def find_release_file(filename, release, dist=None):
+    """
+    Returns the ``ManifestEntry`` of the release artifact for ``filename``,
+    or ``None`` if the release has no such artifact.
+    """
+    logger.debug(
+        'Checking manifest for release artifact %r (release_id=%s)', filename, release.id
+    )
+
+    # Pick first one that matches in priority order.
+    entries = ReleaseFile.get_manifest_entries(
+        release.id, dist and dist.id, ReleaseFile.normalize(filename))
+    entry = next((e for e in entries if e is not None), None)
+    if entry is None:
+        logger.debug(
+            'Release artifact %r not found in manifest (release_id=%s)', filename, release.id
+        )
+    return entry
 
-    logger.debug('Checking cache for release artifact %r (release_id=%s)', filename, release.id)
-    result = cache.get(cache_key)
 
-    dist_name = dist and dist.name or None
+def get_release_file_checksum(filename, release, dist=None):
+    """
+    Returns the checksum of the release artifact for ``filename``, or
+    ``None`` if the release has no such artifact.
+    """
+    entry = find_release_file(filename, release, dist)
+    if entry is not None:
+        return entry.checksum
 
-    if result is None:
-        filename_choices = ReleaseFile.normalize(filename)
-        filename_idents = [ReleaseFile.get_ident(f, dist_name) for f in filename_choices]
 
-        logger.debug(
-            'Checking database for release artifact %r (release_id=%s)', filename, release.id
-        )
+def fetch_release_file(filename, release, dist=None):
+    cache_key = 'releasefile:v2:%s:%s:%s:%s' % (
+        release.id, dist and dist.id, ReleaseFile.get_cache_generation(release.id),
+        md5_text(filename).hexdigest(),
+    )
 
-        possible_files = list(
-            ReleaseFile.objects.filter(
-                release=release,
-                dist=dist,
-                ident__in=filename_idents,
-            ).select_related('file')
-        )
+    logger.debug('Checking cache for release artifact %r (release_id=%s)', filename, release.id)
+    result = cache.get(cache_key)
 
-        if len(possible_files) == 0:
-            logger.debug(
-                'Release artifact %r not found in database (release_id=%s)', filename, release.id
-            )
+    if result is None:
+        entry = find_release_file(filename, release, dist)
+        if entry is None:
             cache.set(cache_key, -1, 60)
             return None
-        elif len(possible_files) == 1:
-            releasefile = possible_files[0]
-        else:
-            # Pick first one that matches in priority order.
-            # This is O(N*M) but there are only ever at most 4 things here
-            # so not really worth optimizing.
-            releasefile = next((
-                rf
-                for ident in filename_idents
-                for rf in possible_files
-                if rf.ident == ident
-            ))
 
         logger.debug(
-            'Found release artifact %r (id=%s, release_id=%s)', filename, releasefile.id, release.id
+            'Found release artifact %r (id=%s, release_id=%s)', filename, entry.id, release.id
         )
         try:
             with metrics.timer('sourcemaps.release_file_read'):
-                with releasefile.file.getfile() as fp:
+                # manifest entries of uploads which were rolled back have no
+                # release file, they are dropped rather than cached as errors
+                file = File.objects.get(id=entry.file_id, releasefile=entry.id)
+                with file.getfile() as fp:
                     z_body, body = compress_file(fp)
+        except File.DoesNotExist:
+            logger.debug(
+                'Release artifact %r (id=%s) does not exist anymore (release_id=%s)',
+                filename, entry.id, release.id
+            )
+            ReleaseFile.bump_cache_generation(release.id)
+            ReleaseFile.clear_manifest(release.id, dist and dist.id)
+            return None
         except Exception as e:
             logger.exception(six.text_type(e))
             cache.set(cache_key, -1, 3600)
             result = None
         else:
-            headers = {k.lower(): v for k, v in releasefile.file.headers.items()}
+            headers = {k.lower(): v for k, v in file.headers.items()}
             encoding = get_encoding_from_headers(headers)
             result = http.UrlResult(filename, headers, body, 200, encoding)
             cache.set(cache_key, (headers, z_body, 200, encoding), 3600)
@@ -281,6 +319,48 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
 
     Attempts to fetch from the cache.
     """
+    if release:
+        result = fetch_release_artifact(url, release, dist)
+        if result is not None:
+            return result
+    return fetch_remote_file(url, project=project, allow_scraping=allow_scraping)
+
+
+def fetch_release_artifact(url, release, dist=None):
+    """
+    Looks the URL up in the artifacts of the release, returning a UrlResult
+    object or ``None`` if the release has no such artifact.
+    """
+    with metrics.timer('sourcemaps.release_file'):
+        result = fetch_release_file(url, release, dist)
+    if result is not None:
+        return verify_file(url, result)
+
+
+def get_fetch_options(project):
+    """
+    Returns the ``FetchOptions`` of a project, or ``None`` without project.
+    """
+    if project is None:
+        return None
+
+    return FetchOptions(
+        origins=get_origins(project),
+        verify_ssl=bool(project.get_option('sentry:verify_ssl', False)),
+        token=project.get_option('sentry:token'),
+        token_header=project.get_option('sentry:token_header') or 'X-Sentry-Token',
+    )
+
+
+def fetch_remote_file(url, project=None, allow_scraping=True, options=None):
+    """
+    Scrapes a URL, returning a UrlResult object.
+
+    The project options may be loaded from the database, so when this is
+    called from other threads than the one the processor runs in, they have
+    to be resolved with ``get_fetch_options`` first and passed as
+    ``options``.
+    """
     # If our url has been truncated, it'd be impossible to fetch
     # so we check for this early and bail
     if url[-3:] == '...':
@@ -290,46 +370,41 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
                 'url': http.expose_url(url),
             }
         )
-    if release:
-        with metrics.timer('sourcemaps.release_file'):
-            result = fetch_release_file(url, release, dist)
-    else:
-        result = None
 
-    cache_key = 'source:cache:v4:%s' % (md5_text(url).hexdigest(), )
+    if not allow_scraping or not url.startswith(('http:', 'https:')):
+        error = {
+            'type': EventError.JS_MISSING_SOURCE,
+            'url': http.expose_url(url),
+        }
+        raise http.CannotFetch(error)
 
-    if result is None:
-        if not allow_scraping or not url.startswith(('http:', 'https:')):
-            error = {
-                'type': EventError.JS_MISSING_SOURCE,
-                'url': http.expose_url(url),
-            }
-            raise http.CannotFetch(error)
+    cache_key = 'source:cache:v4:%s' % (md5_text(url).hexdigest(), )
 
-        logger.debug('Checking cache for url %r', url)
-        result = cache.get(cache_key)
-        if result is not None:
-            # Previous caches would be a 3-tuple instead of a 4-tuple,
-            # so this is being maintained for backwards compatibility
-            try:
-                encoding = result[4]
-            except IndexError:
-                encoding = None
-            # We got a cache hit, but the body is compressed, so we
-            # need to decompress it before handing it off
-            result = http.UrlResult(
-                result[0], result[1], zlib.decompress(result[2]), result[3], encoding
-            )
+    logger.debug('Checking cache for url %r', url)
+    result = cache.get(cache_key)
+    if result is not None:
+        # Previous caches would be a 3-tuple instead of a 4-tuple,
+        # so this is being maintained for backwards compatibility
+        try:
+            encoding = result[4]
+        except IndexError:
+            encoding = None
+        # We got a cache hit, but the body is compressed, so we
+        # need to decompress it before handing it off
+        result = http.UrlResult(
+            result[0], result[1], zlib.decompress(result[2]), result[3], encoding
+        )
 
     if result is None:
+        if options is None:
+            options = get_fetch_options(project)
+
         headers = {}
         verify_ssl = False
-        if project and is_valid_origin(url, project=project):
-            verify_ssl = bool(project.get_option('sentry:verify_ssl', False))
-            token = project.get_option('sentry:token')
-            if token:
-                token_header = project.get_option('sentry:token_header') or 'X-Sentry-Token'
-                headers[token_header] = token
+        if options is not None and is_valid_origin(url, allowed=options.origins):
+            verify_ssl = options.verify_ssl
+            if options.token:
+                headers[options.token_header] = options.token
 
         with metrics.timer('sourcemaps.fetch'):
             result = http.fetch_file(url, headers=headers, verify_ssl=verify_ssl)
@@ -343,6 +418,10 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
                  result.encoding),
                 get_max_age(result.headers))
 
+    return verify_file(url, result)
+
+
+def verify_file(url, result):
     # If we did not get a 200 OK we just raise a cannot fetch here.
     if result.status != 200:
         raise http.CannotFetch(
@@ -402,6 +481,17 @@ def get_max_age(headers):
     return min(max_age, CACHE_CONTROL_MAX)
 
 
+def parse_sourcemap(url, body):
+    try:
+        return SourceMapView.from_json_bytes(body)
+    except Exception as exc:
+        # This is in debug because the product shows an error already.
+        logger.debug(six.text_type(exc), exc_info=True)
+        raise UnparseableSourcemap({
+            'url': http.expose_url(url),
+        })
+
+
 def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=True):
     if is_data_uri(url):
         try:
@@ -418,14 +508,7 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
             url, project=project, release=release, dist=dist, allow_scraping=allow_scraping
         )
         body = result.body
-    try:
-        return SourceMapView.from_json_bytes(body)
-    except Exception as exc:
-        # This is in debug because the product shows an error already.
-        logger.debug(six.text_type(exc), exc_info=True)
-        raise UnparseableSourcemap({
-            'url': http.expose_url(url),
-        })
+    return parse_sourcemap(url, body)
 
 
 def is_data_uri(url):
@@ -754,57 +837,116 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         return self.cache.get(filename)
 
     def cache_source(self, filename):
-        sourcemaps = self.sourcemaps
+        self.cache_sources([filename])
+
+    def cache_sources(self, filenames):
+        """
+        Fetches the given sources and then the sourcemaps they reference.
+
+        Release artifacts are looked up in the calling thread since they
+        are stored in the database, everything that has to be scraped is
+        fetched concurrently.
+        """
         cache = self.cache
+        sourcemap_urls = []
+        remote_filenames = []
 
-        self.fetch_count += 1
+        for filename in filenames:
+            self.fetch_count += 1
 
-        if self.fetch_count > self.max_fetches:
-            cache.add_error(filename, {
-                'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
-            })
-            return
+            if self.fetch_count > self.max_fetches:
+                cache.add_error(filename, {
+                    'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
+                })
+                continue
 
-        # TODO: respect cache-control/max-age headers to some extent
-        logger.debug('Fetching remote source %r', filename)
-        try:
-            result = fetch_file(
-                filename,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping
-            )
-        except http.BadSource as exc:
-            cache.add_error(filename, exc.data)
-            return
+            # release artifacts which were parsed for an earlier event don't have
+            # to be fetched again
+            view_cache_key = self.get_view_cache_key('source', filename)
+            cached = view_cache.get(view_cache_key) if view_cache_key else None
+            if cached is not None:
+                source_view, sourcemap_url = cached
+                cache.add(filename, source_view)
+                sourcemap_urls.append((filename, sourcemap_url))
+                continue
 
-        cache.add(filename, result.body, result.encoding)
-        cache.alias(result.url, filename)
+            # TODO: respect cache-control/max-age headers to some extent
+            logger.debug('Fetching remote source %r', filename)
+            try:
+                result = self.fetch_release_artifact(filename)
+            except http.BadSource as exc:
+                cache.add_error(filename, exc.data)
+                continue
 
-        sourcemap_url = discover_sourcemap(result)
-        if not sourcemap_url:
-            return
+            if result is None:
+                remote_filenames.append(filename)
+                continue
 
-        logger.debug('Found sourcemap %r for minified script %r', sourcemap_url[:256], result.url)
-        sourcemaps.link(filename, sourcemap_url)
-        if sourcemap_url in sourcemaps:
-            return
+            sourcemap_url = self.add_source(filename, result)
+            if view_cache_key:
+                view_cache.set(
+                    view_cache_key, (cache.get(filename), sourcemap_url), len(result.body))
+            sourcemap_urls.append((filename, sourcemap_url))
 
-        # pull down sourcemap
-        try:
-            sourcemap_view = fetch_sourcemap(
-                sourcemap_url,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping,
-            )
-        except http.BadSource as exc:
-            cache.add_error(filename, exc.data)
-            return
+        for filename, result in self.fetch_concurrently(
+                'source', remote_filenames, self.fetch_remote_source):
+            if isinstance(result, http.BadSource):
+                cache.add_error(filename, result.data)
+            else:
+                sourcemap_urls.append((filename, self.add_source(filename, result)))
 
-        sourcemaps.add(sourcemap_url, sourcemap_view)
+        self.cache_sourcemaps(sourcemap_urls)
+
+    def cache_sourcemaps(self, sourcemap_urls):
+        """
+        Fetches the sourcemaps for a list of ``(filename, sourcemap_url)``
+        tuples of minified sources.
+        """
+        sourcemaps = self.sourcemaps
+        pending = OrderedDict()
+
+        for filename, sourcemap_url in sourcemap_urls:
+            if not sourcemap_url:
+                continue
+
+            logger.debug(
+                'Found sourcemap %r for minified script %r', sourcemap_url[:256], filename)
+            sourcemaps.link(filename, sourcemap_url)
+            if sourcemap_url not in sourcemaps:
+                pending.setdefault(sourcemap_url, []).append(filename)
+
+        # pull down sourcemaps
+        remote_urls = []
+        for sourcemap_url, filenames in six.iteritems(pending):
+            try:
+                sourcemap_view = self.fetch_sourcemap(sourcemap_url)
+            except http.BadSource as exc:
+                self.add_sourcemap_error(filenames, exc)
+                continue
+
+            if sourcemap_view is None:
+                remote_urls.append(sourcemap_url)
+            else:
+                self.add_sourcemap(sourcemap_url, sourcemap_view)
+
+        for sourcemap_url, result in self.fetch_concurrently(
+                'sourcemap', remote_urls, self.fetch_remote_sourcemap):
+            if isinstance(result, http.BadSource):
+                self.add_sourcemap_error(pending[sourcemap_url], result)
+            else:
+                self.add_sourcemap(sourcemap_url, result)
+
+    def add_source(self, filename, result):
+        """
+        Adds a fetched source to the cache and returns the URL of its
+        sourcemap, if it references one.
+        """
+        self.cache.add(filename, result.body, result.encoding)
+        self.cache.alias(result.url, filename)
+        return discover_sourcemap(result)
+
+    def add_sourcemap(self, sourcemap_url, sourcemap_view):
+        self.sourcemaps.add(sourcemap_url, sourcemap_view)
 
         # cache any inlined sources
         for src_id, source_name in sourcemap_view.iter_sources():
@@ -815,6 +957,95 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                     source_view
                 )
 
+    def add_sourcemap_error(self, filenames, exc):
+        for filename in filenames:
+            self.cache.add_error(filename, exc.data)
+
+    def fetch_release_artifact(self, filename):
+        if self.release is None:
+            return None
+        return fetch_release_artifact(filename, self.release, self.dist)
+
+    def fetch_sourcemap(self, sourcemap_url):
+        """
+        Returns the view of an inlined sourcemap or of a sourcemap in the
+        release artifacts, or ``None`` if the sourcemap has to be scraped.
+        """
+        if is_data_uri(sourcemap_url):
+            return fetch_sourcemap(sourcemap_url)
+
+        view_cache_key = self.get_view_cache_key('sourcemap', sourcemap_url)
+        if view_cache_key is not None:
+            sourcemap_view = view_cache.get(view_cache_key)
+            if sourcemap_view is not None:
+                return sourcemap_view
+
+        result = self.fetch_release_artifact(sourcemap_url)
+        if result is None:
+            return None
+
+        sourcemap_view = parse_sourcemap(sourcemap_url, result.body)
+        if view_cache_key is not None:
+            view_cache.set(view_cache_key, sourcemap_view, len(result.body))
+        return sourcemap_view
+
+    def fetch_remote_source(self, url, options):
+        return fetch_remote_file(
+            url, project=self.project, allow_scraping=self.allow_scraping, options=options)
+
+    def fetch_remote_sourcemap(self, url, options):
+        return parse_sourcemap(url, self.fetch_remote_source(url, options).body)
+
+    def fetch_concurrently(self, kind, urls, fetch):
+        """
+        Calls ``fetch`` with every URL and the ``FetchOptions`` of the project
+        on the thread pool of the process, which is bounded by
+        ``SENTRY_JS_FETCH_CONCURRENCY``, and returns a list of ``(url,
+        result)`` tuples, where the result is the exception for URLs that
+        could not be fetched.
+
+        ``fetch`` must not use the database, as the worker threads neither
+        share the connection nor the transaction of the processor. The
+        options are resolved before for that reason.
+        """
+        if not urls:
+            return []
+
+        options = get_fetch_options(self.project)
+        durations = []
+
+        def timed_fetch(url):
+            start = time()
+            try:
+                return fetch(url, options)
+            except http.BadSource as exc:
+                return exc
+            finally:
+                durations.append(time() - start)
+
+        metrics.timing('sourcemaps.fetch.fanout', len(urls), tags={'kind': kind})
+
+        start = time()
+        if len(urls) > 1 and settings.SENTRY_JS_FETCH_CONCURRENCY > 1:
+            results = list(get_fetch_executor().map(timed_fetch, urls))
+        else:
+            results = [timed_fetch(url) for url in urls]
+
+        # how much longer fetching the urls one after another would have taken
+        metrics.timing(
+            'sourcemaps.fetch.saved', max(sum(durations) - (time() - start), 0),
+            tags={'kind': kind},
+        )
+        return list(zip(urls, results))
+
+    def get_view_cache_key(self, kind, filename):
+        if self.release is None:
+            return None
+        checksum = get_release_file_checksum(filename, self.release, self.dist)
+        if checksum is None:
+            return None
+        return (kind, self.release.id, self.dist and self.dist.id, filename, checksum)
+
     def populate_source_cache(self, frames):
         """
         Fetch all sources that we know are required (being referenced directly
@@ -837,10 +1068,7 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 continue
             pending_file_list.add(f['abs_path'])
 
-        for idx, filename in enumerate(pending_file_list):
-            self.cache_source(
-                filename=filename,
-            )
+        self.cache_sources(pending_file_list)
 
     def close(self):
         StacktraceProcessor.close(self)
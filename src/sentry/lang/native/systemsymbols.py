@@ -1,30 +1,85 @@
 from __future__ import absolute_import
 
 import logging
+import threading
 
 from requests.exceptions import RequestException
 
 from sentry import options
 from sentry.http import Session
 from sentry.lang.native.utils import sdk_info_to_sdk_id
+from sentry.utils import metrics
+from sentry.utils.cache import cache
 
 MAX_ATTEMPTS = 3
 
+# System symbols never change, addresses which the symbol server does not
+# know are retried after a while in case the SDK is added to it.
+MATCH_CACHE_TTL = 24 * 60 * 60
+NO_MATCH_CACHE_TTL = 60 * 60
+NO_MATCH = 0
+
 logger = logging.getLogger(__name__)
 
 
+def get_cache_key(symbol):
+    return 'symbolserver:v1:%s:%s' % (symbol['object_uuid'], symbol['addr'])
+
+
 def lookup_system_symbols(symbols, sdk_info=None, cpu_name=None):
     """Looks for system symbols in the configured system server if
     enabled.  If this failes or the server is disabled, `None` is
     returned.
+
+    Results are shared between events through the cache, and lookups of
+    concurrent events are sent to the server together.
     """
     if not options.get('symbolserver.enabled'):
         return
 
+    return coalescer.lookup((sdk_info_to_sdk_id(sdk_info), cpu_name), symbols)
+
+
+def lookup_cached_system_symbols(sdk_id, cpu_name, symbols):
+    """Like `lookup_system_symbols` but only asks the symbol server for
+    the symbols which are not in the cache.
+    """
+    keys = [get_cache_key(symbol) for symbol in symbols]
+    cached = cache.get_many(keys)
+
+    missing = [symbol for key, symbol in zip(keys, symbols) if key not in cached]
+    if cached:
+        metrics.incr('symbolserver.cache.hit', len(cached))
+    if missing:
+        metrics.incr('symbolserver.cache.miss', len(missing))
+        rv = lookup_remote_system_symbols(sdk_id, cpu_name, missing)
+        if rv is None:
+            if not cached:
+                return None
+            rv = [None] * len(missing)
+        else:
+            matches = {}
+            no_matches = {}
+            for symbol, match in zip(missing, rv):
+                if match:
+                    matches[get_cache_key(symbol)] = match
+                else:
+                    no_matches[get_cache_key(symbol)] = NO_MATCH
+            if matches:
+                cache.set_many(matches, MATCH_CACHE_TTL)
+            if no_matches:
+                cache.set_many(no_matches, NO_MATCH_CACHE_TTL)
+        for symbol, match in zip(missing, rv):
+            cached[get_cache_key(symbol)] = match
+
+    return [cached.get(key) or None for key in keys]
+
+
+def lookup_remote_system_symbols(sdk_id, cpu_name, symbols):
     url = '%s/lookup' % options.get('symbolserver.options')['url'].rstrip('/')
     sess = Session()
     symbol_query = {
-        'sdk_id': sdk_info_to_sdk_id(sdk_info),
+        'sdk_id': sdk_id,
         'cpu_name': cpu_name,
         'symbols': symbols,
     }
@@ -47,3 +102,71 @@ def lookup_system_symbols(symbols, sdk_info=None, cpu_name=None):
                 if attempts > MAX_ATTEMPTS:
                     logger.error('Failed to contact system symbol server', exc_info=True)
                     return
+
+
+class LookupBatch(object):
+    def __init__(self):
+        self.symbols = []
+        self.indexes = {}
+        self.results = None
+        self.done = threading.Event()
+
+    def add(self, symbol):
+        key = get_cache_key(symbol)
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = len(self.symbols)
+            self.symbols.append(symbol)
+        return index
+
+
+class LookupCoalescer(object):
+    """
+    Groups the system symbol lookups of concurrent events.
+
+    There is at most one request to the symbol server in flight per SDK
+    and CPU. Lookups which come in while a request is in flight are
+    collected in a batch, which the first of them sends once the request
+    finished. As sending goes through the cache, symbols which were part
+    of the previous request are not requested again.
+    """
+
+    def __init__(self, lookup=lookup_cached_system_symbols):
+        self._lookup = lookup
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._sending = {}
+
+    def lookup(self, group, symbols):
+        with self._lock:
+            batch = self._pending.get(group)
+            is_sender = batch is None
+            if is_sender:
+                batch = self._pending[group] = LookupBatch()
+                sending = self._sending.setdefault(group, threading.Lock())
+            indexes = [batch.add(symbol) for symbol in symbols]
+
+        if is_sender:
+            self.send(group, batch, sending)
+        else:
+            metrics.incr('symbolserver.coalesced', len(symbols))
+            batch.done.wait()
+
+        if batch.results is None:
+            return None
+        return [batch.results[index] for index in indexes]
+
+    def send(self, group, batch, sending):
+        try:
+            with sending:
+                # lookups that come in from now on go into the next batch
+                with self._lock:
+                    del self._pending[group]
+                metrics.timing('symbolserver.batch_size', len(batch.symbols))
+                sdk_id, cpu_name = group
+                batch.results = self._lookup(sdk_id, cpu_name, batch.symbols)
+        finally:
+            batch.done.set()
+
+
+coalescer = LookupCoalescer()
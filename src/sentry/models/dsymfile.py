@@ -18,9 +18,12 @@ import shutil
 import hashlib
 import logging
 import tempfile
+import threading
+from collections import OrderedDict
 from requests.exceptions import RequestException
 
 from jsonfield import JSONField
+from django.conf import settings
 from django.db import models, transaction, IntegrityError
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
@@ -33,6 +36,7 @@ from sentry.cache import default_cache
 from sentry.db.models import FlexibleForeignKey, Model, \
     sane_repr, BaseManager, BoundedPositiveIntegerField
 from sentry.models.file import File, ChunkFileState
+from sentry.utils import metrics
 from sentry.utils.zip import safe_extract_zip
 from sentry.constants import KNOWN_DSYM_TYPES
 from sentry.reprocessing import resolve_processing_issue, \
@@ -466,6 +470,88 @@ def find_dsym_file(project, image_uuid):
         pass
 
 
+class SymCachePool(object):
+    """
+    Keeps opened symcaches around so that every worker only maps the
+    symcaches of frequently used images once. The pool is shared by all
+    threads of a process and bounded by the total size of the mapped
+    files, as configured by ``SENTRY_SYMCACHE_POOL_SIZE``.
+
+    As long as a symcache is in the pool the timestamp of its file is
+    bumped like for symcaches loaded from disk, so that it is not removed
+    by ``DSymCache.clear_old_entries``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._symcaches = OrderedDict()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._symcaches)
+
+    def get(self, path, symcache_file_id):
+        key = (path, symcache_file_id)
+        with self._lock:
+            item = self._symcaches.pop(key, None)
+            if item is not None:
+                self._symcaches[key] = item
+        if item is None:
+            return None
+
+        symcache, size, bumped = item
+        now = int(time.time())
+        if bumped < now - ONE_DAY:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                # the file was cleared, it has to be stored again
+                self.remove(path, symcache_file_id)
+                return None
+            with self._lock:
+                if key in self._symcaches:
+                    self._symcaches[key] = (symcache, size, now)
+
+        metrics.incr('symcache.pool.hit')
+        return symcache
+
+    def add(self, path, symcache_file_id, symcache, size, mtime):
+        max_size = settings.SENTRY_SYMCACHE_POOL_SIZE
+        if size > max_size:
+            return
+
+        key = (path, symcache_file_id)
+        evicted = 0
+        with self._lock:
+            previous = self._symcaches.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._symcaches[key] = (symcache, size, int(mtime))
+            self.size += size
+            while self.size > max_size:
+                _, (_, evicted_size, _) = self._symcaches.popitem(last=False)
+                self.size -= evicted_size
+                evicted += 1
+
+        # symcaches are unmapped once the last event using them is done
+        if evicted:
+            metrics.incr('symcache.pool.evict', evicted)
+
+    def remove(self, path, symcache_file_id):
+        with self._lock:
+            item = self._symcaches.pop((path, symcache_file_id), None)
+            if item is not None:
+                self.size -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._symcaches.clear()
+            self.size = 0
+
+
+symcache_pool = SymCachePool()
+
+
 class DSymCache(object):
     @property
     def cache_path(self):
@@ -663,15 +749,22 @@ class DSymCache(object):
         base = self.get_project_path(project)
         for dsym_uuid, symcache_file in cachefiles:
             cachefile_path = os.path.join(base, dsym_uuid + '.symcache')
-            try:
-                stat = os.stat(cachefile_path)
-            except OSError as e:
-                if e.errno != errno.ENOENT:
-                    raise
-                symcache_file.cache_file.save_to(cachefile_path)
-            else:
-                self._try_bump_timestamp(cachefile_path, stat)
-            rv[uuid.UUID(dsym_uuid)] = SymCache.from_path(cachefile_path)
+            symcache = symcache_pool.get(cachefile_path, symcache_file.id)
+            if symcache is None:
+                try:
+                    stat = os.stat(cachefile_path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    symcache_file.cache_file.save_to(cachefile_path)
+                    stat = os.stat(cachefile_path)
+                else:
+                    self._try_bump_timestamp(cachefile_path, stat)
+                symcache = SymCache.from_path(cachefile_path)
+                symcache_pool.add(
+                    cachefile_path, symcache_file.id, symcache, stat.st_size, stat.st_mtime)
+                metrics.incr('symcache.pool.open')
+            rv[uuid.UUID(dsym_uuid)] = symcache
         return rv
 
     def _try_bump_timestamp(self, path, old_stat):
@@ -11,6 +11,9 @@ from __future__ import absolute_import
 import os
 import six
 import mmap
+import time
+import errno
+import logging
 import tempfile
 
 from hashlib import sha1
@@ -28,9 +31,13 @@ from jsonfield import JSONField
 from sentry.app import locks
 from sentry.db.models import (BoundedPositiveIntegerField, FlexibleForeignKey, Model)
 from sentry.utils import metrics
+from sentry.utils.iterators import chunked
 from sentry.utils.retries import TimedRetryPolicy
 
+logger = logging.getLogger(__name__)
+
 ONE_DAY = 60 * 60 * 24
+ONE_HOUR = 60 * 60
 
 DEFAULT_BLOB_SIZE = 1024 * 1024  # one mb
 CHUNK_STATE_HEADER = '__state'
@@ -67,6 +74,230 @@ def get_storage():
     return storage(**options)
 
 
+def _get_size_and_checksum(fileobj):
+    size = 0
+    checksum = sha1(b'')
+    for chunk in fileobj:
+        size += len(chunk)
+        checksum.update(chunk)
+    return size, checksum.hexdigest()
+
+
+class MappedFile(object):
+    """
+    A read only file object over a memory mapped file.  Reads are slices of
+    the mapping, which don't go through any intermediate buffers.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # empty files can't be mapped
+            self._mem = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ) \
+                if self.size else None
+        self._pos = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+
+    def read(self, n=-1):
+        self._check_closed()
+        if n is None or n < 0:
+            end = self.size
+        else:
+            end = min(self._pos + n, self.size)
+        if self._pos >= end:
+            return b''
+        rv = self._mem[self._pos:end]
+        self._pos = end
+        return rv
+
+    def chunks(self, chunk_size=64 * 1024):
+        self.seek(0)
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        self._check_closed()
+        if whence == os.SEEK_CUR:
+            pos += self._pos
+        elif whence == os.SEEK_END:
+            pos += self.size
+        if pos < 0:
+            raise IOError('Invalid argument')
+        self._pos = pos
+
+    def tell(self):
+        self._check_closed()
+        return self._pos
+
+    def close(self):
+        if self._mem is not None:
+            self._mem.close()
+            self._mem = None
+        self.closed = True
+
+
+class FileBlobCache(object):
+    """
+    A content addressed cache of blobs on the local disk that is shared by
+    all processes of a host.  Blobs are stored by their checksum in
+    ``SENTRY_FILE_BLOB_CACHE_PATH`` and read from memory mapped files.  The
+    cache is bounded by ``SENTRY_FILE_BLOB_CACHE_SIZE``, the least recently
+    used blobs are removed by ``clear_old_entries``.
+    """
+
+    @property
+    def cache_path(self):
+        return settings.SENTRY_FILE_BLOB_CACHE_PATH
+
+    @property
+    def enabled(self):
+        return bool(self.cache_path)
+
+    def get_path(self, checksum):
+        return os.path.join(self.cache_path, checksum[:2], checksum)
+
+    def open(self, blob):
+        """
+        Returns a file object for the contents of the blob, which is fetched
+        into the cache first if it is not cached yet.
+        """
+        path = self.get_path(blob.checksum)
+        try:
+            rv = MappedFile(path)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            metrics.incr('filestore.blob-cache.hit')
+            self._try_bump_timestamp(path)
+            return rv
+
+        metrics.incr('filestore.blob-cache.miss')
+        if not self._fetch(blob, path):
+            return blob.getfile()
+        return MappedFile(path)
+
+    def _fetch(self, blob, path):
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            pass
+
+        # blobs are written to a temporary file and moved into place, so
+        # that other processes never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+        try:
+            checksum = sha1(b'')
+            with os.fdopen(fd, 'wb') as dst, blob.getfile() as src:
+                for chunk in src.chunks():
+                    checksum.update(chunk)
+                    dst.write(chunk)
+            if checksum.hexdigest() != blob.checksum:
+                logger.warning('filestore.blob-cache.checksum-mismatch',
+                               extra={'blob_id': blob.id, 'checksum': blob.checksum})
+                os.remove(tmp_path)
+                return False
+            os.rename(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return True
+
+    def _try_bump_timestamp(self, path):
+        now = int(time.time())
+        try:
+            if os.path.getmtime(path) < now - ONE_HOUR:
+                os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def clear_old_entries(self):
+        if not self.enabled:
+            return
+
+        try:
+            cache_folders = os.listdir(self.cache_path)
+        except OSError:
+            return
+
+        entries = []
+        for cache_folder in cache_folders:
+            cache_folder = os.path.join(self.cache_path, cache_folder)
+            try:
+                items = os.listdir(cache_folder)
+            except OSError:
+                continue
+            for cached_file in items:
+                is_temporary = cached_file.startswith('.')
+                cached_file = os.path.join(cache_folder, cached_file)
+                try:
+                    stat = os.stat(cached_file)
+                except OSError:
+                    continue
+                # blobs which are being fetched are skipped unless they
+                # were left behind
+                if is_temporary:
+                    if stat.st_mtime < time.time() - ONE_DAY:
+                        try:
+                            os.remove(cached_file)
+                        except OSError:
+                            pass
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, cached_file))
+
+        size = sum(entry[1] for entry in entries)
+        entries.sort()
+        for mtime, file_size, cached_file in entries:
+            if size <= settings.SENTRY_FILE_BLOB_CACHE_SIZE:
+                break
+            try:
+                os.remove(cached_file)
+            except OSError:
+                continue
+            size -= file_size
+            metrics.incr('filestore.blob-cache.evict')
+
+
+blob_cache = FileBlobCache()
+
+
+def open_blob(blob):
+    """
+    Returns a file object for the contents of a blob, which is served from
+    the local blob cache if it is enabled.
+    """
+    if blob_cache.enabled:
+        return blob_cache.open(blob)
+    return blob.getfile()
+
+
+def fetch_blob(blob):
+    """
+    Like ``open_blob`` but the contents are fetched right away, into memory
+    if the blob cache is disabled.
+    """
+    if blob_cache.enabled:
+        return blob_cache.open(blob)
+    with blob.getfile() as f:
+        return ContentFile(f.read())
+
+
 class FileBlob(Model):
     __core__ = False
 
@@ -88,13 +319,7 @@ class FileBlob(Model):
 
         >>> blobs = FileBlob.from_file(fileobj)
         """
-        size = 0
-
-        checksum = sha1(b'')
-        for chunk in fileobj:
-            size += len(chunk)
-            checksum.update(chunk)
-        checksum = checksum.hexdigest()
+        size, checksum = _get_size_and_checksum(fileobj)
 
         # TODO(dcramer): the database here is safe, but if this lock expires
         # and duplicate files are uploaded then we need to prune one
@@ -122,6 +347,67 @@ class FileBlob(Model):
         metrics.timing('filestore.blob-size', size)
         return blob
 
+    @classmethod
+    def from_files(cls, fileobjs, concurrency=None):
+        """
+        Like ``from_file`` for a list of files, of which the ones that are not
+        present yet are stored concurrently.  Returns the blobs in the order
+        of the files.
+
+        >>> blobs = FileBlob.from_files([fileobj1, fileobj2])
+        """
+        if concurrency is None:
+            concurrency = settings.SENTRY_FILE_BLOB_UPLOAD_CONCURRENCY
+
+        files = {}
+        checksums = []
+        for fileobj in fileobjs:
+            size, checksum = _get_size_and_checksum(fileobj)
+            files.setdefault(checksum, (size, fileobj))
+            checksums.append(checksum)
+
+        blobs = {
+            blob.checksum: blob for blob in FileBlob.objects.filter(checksum__in=files)
+        }
+        missing = sorted(set(files) - set(blobs))
+
+        # the locks are acquired in the order of the checksums so that
+        # concurrent uploads of overlapping blobs can't deadlock
+        acquired = []
+        try:
+            for checksum in missing:
+                lock = locks.get('fileblob:upload:{}'.format(checksum), duration=60 * 10)
+                TimedRetryPolicy(60)(lock.acquire)
+                acquired.append(lock)
+
+            blobs.update(
+                (blob.checksum, blob) for blob in FileBlob.objects.filter(checksum__in=missing)
+            )
+            new_blobs = [
+                cls(size=files[checksum][0], checksum=checksum)
+                for checksum in missing if checksum not in blobs
+            ]
+
+            # only the storage is written to from the threads
+            storage = get_storage()
+            with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as exe:
+                futures = []
+                for blob in new_blobs:
+                    blob.path = cls.generate_unique_path(blob.timestamp)
+                    futures.append(exe.submit(storage.save, blob.path, files[blob.checksum][1]))
+                for future in futures:
+                    future.result()
+
+            for blob in new_blobs:
+                blob.save()
+                blobs[blob.checksum] = blob
+                metrics.timing('filestore.blob-size', blob.size)
+        finally:
+            for lock in acquired:
+                lock.release()
+
+        return [blobs[checksum] for checksum in checksums]
+
     @classmethod
     def generate_unique_path(cls, timestamp):
         pieces = [six.text_type(x) for x in divmod(int(timestamp.strftime('%s')), ONE_DAY)]
@@ -250,21 +536,21 @@ class File(Model):
         offset = 0
         checksum = sha1(b'')
 
-        while True:
-            contents = fileobj.read(blob_size)
-            if not contents:
-                break
-            checksum.update(contents)
-
-            blob_fileobj = ContentFile(contents)
-            blob = FileBlob.from_file(blob_fileobj)
+        # a few blobs are read at a time and uploaded concurrently
+        concurrency = settings.SENTRY_FILE_BLOB_UPLOAD_CONCURRENCY
+        for batch in chunked(iter(lambda: fileobj.read(blob_size), b''), max(concurrency, 1)):
+            for contents in batch:
+                checksum.update(contents)
 
-            results.append(FileBlobIndex.objects.create(
-                file=self,
-                blob=blob,
-                offset=offset,
-            ))
-            offset += blob.size
+            blobs = FileBlob.from_files([ContentFile(contents) for contents in batch],
+                                        concurrency=concurrency)
+            for blob in blobs:
+                results.append(FileBlobIndex.objects.create(
+                    file=self,
+                    blob=blob,
+                    offset=offset,
+                ))
+                offset += blob.size
         self.size = offset
         self.checksum = checksum.hexdigest()
         metrics.timing('filestore.file-size', offset)
@@ -330,6 +616,11 @@ class ChunkedFileBlobIndexWrapper(object):
         self._indexes = list(indexes)
         self._curfile = None
         self._curidx = None
+        # blobs following the current one which are fetched concurrently,
+        # once a blob was reached by reading through the one before it
+        self._fetches = {}
+        self._executor = None
+        self._lastpos = None
         if prefetch:
             self.prefetched = True
             self._prefetch(prefetch_to, delete)
@@ -358,8 +649,9 @@ class ChunkedFileBlobIndexWrapper(object):
         old_file = self._curfile
         try:
             try:
-                self._curidx = six.next(self._idxiter)
-                self._curfile = self._curidx.blob.getfile()
+                pos = six.next(self._idxiter)
+                self._curidx = self._indexes[pos]
+                self._curfile = self._open(pos)
             except StopIteration:
                 self._curidx = None
                 self._curfile = None
@@ -367,6 +659,41 @@ class ChunkedFileBlobIndexWrapper(object):
             if old_file is not None:
                 old_file.close()
 
+    def _open(self, pos):
+        future = self._fetches.pop(pos, None)
+
+        # Blobs are only fetched ahead while the file is read sequentially,
+        # seeks (e.g. to read a header) would otherwise fetch blobs which
+        # are never read. Fetches that are not ahead of the blob anymore are
+        # dropped, and the next blobs are fetched in the background.
+        if self._lastpos is not None and pos == self._lastpos + 1:
+            readahead = range(pos + 1, min(pos + 1 + settings.SENTRY_FILE_BLOB_READAHEAD,
+                                           len(self._indexes)))
+        else:
+            readahead = []
+        self._lastpos = pos
+        for other in list(self._fetches):
+            if other not in readahead:
+                self._discard(self._fetches.pop(other))
+        for other in readahead:
+            if other not in self._fetches:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.SENTRY_FILE_BLOB_READAHEAD)
+                self._fetches[other] = self._executor.submit(
+                    fetch_blob, self._indexes[other].blob)
+
+        if future is not None:
+            return future.result()
+        return open_blob(self._indexes[pos].blob)
+
+    def _discard(self, future):
+        def close(future):
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        future.add_done_callback(close)
+        future.cancel()
+
     @property
     def size(self):
         return sum(i.blob.size for i in self._indexes)
@@ -391,8 +718,8 @@ class ChunkedFileBlobIndexWrapper(object):
 
         mem = mmap.mmap(f.fileno(), size)
 
-        def fetch_file(offset, getfile):
-            with getfile() as sf:
+        def fetch_file(offset, blob):
+            with open_blob(blob) as sf:
                 while 1:
                     chunk = sf.read(65535)
                     if not chunk:
@@ -402,7 +729,7 @@ class ChunkedFileBlobIndexWrapper(object):
 
         with ThreadPoolExecutor(max_workers=4) as exe:
             for idx in self._indexes:
-                exe.submit(fetch_file, idx.offset, idx.blob.getfile)
+                exe.submit(fetch_file, idx.offset, idx.blob)
 
         mem.flush()
         self._curfile = f
@@ -410,8 +737,15 @@ class ChunkedFileBlobIndexWrapper(object):
     def close(self):
         if self._curfile:
             self._curfile.close()
+        for future in six.itervalues(self._fetches):
+            self._discard(future)
+        self._fetches = {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         self._curfile = None
         self._curidx = None
+        self._lastpos = None
         self.closed = True
 
     def seek(self, pos):
@@ -426,7 +760,7 @@ class ChunkedFileBlobIndexWrapper(object):
         for n, idx in enumerate(self._indexes[::-1]):
             if idx.offset <= pos:
                 if idx != self._curidx:
-                    self._idxiter = iter(self._indexes[-(n + 1):])
+                    self._idxiter = iter(range(len(self._indexes) - n - 1, len(self._indexes)))
                     self._nextidx()
                 break
         else:
@@ -449,28 +783,21 @@ class ChunkedFileBlobIndexWrapper(object):
         if self.prefetched:
             return self._curfile.read(n)
 
-        result = bytearray()
-
-        # Read to the end of the file
-        if n < 0:
-            while self._curfile is not None:
-                blob_result = self._curfile.read(32768)
-                if not blob_result:
-                    self._nextidx()
-                else:
-                    result.extend(blob_result)
-
-        # Read until a certain number of bytes are read
-        else:
-            while n > 0 and self._curfile is not None:
-                blob_result = self._curfile.read(min(n, 32768))
-                if not blob_result:
-                    self._nextidx()
-                else:
+        # Read to the end of the file if n is negative, or until a certain
+        # number of bytes are read.  Reads within a blob are returned as is.
+        result = []
+        while n != 0 and self._curfile is not None:
+            blob_result = self._curfile.read() if n < 0 else self._curfile.read(n)
+            if not blob_result:
+                self._nextidx()
+            else:
+                if n > 0:
                     n -= len(blob_result)
-                    result.extend(blob_result)
+                result.append(blob_result)
 
-        return bytes(result)
+        if len(result) == 1:
+            return result[0]
+        return b''.join(result)
 
 
 class FileBlobOwner(Model):
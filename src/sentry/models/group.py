@@ -153,6 +153,7 @@ class GroupManager(BaseManager):
         project_id = group.project_id
         date = group.last_seen
 
+        group_tags = []
         for tag_item in tags:
             if len(tag_item) == 2:
                 (key, value), data = tag_item, None
@@ -163,11 +164,12 @@ class GroupManager(BaseManager):
                 'last_seen': date,
                 'data': data,
             })
+            group_tags.append((key, value))
 
-            tagstore.incr_group_tag_value_times_seen(project_id, group.id, environment.id, key, value, extra={
-                'project_id': project_id,
-                'last_seen': date,
-            })
+        tagstore.incr_group_tag_values_times_seen(project_id, group.id, environment.id, group_tags, extra={
+            'project_id': project_id,
+            'last_seen': date,
+        })
 
 
 class Group(Model):
@@ -125,10 +125,10 @@ class GroupAssignee(Model):
         super(GroupAssignee, self).save(*args, **kwargs)
 
     def assigned_actor_id(self):
-        if self.user:
+        if self.user_id:
             return u"user:{}".format(self.user_id)
 
-        if self.team:
+        if self.team_id:
             return u"team:{}".format(self.team_id)
 
         raise NotImplementedError("Unkown Assignee")
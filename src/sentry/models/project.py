@@ -355,6 +355,8 @@ class Project(Model):
                     environment_names[environment_id],
                 ).id,
             )
+        if rules_by_environment_id:
+            Rule.clear_project_cache(self.id)
 
         # ensure this actually exists in case from team was null
         self.add_team(team)
@@ -213,8 +213,15 @@ class Release(Model):
 
             Group.objects.filter(first_release=release).update(first_release=to_release)
 
+            # release files were moved without sending signals
+            ReleaseFile.bump_cache_generation(release.id)
+            ReleaseFile.clear_release_manifests(release.id)
+
             release.delete()
 
+        ReleaseFile.bump_cache_generation(to_release.id)
+        ReleaseFile.clear_release_manifests(to_release.id)
+
     @classmethod
     def get_closest_releases(cls, project, start_version, limit=5):
         # given a release version + project, return next
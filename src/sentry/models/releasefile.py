@@ -8,12 +8,32 @@ sentry.models.releasefile
 
 from __future__ import absolute_import
 
+import six
+
+from collections import namedtuple
 from django.db import models
 from six.moves.urllib.parse import urlsplit, urlunsplit
+from uuid import uuid4
 
 from sentry.db.models import BoundedPositiveIntegerField, FlexibleForeignKey, Model, sane_repr
+from sentry.utils import json, redis
+from sentry.utils.cache import cache
 from sentry.utils.hashlib import sha1_text
 
+MANIFEST_KEY = 'releasefile:manifest:{}:{}'
+# field of manifests which contain all files of their release and dist, as
+# opposed to manifests that only received the files uploaded after they
+# expired
+MANIFEST_COMPLETE = '\x00complete'
+# field of manifests which changes whenever they are cleared, so that
+# manifests built concurrently with a clear are discarded
+MANIFEST_VERSION = '\x00version'
+MANIFEST_TTL = 24 * 3600
+
+store_manifest = redis.load_script('releasefiles/store_manifest.lua')
+
+ManifestEntry = namedtuple('ManifestEntry', ['id', 'file_id', 'checksum'])
+
 
 class ReleaseFile(Model):
     r"""
@@ -53,7 +73,109 @@ class ReleaseFile(Model):
             kwargs['ident'] = self.ident = type(self).get_ident(
                 kwargs['name'], dist and dist.name or dist
             )
-        return super(ReleaseFile, self).update(*args, **kwargs)
+        dist_id = self.dist_id
+        rv = super(ReleaseFile, self).update(*args, **kwargs)
+        type(self).bump_cache_generation(self.release_id)
+        type(self).clear_manifest(self.release_id, dist_id)
+        type(self).clear_manifest(self.release_id, self.dist_id)
+        return rv
+
+    @classmethod
+    def get_cache_generation(cls, release_id):
+        """Returns a value which changes whenever the files of a release
+        change, so that it can be part of cache keys for release files.
+        """
+        return cache.get('releasefile:generation:%s' % (release_id, )) or 0
+
+    @classmethod
+    def bump_cache_generation(cls, release_id):
+        # this has to outlive any cache entry that depends on it
+        cache.set('releasefile:generation:%s' % (release_id, ), uuid4().hex, 7 * 24 * 3600)
+
+    @classmethod
+    def get_manifest_entries(cls, release_id, dist_id, names):
+        """
+        Returns a list with the ``ManifestEntry`` of every name, or ``None``
+        for names that are not files of the release and dist.
+
+        The manifest of a release and dist maps the names of its files to
+        their ids and checksums. It is kept in Redis and built from the
+        database when it is missing.
+        """
+        key = MANIFEST_KEY.format(release_id, dist_id)
+        values = redis.clusters.get('default').get_local_client_for_key(key).hmget(
+            key, [MANIFEST_COMPLETE] + list(names)
+        )
+        if values[0] is None:
+            manifest = cls.build_manifest(release_id, dist_id)
+            values = [manifest.get(name) for name in names]
+        else:
+            values = values[1:]
+        return [ManifestEntry(*json.loads(value)) if value is not None else None
+                for value in values]
+
+    @classmethod
+    def build_manifest(cls, release_id, dist_id):
+        key = MANIFEST_KEY.format(release_id, dist_id)
+        client = redis.clusters.get('default').get_local_client_for_key(key)
+        version = client.hget(key, MANIFEST_VERSION)
+
+        manifest = {
+            name: json.dumps([id, file_id, checksum])
+            for name, id, file_id, checksum in cls.objects.filter(
+                release=release_id,
+                dist=dist_id,
+            ).values_list('name', 'id', 'file_id', 'file__checksum')
+        }
+
+        # files which were uploaded while the manifest was built are added
+        # to it by their receiver, so its entries are never dropped here. If
+        # the manifest was cleared in the meantime, this one is outdated and
+        # is not stored.
+        args = [MANIFEST_VERSION, version or '', MANIFEST_COMPLETE, MANIFEST_TTL]
+        for name, value in six.iteritems(manifest):
+            args.extend((name, value))
+        store_manifest(client, (key, ), args)
+        return manifest
+
+    @classmethod
+    def add_to_manifest(cls, releasefile):
+        # This runs before the upload is committed, so the entry outlives a
+        # rolled back upload. Readers have to treat entries whose release
+        # file does not exist as misses.
+        key = MANIFEST_KEY.format(releasefile.release_id, releasefile.dist_id)
+        with redis.clusters.get('default').map() as client:
+            client.hset(key, releasefile.name, json.dumps([
+                releasefile.id, releasefile.file_id, releasefile.file.checksum,
+            ]))
+            client.expire(key, MANIFEST_TTL)
+
+    @classmethod
+    def clear_manifest(cls, release_id, dist_id):
+        key = MANIFEST_KEY.format(release_id, dist_id)
+        pipe = redis.clusters.get('default').get_local_client_for_key(key).pipeline()
+        pipe.delete(key)
+        pipe.hset(key, MANIFEST_VERSION, uuid4().hex)
+        pipe.expire(key, MANIFEST_TTL)
+        pipe.execute()
+
+    @classmethod
+    def clear_release_manifests(cls, release_id):
+        """
+        Clears the manifests of all dists of a release, for changes that
+        bypass the signals of release files such as queryset updates.
+        """
+        from sentry.models import Distribution
+
+        dist_ids = set([None])
+        dist_ids.update(
+            Distribution.objects.filter(release=release_id).values_list('id', flat=True)
+        )
+        dist_ids.update(
+            cls.objects.filter(release=release_id).values_list('dist_id', flat=True).distinct()
+        )
+        for dist_id in dist_ids:
+            cls.clear_manifest(release_id, dist_id)
 
     @classmethod
     def get_ident(cls, name, dist=None):
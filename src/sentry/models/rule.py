@@ -63,16 +63,27 @@ class Rule(Model):
             cache.set(cache_key, rules_list, 60)
         return rules_list
 
+    @classmethod
+    def clear_project_cache(cls, project_id):
+        """
+        Clears the cached rules of a project, which has to be done whenever
+        they change (including through queryset updates).
+        """
+        cache.delete('project:{}:rules'.format(project_id))
+
     def delete(self, *args, **kwargs):
         rv = super(Rule, self).delete(*args, **kwargs)
-        cache_key = 'project:{}:rules'.format(self.project_id)
-        cache.delete(cache_key)
+        self.clear_project_cache(self.project_id)
         return rv
 
     def save(self, *args, **kwargs):
         rv = super(Rule, self).save(*args, **kwargs)
-        cache_key = 'project:{}:rules'.format(self.project_id)
-        cache.delete(cache_key)
+        self.clear_project_cache(self.project_id)
+        return rv
+
+    def update(self, *args, **kwargs):
+        rv = super(Rule, self).update(*args, **kwargs)
+        self.clear_project_cache(self.project_id)
         return rv
 
     def get_audit_log_data(self):
@@ -14,15 +14,63 @@ from base64 import b64encode
 from threading import local
 from uuid import uuid4
 
+from sentry.nodestore import codecs
+from sentry.utils import metrics
 from sentry.utils.services import Service
 
 
 class NodeStorage(local, Service):
+    """
+    Backends which store opaque values accept a ``codec`` option that
+    controls how node data is encoded:
+
+    >>> NodeStorage(codec={
+    ...     'path': 'sentry.nodestore.codecs.NodeCodec',
+    ...     'options': {'serializer': 'msgpack', 'compressor': 'zstd'},
+    ... })
+
+    Values written by a codec carry a version header, so they can be read
+    regardless of the current configuration, as can values which were
+    written before a codec was configured.
+    """
     __all__ = (
         'create', 'delete', 'delete_multi', 'get', 'get_multi', 'set', 'set_multi', 'generate_id',
         'cleanup', 'validate'
     )
 
+    def __init__(self, codec=None):
+        self.codec = codecs.load(codec)
+
+    def encode(self, data, default):
+        """
+        Encodes ``data`` with the configured codec, or with ``default`` if
+        there is none.
+        """
+        if self.codec is None:
+            return default(data)
+        return self.codec.encode(data)
+
+    def decode(self, value, default):
+        """
+        Decodes ``value`` with the codec if it was written by one, otherwise
+        ``default`` is used to decode a value in the legacy format.
+        """
+        codec = self.codec
+        if codec is None:
+            codec = self.get_default_codec()
+        if codec.is_encoded(value):
+            return codec.decode(value)
+        return default(value)
+
+    def get_default_codec(self):
+        # values may have been written with a codec configuration that has
+        # since been removed, those can be read as long as they don't depend
+        # on a dictionary
+        codec = getattr(self, '_default_codec', None)
+        if codec is None:
+            codec = self._default_codec = codecs.NodeCodec(compressor='none')
+        return codec
+
     def create(self, data):
         """
         >>> key = nodestore.create({'foo': 'bar'})
@@ -46,8 +94,9 @@ class NodeStorage(local, Service):
 
         >>> delete_multi(['key1', 'key2'])
         """
-        for id in id_list:
-            self.delete(id)
+        with self.instrument('delete_multi', len(id_list)):
+            for id in id_list:
+                self.delete(id)
 
     def get(self, id):
         """
@@ -62,7 +111,8 @@ class NodeStorage(local, Service):
         >>> print 'key1', data_map['key1']
         >>> print 'key2', data_map['key2']
         """
-        return dict((id, self.get(id)) for id in id_list)
+        with self.instrument('get_multi', len(id_list)):
+            return dict((id, self.get(id)) for id in id_list)
 
     def set(self, id, data):
         """
@@ -77,8 +127,21 @@ class NodeStorage(local, Service):
         >>>     'key2': {'foo': 'baz'},
         >>> })
         """
-        for id, data in six.iteritems(values):
-            self.set(id=id, data=data)
+        with self.instrument('set_multi', len(values)):
+            for id, data in six.iteritems(values):
+                self.set(id=id, data=data)
+
+    def instrument(self, operation, size):
+        """
+        Records the size of a batch operation and returns a context manager
+        that records its duration.
+
+        >>> with self.instrument('get_multi', len(id_list)):
+        >>>     ...
+        """
+        instance = type(self).__name__
+        metrics.timing('nodestore.{}.size'.format(operation), size, instance=instance)
+        return metrics.timer('nodestore.{}'.format(operation), instance=instance)
 
     def generate_id(self):
         return b64encode(uuid4().bytes)
@@ -0,0 +1,232 @@
+"""
+sentry.nodestore.cache.backend
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+import os
+import threading
+import weakref
+
+from collections import OrderedDict
+
+import six
+
+from sentry.nodestore.base import NodeStorage
+from sentry.utils import metrics
+from sentry.utils.imports import import_string
+
+__all__ = ('CachedNodeStorage', 'LRUCache')
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache of byte strings, which is bounded
+    by the total size of the stored values.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.pop(key, None)
+            if value is not None:
+                self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_size:
+            self.delete(key)
+            return
+
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._data[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            value = self._data.pop(key, None)
+            if value is not None:
+                self.size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+# Node storages are thread locals, the cache is shared between all threads of
+# a process by keeping it outside of the instance.
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+class CachedNodeStorage(NodeStorage):
+    """
+    A read-through cache in front of another node storage backend.
+
+    Nodes are cached in a least recently used cache that is shared between
+    the threads of a process and bounded by ``max_size`` bytes, and
+    optionally in a Redis cluster which is shared between processes. Writes
+    go to the backend as well as to the caches and deletes remove the nodes
+    from the caches before they are removed from the backend.
+
+    >>> CachedNodeStorage(
+    >>>     backend='sentry.nodestore.riak.backend.RiakNodeStorage',
+    >>>     backend_options={'nodes': [{'host': '127.0.0.1', 'port': 8098}]},
+    >>>     max_size=64 * 1024 * 1024,
+    >>>     redis_cluster='default',
+    >>>     redis_ttl=3600,
+    >>> )
+    """
+
+    def __init__(self, backend, backend_options=None, max_size=64 * 1024 * 1024,
+                 redis_cluster=None, redis_ttl=3600, **kwargs):
+        if isinstance(backend, six.string_types):
+            backend = import_string(backend)
+        self.backend = backend(**(backend_options or {}))
+        self.max_size = max_size
+        self.redis_cluster = redis_cluster
+        self.redis_ttl = redis_ttl
+        super(CachedNodeStorage, self).__init__(**kwargs)
+
+    @property
+    def cache(self):
+        pid = os.getpid()
+        cache = _caches.get(self)
+        if cache is None or cache[0] != pid:
+            with _caches_lock:
+                cache = _caches.get(self)
+                # a forked process must not use the lock of its parent
+                if cache is None or cache[0] != pid:
+                    cache = _caches[self] = (pid, LRUCache(self.max_size))
+        return cache[1]
+
+    @property
+    def cluster(self):
+        if self.redis_cluster is None:
+            return None
+        cluster = getattr(self, '_cluster', None)
+        if cluster is None:
+            from sentry.utils.redis import clusters
+            cluster = self._cluster = clusters.get(self.redis_cluster)
+        return cluster
+
+    def get_cache_codec(self):
+        # cached values are encoded, so that their size is known and every
+        # caller receives its own copy of the data
+        if self.codec is not None:
+            return self.codec
+        return self.get_default_codec()
+
+    def make_key(self, id):
+        return u'nodestore:{}'.format(id)
+
+    def validate(self):
+        self.backend.validate()
+
+    def get(self, id):
+        return self.get_multi([id])[id]
+
+    def get_multi(self, id_list):
+        codec = self.get_cache_codec()
+        values = {}
+        missing = []
+        for id in id_list:
+            value = self.cache.get(id)
+            if value is None:
+                missing.append(id)
+            else:
+                values[id] = value
+        self.__record('local', len(values), len(missing))
+
+        cluster = self.cluster
+        if missing and cluster is not None:
+            with cluster.map() as client:
+                promises = [(id, client.get(self.make_key(id))) for id in missing]
+
+            missing = []
+            for id, promise in promises:
+                value = promise.value
+                if value is None:
+                    missing.append(id)
+                else:
+                    values[id] = value
+                    self.cache.set(id, value)
+            self.__record('redis', len(promises) - len(missing), len(missing))
+
+        result = {id: codec.decode(value) for id, value in six.iteritems(values)}
+
+        if missing:
+            fetched = self.backend.get_multi(missing)
+            self.__fill({
+                id: codec.encode(data) for id, data in six.iteritems(fetched) if data is not None
+            })
+            result.update(fetched)
+            # backends may leave out the ids they have no node for
+            for id in missing:
+                result.setdefault(id, None)
+
+        return result
+
+    def set(self, id, data):
+        self.set_multi({id: data})
+
+    def set_multi(self, values):
+        self.backend.set_multi(values)
+        codec = self.get_cache_codec()
+        self.__fill({id: codec.encode(data) for id, data in six.iteritems(values)})
+
+    def delete(self, id):
+        self.delete_multi([id])
+
+    def delete_multi(self, id_list):
+        for id in id_list:
+            self.cache.delete(id)
+
+        cluster = self.cluster
+        if cluster is not None:
+            with cluster.map() as client:
+                for id in id_list:
+                    client.delete(self.make_key(id))
+
+        self.backend.delete_multi(id_list)
+
+    def cleanup(self, cutoff_timestamp):
+        self.backend.cleanup(cutoff_timestamp)
+
+    def __fill(self, values):
+        if not values:
+            return
+
+        for id, value in six.iteritems(values):
+            self.cache.set(id, value)
+
+        cluster = self.cluster
+        if cluster is not None:
+            with cluster.map() as client:
+                for id, value in six.iteritems(values):
+                    client.setex(self.make_key(id), self.redis_ttl, value)
+
+    def __record(self, instance, hits, misses):
+        if hits:
+            metrics.incr('nodestore.cache.hit', hits, instance=instance)
+        if misses:
+            metrics.incr('nodestore.cache.miss', misses, instance=instance)
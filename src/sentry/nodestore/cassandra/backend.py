@@ -9,6 +9,7 @@ sentry.nodestore.cassandra.backend
 from __future__ import absolute_import, print_function
 
 import casscache
+import six
 
 from sentry.nodestore.base import NodeStorage
 from sentry.utils.cache import memoize
@@ -25,12 +26,13 @@ class CassandraNodeStorage(NodeStorage):
     ... )
     """
 
-    def __init__(self, servers, keyspace='sentry', columnfamily='nodestore', **kwargs):
+    def __init__(self, servers, keyspace='sentry', columnfamily='nodestore', codec=None,
+                 **kwargs):
         self.servers = servers
         self.keyspace = keyspace
         self.columnfamily = columnfamily
         self.options = kwargs
-        super(CassandraNodeStorage, self).__init__()
+        super(CassandraNodeStorage, self).__init__(codec=codec)
 
     @memoize
     def connection(self):
@@ -45,10 +47,25 @@ class CassandraNodeStorage(NodeStorage):
         self.connection.delete(id)
 
     def get(self, id):
-        return self.connection.get(id)
+        return self.decode(self.connection.get(id), lambda value: value)
 
     def get_multi(self, id_list):
-        return self.connection.get_multi(id_list)
+        # the client executes the queries concurrently
+        with self.instrument('get_multi', len(id_list)):
+            return {
+                id: self.decode(value, lambda value: value)
+                for id, value in six.iteritems(self.connection.get_multi(id_list))
+            }
+
+    def delete_multi(self, id_list):
+        with self.instrument('delete_multi', len(id_list)):
+            self.connection.delete_multi(id_list)
 
     def set(self, id, data):
-        self.connection.set(id, data)
+        self.connection.set(id, self.encode(data, lambda data: data))
+
+    def set_multi(self, values):
+        with self.instrument('set_multi', len(values)):
+            self.connection.set_multi({
+                id: self.encode(data, lambda data: data) for id, data in six.iteritems(values)
+            })
@@ -0,0 +1,267 @@
+"""
+sentry.nodestore.codecs
+~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+import six
+import struct
+import zlib
+
+from django.conf import settings
+
+from sentry.utils import json
+from sentry.utils.imports import import_string
+from sentry.utils.settings import validate_dependency
+
+# Every value that is written by a codec starts with a header, so that values
+# can be decoded after the configuration changed, and so that they can be
+# distinguished from values which were written in a backend specific format
+# before the codec was introduced (none of which start with a null byte.)
+#
+# The header consists of the null byte marker, the format version, the
+# serializer and compressor identifiers and the zstd dictionary identifier
+# (which is 0 if no dictionary was used.)
+MARKER = b'\x00'
+VERSION = 1
+HEADER = struct.Struct('>cBBBI')
+
+
+class CodecError(Exception):
+    pass
+
+
+class Serializer(object):
+    id = None
+
+    def dumps(self, value):
+        raise NotImplementedError
+
+    def loads(self, value):
+        raise NotImplementedError
+
+
+class JSONSerializer(Serializer):
+    id = 1
+
+    def dumps(self, value):
+        value = json.dumps(value)
+        if isinstance(value, six.text_type):
+            value = value.encode('utf-8')
+        return value
+
+    def loads(self, value):
+        return json.loads(value.decode('utf-8'))
+
+
+class MsgpackSerializer(Serializer):
+    id = 2
+
+    def __init__(self):
+        validate_dependency(settings, 'node codec serializer', 'msgpack', 'msgpack')
+        import msgpack
+        self.msgpack = msgpack
+
+    def dumps(self, value):
+        return self.msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, value):
+        return self.msgpack.unpackb(value, encoding='utf-8')
+
+
+class Compressor(object):
+    id = None
+
+    def compress(self, value, dictionary=None):
+        raise NotImplementedError
+
+    def decompress(self, value, dictionary=None):
+        raise NotImplementedError
+
+    def load_dictionary(self, data):
+        """
+        Returns a 2-tuple of the form ``(id, dictionary)`` for the raw
+        dictionary data, if dictionaries are supported.
+        """
+        raise CodecError('{} does not support dictionaries'.format(type(self).__name__))
+
+
+class NoopCompressor(Compressor):
+    id = 0
+
+    def compress(self, value, dictionary=None):
+        return value
+
+    def decompress(self, value, dictionary=None):
+        return value
+
+
+class ZlibCompressor(Compressor):
+    id = 1
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, value, dictionary=None):
+        return zlib.compress(value, self.level)
+
+    def decompress(self, value, dictionary=None):
+        return zlib.decompress(value)
+
+
+class ZstdCompressor(Compressor):
+    id = 2
+
+    def __init__(self, level=3):
+        validate_dependency(settings, 'node codec compressor', 'zstd', 'zstandard')
+        import zstandard
+        self.zstandard = zstandard
+        self.level = level
+
+        # compressor instances are not thread safe, but the node storage
+        # (and thereby the codec) is local to the thread using it
+        self.__compressors = {}
+        self.__decompressors = {}
+
+    def load_dictionary(self, data):
+        dictionary = self.zstandard.ZstdCompressionDict(data)
+        return dictionary.dict_id(), dictionary
+
+    def compress(self, value, dictionary=None):
+        key = id(dictionary)
+        compressor = self.__compressors.get(key)
+        if compressor is None:
+            options = {'level': self.level}
+            if dictionary is not None:
+                options['dict_data'] = dictionary
+            compressor = self.__compressors[key] = self.zstandard.ZstdCompressor(**options)
+        return compressor.compress(value)
+
+    def decompress(self, value, dictionary=None):
+        key = id(dictionary)
+        decompressor = self.__decompressors.get(key)
+        if decompressor is None:
+            options = {}
+            if dictionary is not None:
+                options['dict_data'] = dictionary
+            decompressor = self.__decompressors[key] = self.zstandard.ZstdDecompressor(**options)
+        return decompressor.decompress(value)
+
+
+SERIALIZERS = {
+    'json': JSONSerializer,
+    'msgpack': MsgpackSerializer,
+}
+
+COMPRESSORS = {
+    'none': NoopCompressor,
+    'zlib': ZlibCompressor,
+    'zstd': ZstdCompressor,
+}
+
+
+class NodeCodec(object):
+    """
+    Encodes node data into a versioned binary representation.
+
+    Dictionaries are only supported by the ``zstd`` compressor. They are
+    given as a mapping of platform names to paths of dictionary files (as
+    created by ``sentry nodestore train-dictionary``), and are used for
+    nodes whose ``platform`` value matches. Dictionaries which are no longer
+    used for writing have to stay configured (under any name that is not a
+    platform) until all values compressed with them are gone.
+
+    >>> NodeCodec(
+    ...     serializer='msgpack',
+    ...     compressor='zstd',
+    ...     compression_level=3,
+    ...     dictionaries={'python': '/etc/sentry/nodestore/python.dict'},
+    ... )
+    """
+
+    def __init__(self, serializer='json', compressor='zstd', compression_level=None,
+                 dictionaries=None):
+        self.serializer = SERIALIZERS[serializer]()
+
+        options = {}
+        if compression_level is not None:
+            options['level'] = compression_level
+        self.compressor = COMPRESSORS[compressor](**options)
+
+        self.__serializers = {self.serializer.id: self.serializer}
+        self.__compressors = {self.compressor.id: self.compressor}
+
+        self.dictionaries_by_platform = {}
+        self.dictionaries_by_id = {}
+        for name, path in six.iteritems(dictionaries or {}):
+            with open(path, 'rb') as f:
+                dictionary_id, dictionary = self.compressor.load_dictionary(f.read())
+            self.dictionaries_by_platform[name] = (dictionary_id, dictionary)
+            self.dictionaries_by_id[dictionary_id] = dictionary
+
+    def is_encoded(self, value):
+        return isinstance(value, six.binary_type) and \
+            len(value) >= HEADER.size and value[:1] == MARKER
+
+    def encode(self, data):
+        platform = data.get('platform') if isinstance(data, dict) else None
+        dictionary_id, dictionary = self.dictionaries_by_platform.get(platform, (0, None))
+
+        return HEADER.pack(
+            MARKER,
+            VERSION,
+            self.serializer.id,
+            self.compressor.id,
+            dictionary_id,
+        ) + self.compressor.compress(self.serializer.dumps(data), dictionary)
+
+    def decode(self, value):
+        if not self.is_encoded(value):
+            raise CodecError('Value was not encoded by a codec')
+
+        _, version, serializer_id, compressor_id, dictionary_id = HEADER.unpack_from(value)
+        if version != VERSION:
+            raise CodecError('Unsupported format version: {}'.format(version))
+
+        dictionary = None
+        if dictionary_id:
+            try:
+                dictionary = self.dictionaries_by_id[dictionary_id]
+            except KeyError:
+                raise CodecError('Unknown dictionary: {}'.format(dictionary_id))
+
+        compressor = self.get_compressor(compressor_id)
+        serializer = self.get_serializer(serializer_id)
+        return serializer.loads(compressor.decompress(value[HEADER.size:], dictionary))
+
+    def get_serializer(self, serializer_id):
+        serializer = self.__serializers.get(serializer_id)
+        if serializer is None:
+            serializer = self.__serializers[serializer_id] = self.__find(
+                SERIALIZERS, serializer_id)()
+        return serializer
+
+    def get_compressor(self, compressor_id):
+        compressor = self.__compressors.get(compressor_id)
+        if compressor is None:
+            compressor = self.__compressors[compressor_id] = self.__find(
+                COMPRESSORS, compressor_id)()
+        return compressor
+
+    def __find(self, classes, id):
+        for cls in six.itervalues(classes):
+            if cls.id == id:
+                return cls
+        raise CodecError('Unknown identifier: {}'.format(id))
+
+
+def load(options):
+    if options is None:
+        return None
+    return import_string(options.get('path', 'sentry.nodestore.codecs.NodeCodec'))(
+        **options.get('options', {})
+    )
@@ -9,16 +9,24 @@ sentry.nodestore.django.backend
 from __future__ import absolute_import
 
 import math
+import six
 
+from django.db import IntegrityError, router, transaction
 from django.utils import timezone
 
 from sentry.db.models import create_or_update
+from sentry.exceptions import InvalidConfiguration
 from sentry.nodestore.base import NodeStorage
 
 from .models import Node
 
 
 class DjangoNodeStorage(NodeStorage):
+    def validate(self):
+        # node data is stored in a text column which uses its own encoding
+        if self.codec is not None:
+            raise InvalidConfiguration('DjangoNodeStorage does not support codecs')
+
     def delete(self, id):
         Node.objects.filter(id=id).delete()
 
@@ -29,10 +37,12 @@ class DjangoNodeStorage(NodeStorage):
             return None
 
     def get_multi(self, id_list):
-        return {n.id: n.data for n in Node.objects.filter(id__in=id_list)}
+        with self.instrument('get_multi', len(id_list)):
+            return {n.id: n.data for n in Node.objects.filter(id__in=id_list)}
 
     def delete_multi(self, id_list):
-        Node.objects.filter(id__in=id_list).delete()
+        with self.instrument('delete_multi', len(id_list)):
+            Node.objects.filter(id__in=id_list).delete()
 
     def set(self, id, data):
         create_or_update(
@@ -44,6 +54,29 @@ class DjangoNodeStorage(NodeStorage):
             },
         )
 
+    def set_multi(self, values):
+        """
+        Updates existing nodes one by one and inserts all others with a
+        single query. If a concurrent writer inserted one of the nodes in the
+        meantime, all nodes are written one by one instead.
+        """
+        with self.instrument('set_multi', len(values)):
+            timestamp = timezone.now()
+            try:
+                with transaction.atomic(using=router.db_for_write(Node)):
+                    existing = set(
+                        Node.objects.filter(id__in=list(values)).values_list('id', flat=True)
+                    )
+                    for id in existing:
+                        Node.objects.filter(id=id).update(data=values[id], timestamp=timestamp)
+                    Node.objects.bulk_create([
+                        Node(id=id, data=data, timestamp=timestamp)
+                        for id, data in six.iteritems(values) if id not in existing
+                    ])
+            except IntegrityError:
+                for id, data in six.iteritems(values):
+                    self.set(id, data)
+
     def cleanup(self, cutoff_timestamp):
         from sentry.db.deletion import BulkDeleteQuery
 
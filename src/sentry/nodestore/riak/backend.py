@@ -46,7 +46,8 @@ class RiakNodeStorage(NodeStorage):
         max_retries=3,
         multiget_pool_size=5,
         tcp_keepalive=True,
-        protocol=None
+        protocol=None,
+        codec=None
     ):
         # protocol being defined is useless, but is needed for backwards
         # compatability and leveraged as an opportunity to yell at the user
@@ -63,18 +64,50 @@ class RiakNodeStorage(NodeStorage):
             cooldown=cooldown,
             tcp_keepalive=tcp_keepalive,
         )
+        super(RiakNodeStorage, self).__init__(codec=codec)
+
+    def get_headers(self):
+        headers = {}
+        if self.codec is not None:
+            headers['content-type'] = 'application/octet-stream'
+        return headers
 
     def set(self, id, data):
-        self.conn.put(self.bucket, id, json_dumps(data), returnbody='false')
+        self.conn.put(
+            self.bucket,
+            id,
+            self.encode(data, json_dumps),
+            headers=self.get_headers(),
+            returnbody='false',
+        )
+
+    def set_multi(self, values):
+        with self.instrument('set_multi', len(values)):
+            rv = self.conn.multiput(
+                self.bucket,
+                {id: self.encode(data, json_dumps) for id, data in six.iteritems(values)},
+                headers=self.get_headers(),
+                returnbody='false',
+            )
+            for value in six.itervalues(rv):
+                if isinstance(value, Exception):
+                    six.reraise(type(value), value)
 
     def delete(self, id):
         self.conn.delete(self.bucket, id)
 
+    def delete_multi(self, id_list):
+        with self.instrument('delete_multi', len(id_list)):
+            rv = self.conn.multidelete(self.bucket, id_list)
+            for value in six.itervalues(rv):
+                if isinstance(value, Exception):
+                    six.reraise(type(value), value)
+
     def get(self, id):
         rv = self.conn.get(self.bucket, id, r=1)
         if rv.status != 200:
             return None
-        return json_loads(rv.data)
+        return self.decode(rv.data, json_loads)
 
     def get_multi(self, id_list):
         # shortcut for just one id since this is a common
@@ -83,7 +116,8 @@ class RiakNodeStorage(NodeStorage):
             id = id_list[0]
             return {id: self.get(id)}
 
-        rv = self.conn.multiget(self.bucket, id_list, r=1)
+        with self.instrument('get_multi', len(id_list)):
+            rv = self.conn.multiget(self.bucket, id_list, r=1)
         results = {}
         for key, value in six.iteritems(rv):
             if isinstance(value, Exception):
@@ -91,7 +125,7 @@ class RiakNodeStorage(NodeStorage):
             if value.status != 200:
                 results[key] = None
             else:
-                results[key] = json_loads(value.data)
+                results[key] = self.decode(value.data, json_loads)
         return results
 
     def cleanup(self, cutoff_timestamp):
@@ -96,7 +96,7 @@ class RiakClient(object):
     def put(self, bucket, key, data, headers=None, **kwargs):
         if headers is None:
             headers = {}
-        headers['content-type'] = 'application/json'
+        headers.setdefault('content-type', 'application/json')
 
         return self.manager.urlopen(
             'PUT',
@@ -128,8 +128,46 @@ class RiakClient(object):
         Thread-safe multiget implementation that shares the same thread pool
         for all requests.
         """
+        return self.execute_many(
+            [(key, 'GET', self.build_url(bucket, key, kwargs), {
+                'headers': headers,
+            }) for key in keys]
+        )
+
+    def multiput(self, bucket, values, headers=None, **kwargs):
+        """
+        Thread-safe multiput implementation that shares the same thread pool
+        for all requests.
+        """
+        if headers is None:
+            headers = {}
+        headers.setdefault('content-type', 'application/json')
+
+        return self.execute_many(
+            [(key, 'PUT', self.build_url(bucket, key, kwargs), {
+                'headers': headers,
+                'body': data,
+            }) for key, data in six.iteritems(values)]
+        )
+
+    def multidelete(self, bucket, keys, headers=None, **kwargs):
+        """
+        Thread-safe multidelete implementation that shares the same thread
+        pool for all requests.
+        """
+        return self.execute_many(
+            [(key, 'DELETE', self.build_url(bucket, key, kwargs), {
+                'headers': headers,
+            }) for key in keys]
+        )
+
+    def execute_many(self, requests):
+        """
+        Executes ``(key, method, url, kwargs)`` requests on the thread pool
+        and returns the responses (or exceptions) by key.
+        """
         # Each request is paired with a thread.Event to signal when it is finished
-        requests = [(key, self.build_url(bucket, key, kwargs), Event()) for key in keys]
+        requests = [request + (Event(), ) for request in requests]
 
         results = {}
 
@@ -138,14 +176,12 @@ class RiakClient(object):
             # Signal that this request is finished
             event.set()
 
-        for key, url, event in requests:
+        for key, method, url, kwargs, event in requests:
             self.pool.submit(
                 (
                     self.manager.urlopen,  # func
-                    ('GET', url),  # args
-                    {
-                        'headers': headers
-                    },  # kwargs
+                    (method, url),  # args
+                    kwargs,  # kwargs
                     functools.partial(
                         callback,
                         key,
@@ -155,7 +191,7 @@ class RiakClient(object):
             )
 
         # Now we wait for all of the callbacks to be finished
-        for _, _, event in requests:
+        for _, _, _, _, event in requests:
             event.wait()
 
         return results
@@ -1,10 +1,10 @@
 from __future__ import absolute_import, print_function
 
 from django.db import IntegrityError, transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 
 from sentry.models import (
-    Activity, Commit, GroupAssignee, GroupLink, Project, Release, PullRequest
+    Activity, Commit, GroupAssignee, GroupLink, Project, Release, ReleaseFile, PullRequest
 )
 from sentry.tasks.clear_expired_resolutions import clear_expired_resolutions
 
@@ -156,6 +156,15 @@ def resolved_in_pull_request(instance, created, **kwargs):
             pass
 
 
+def invalidate_release_files(instance, created=False, **kwargs):
+    ReleaseFile.bump_cache_generation(instance.release_id)
+    if created:
+        ReleaseFile.add_to_manifest(instance)
+    else:
+        # the name of the file might have changed
+        ReleaseFile.clear_manifest(instance.release_id, instance.dist_id)
+
+
 post_save.connect(
     resolve_group_resolutions,
     sender=Release,
@@ -176,3 +185,17 @@ post_save.connect(
     dispatch_uid="resolved_in_pull_request",
     weak=False,
 )
+
+post_save.connect(
+    invalidate_release_files,
+    sender=ReleaseFile,
+    dispatch_uid="invalidate_release_files_on_save",
+    weak=False,
+)
+
+post_delete.connect(
+    invalidate_release_files,
+    sender=ReleaseFile,
+    dispatch_uid="invalidate_release_files_on_delete",
+    weak=False,
+)
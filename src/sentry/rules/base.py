@@ -121,3 +121,6 @@ class EventState(object):
         self.is_new = is_new
         self.is_regression = is_regression
         self.is_new_group_environment = is_new_group_environment
+        # values computed by conditions, which are shared between the rules
+        # that are applied to the same event
+        self.cache = {}
@@ -57,11 +57,17 @@ class BaseEventFrequencyCondition(EventCondition):
         if not interval:
             return False
 
-        current_value = self.get_rate(
-            event,
-            interval,
-            self.rule.environment_id,
-        )
+        # rules with the same frequency condition read the rate only once,
+        # different intervals or environments still need their own reads as
+        # their sums come from different rollups
+        cache_key = (self.id, interval, self.rule.environment_id)
+        current_value = state.cache.get(cache_key)
+        if current_value is None:
+            current_value = state.cache[cache_key] = self.get_rate(
+                event,
+                interval,
+                self.rule.environment_id,
+            )
 
         return current_value > value
 
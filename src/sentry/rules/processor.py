@@ -2,9 +2,11 @@ from __future__ import absolute_import
 
 import logging
 import six
+import threading
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from datetime import timedelta
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from sentry.models import GroupRuleStatus, Rule
@@ -13,6 +15,16 @@ from sentry.utils.safe import safe_execute
 
 RuleFuture = namedtuple('RuleFuture', ['rule', 'kwargs'])
 
+CompiledRule = namedtuple(
+    'CompiledRule', ['rule', 'match', 'frequency', 'conditions', 'actions'],
+)
+
+# the number of projects for which compiled rule sets are kept per process
+MAX_RULE_SETS = 1000
+
+_rule_sets = OrderedDict()
+_rule_sets_lock = threading.Lock()
+
 
 # TODO(dcramer): come up with a clean way to kill this either by renaming
 # the Event.message attribute or updating all plugins (former is better)
@@ -34,6 +46,87 @@ class EventCompatibilityProxy(object):
         return self._event.get_legacy_message()
 
 
+def get_rule_set_signature(rule_list):
+    """
+    Returns a value which changes whenever a rule of the list changes in a
+    way that affects its compiled form.
+    """
+    return tuple(
+        (rule.id, rule.status, rule.environment_id, rule.label, rule.data)
+        for rule in rule_list
+    )
+
+
+def compile_rules(project, rule_list):
+    """
+    Returns the rules which can be applied to events of the project, with
+    their conditions and actions instantiated once.
+    """
+    logger = RuleProcessor.logger
+    compiled = []
+    for rule in rule_list:
+        # XXX(dcramer): if theres no condition should we really skip it,
+        # or should we just apply it blindly?
+        condition_list = rule.data.get('conditions', ())
+        if not condition_list:
+            continue
+
+        conditions = []
+        for condition in condition_list:
+            condition_cls = rules.get(condition['id'])
+            if condition_cls is None:
+                logger.warn('Unregistered condition %r', condition['id'])
+                # unregistered conditions never pass
+                conditions.append(None)
+                continue
+            conditions.append(condition_cls(project, data=condition, rule=rule))
+
+        actions = []
+        for action in rule.data.get('actions', ()):
+            action_cls = rules.get(action['id'])
+            if action_cls is None:
+                logger.warn('Unregistered action %r', action['id'])
+                continue
+            actions.append(action_cls(project, data=action, rule=rule))
+
+        compiled.append(CompiledRule(
+            rule=rule,
+            match=rule.data.get('action_match') or Rule.DEFAULT_ACTION_MATCH,
+            frequency=rule.data.get('frequency') or Rule.DEFAULT_FREQUENCY,
+            conditions=conditions,
+            actions=actions,
+        ))
+    return compiled
+
+
+def get_rule_set(project):
+    """
+    Returns the compiled rules of a project, which are kept in the process
+    until a rule of the project changes.
+
+    The compiled rules, including their condition and action instances and
+    the ``Project`` they were compiled with, are shared by all threads and
+    all events of the project. Conditions and actions must not keep state
+    of an event on themselves (``EventState.cache`` is meant for that), and
+    must not rely on attributes of the project that change without a rule
+    changing.
+    """
+    rule_list = Rule.get_for_project(project.id)
+    signature = get_rule_set_signature(rule_list)
+    with _rule_sets_lock:
+        cached = _rule_sets.pop(project.id, None)
+        if cached is not None and cached[0] == signature:
+            _rule_sets[project.id] = cached
+            return cached[1]
+
+    rule_set = compile_rules(project, rule_list)
+    with _rule_sets_lock:
+        _rule_sets[project.id] = (signature, rule_set)
+        while len(_rule_sets) > MAX_RULE_SETS:
+            _rule_sets.popitem(last=False)
+    return rule_set
+
+
 class RuleProcessor(object):
     logger = logging.getLogger('sentry.rules')
 
@@ -49,27 +142,57 @@ class RuleProcessor(object):
         self.grouped_futures = {}
 
     def get_rules(self):
-        return Rule.get_for_project(self.project.id)
-
-    def get_rule_status(self, rule):
-        rule_status, _ = GroupRuleStatus.objects.get_or_create(
-            rule=rule,
-            group=self.group,
-            defaults={
-                'project': self.project,
-            },
-        )
-
-        return rule_status
-
-    def condition_matches(self, condition, state, rule):
-        condition_cls = rules.get(condition['id'])
-        if condition_cls is None:
-            self.logger.warn('Unregistered condition %r', condition['id'])
+        return get_rule_set(self.project)
+
+    def get_rule_statuses(self, rule_ids):
+        """
+        Returns the statuses of the rules for the group by rule id, and
+        creates the ones which do not exist yet.
+        """
+        statuses = {
+            status.rule_id: status
+            for status in GroupRuleStatus.objects.filter(
+                group=self.group,
+                rule__in=rule_ids,
+            )
+        }
+
+        missing = [rule_id for rule_id in rule_ids if rule_id not in statuses]
+        if not missing:
+            return statuses
+
+        try:
+            with transaction.atomic():
+                GroupRuleStatus.objects.bulk_create([
+                    GroupRuleStatus(
+                        rule_id=rule_id,
+                        group=self.group,
+                        project=self.project,
+                    ) for rule_id in missing
+                ])
+        except IntegrityError:
+            # another event of the group created some of them concurrently
+            for rule_id in missing:
+                statuses[rule_id], _ = GroupRuleStatus.objects.get_or_create(
+                    rule_id=rule_id,
+                    group=self.group,
+                    defaults={
+                        'project': self.project,
+                    },
+                )
+        else:
+            for rule_id in missing:
+                statuses[rule_id] = GroupRuleStatus(
+                    rule_id=rule_id,
+                    group=self.group,
+                    project=self.project,
+                )
+        return statuses
+
+    def condition_matches(self, condition, state):
+        if condition is None:
             return
-
-        condition_inst = condition_cls(self.project, data=condition, rule=rule)
-        return safe_execute(condition_inst.passes, self.event, state, _with_transaction=False)
+        return safe_execute(condition.passes, self.event, state, _with_transaction=False)
 
     def get_state(self):
         return EventState(
@@ -78,32 +201,17 @@ class RuleProcessor(object):
             is_new_group_environment=self.is_new_group_environment,
         )
 
-    def apply_rule(self, rule):
-        match = rule.data.get('action_match') or Rule.DEFAULT_ACTION_MATCH
-        condition_list = rule.data.get('conditions', ())
-        frequency = rule.data.get('frequency') or Rule.DEFAULT_FREQUENCY
-
-        # XXX(dcramer): if theres no condition should we really skip it,
-        # or should we just apply it blindly?
-        if not condition_list:
-            return
-
-        if rule.environment_id is not None \
-                and self.event.get_environment().id != rule.environment_id:
-            return
-
-        status = self.get_rule_status(rule)
-
+    def apply_rule(self, compiled, status, state):
+        rule = compiled.rule
         now = timezone.now()
-        freq_offset = now - timedelta(minutes=frequency)
+        freq_offset = now - timedelta(minutes=compiled.frequency)
 
         if status.last_active and status.last_active > freq_offset:
             return
 
-        state = self.get_state()
-
-        condition_iter = (self.condition_matches(c, state, rule) for c in condition_list)
+        condition_iter = (self.condition_matches(c, state) for c in compiled.conditions)
 
+        match = compiled.match
         if match == 'all':
             passed = all(condition_iter)
         elif match == 'any':
@@ -115,8 +223,11 @@ class RuleProcessor(object):
             return
 
         if passed:
+            # statuses which were just created have no id, but they are
+            # unique for the rule and group
             passed = GroupRuleStatus.objects.filter(
-                id=status.id,
+                rule=rule,
+                group=self.group,
             ).exclude(
                 last_active__gt=freq_offset,
             ).update(last_active=now)
@@ -124,18 +235,12 @@ class RuleProcessor(object):
         if not passed:
             return
 
-        for action in rule.data.get('actions', ()):
-            action_cls = rules.get(action['id'])
-            if action_cls is None:
-                self.logger.warn('Unregistered action %r', action['id'])
-                continue
-
-            action_inst = action_cls(self.project, data=action, rule=rule)
+        for action in compiled.actions:
             results = safe_execute(
-                action_inst.after, event=self.event, state=state, _with_transaction=False
+                action.after, event=self.event, state=state, _with_transaction=False
             )
             if results is None:
-                self.logger.warn('Action %s did not return any futures', action['id'])
+                self.logger.warn('Action %s did not return any futures', action.id)
                 continue
 
             for future in results:
@@ -149,6 +254,21 @@ class RuleProcessor(object):
 
     def apply(self):
         self.grouped_futures.clear()
-        for rule in self.get_rules():
-            self.apply_rule(rule)
+
+        compiled_rules = self.get_rules()
+        if any(c.rule.environment_id is not None for c in compiled_rules):
+            environment_id = self.event.get_environment().id
+            compiled_rules = [
+                c for c in compiled_rules
+                if c.rule.environment_id is None or c.rule.environment_id == environment_id
+            ]
+        if not compiled_rules:
+            return six.itervalues(self.grouped_futures)
+
+        statuses = self.get_rule_statuses([c.rule.id for c in compiled_rules])
+        # the state is shared by all rules, so that conditions can reuse
+        # values which were already computed for the event
+        state = self.get_state()
+        for compiled in compiled_rules:
+            self.apply_rule(compiled, statuses[compiled.rule.id], state)
         return six.itervalues(self.grouped_futures)
@@ -0,0 +1,528 @@
+"""
+sentry.runner.commands.benchmark
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import click
+import six
+
+from contextlib import contextmanager
+from time import time
+
+from sentry.runner.decorators import configuration
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback():
+    """
+    Runs the block in a transaction which is always rolled back so that
+    benchmarks can be executed against a real installation.
+    """
+    from django.db import transaction
+
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def measure(results, name):
+    from sentry.utils.performance import SqlQueryCountMonitor
+
+    monitor = SqlQueryCountMonitor(name, max_queries=float('inf'), max_dupes=float('inf'))
+    start = time()
+    with monitor:
+        yield
+    results[name] = {
+        'duration': time() - start,
+        'queries': monitor.state.count,
+    }
+
+
+def report(results, count):
+    for name, result in sorted(results.items()):
+        click.echo(
+            '{:<24} {:>10.2f} ms total {:>8.2f} ms/event {:>8} queries {:>8.2f} queries/event'.format(
+                name,
+                result['duration'] * 1000,
+                result['duration'] * 1000 / count,
+                result['queries'],
+                float(result['queries']) / count,
+            )
+        )
+
+
+@click.group()
+def benchmark():
+    """Benchmark internals against the configured services."""
+
+
+@benchmark.command('save-events')
+@click.option('--project', 'project_id', type=int, required=True, help='Project to store into.')
+@click.option('--platform', default='python', show_default=True,
+              help='Platform of the sample event.')
+@click.option('--events', 'count', default=100, show_default=True,
+              help='Number of events to store per run.')
+@click.option('--batch-size', default=25, show_default=True,
+              help='Number of events per `save_many` call.')
+@click.option('--groups', default=5, show_default=True,
+              help='Number of distinct issues the events are spread across.')
+@configuration
+def save_events(project_id, platform, count, batch_size, groups):
+    """
+    Compare `EventManager.save` and `EventManager.save_many`.
+
+    All writes happen inside a transaction that is rolled back afterwards.
+    """
+    from copy import deepcopy
+    from uuid import uuid4
+
+    from sentry.event_manager import EventManager
+    from sentry.utils.iterators import chunked
+    from sentry.utils.samples import load_data
+
+    sample = load_data(platform)
+    if sample is None:
+        raise click.ClickException('No sample event for platform {!r}'.format(platform))
+
+    def make_events():
+        rv = []
+        for i in range(count):
+            data = deepcopy(sample)
+            data['event_id'] = uuid4().hex
+            data['fingerprint'] = ['benchmark', six.text_type(i % groups)]
+            data['release'] = 'benchmark-{}'.format(i % 2)
+            manager = EventManager(data)
+            manager.normalize()
+            rv.append(manager.data)
+        return rv
+
+    results = {}
+
+    with rollback():
+        events = make_events()
+        with measure(results, 'save'):
+            for data in events:
+                EventManager(data).save(project_id, raw=True)
+
+    with rollback():
+        events = make_events()
+        with measure(results, 'save_many'):
+            for batch in chunked(events, batch_size):
+                EventManager.save_many(project_id, batch, raw=True)
+
+    report(results, count)
+
+
+@benchmark.command('tsdb-range')
+@click.option('--keys', 'count', default=500, show_default=True,
+              help='Number of counters to read per call.')
+@click.option('--hours', default=24, show_default=True,
+              help='Length of the requested range in hours.')
+@click.option('--iterations', default=10, show_default=True,
+              help='Number of reads per read path.')
+@configuration
+def tsdb_range(count, hours, iterations):
+    """
+    Compare `RedisTSDB.get_range` with and without scripted counter reads.
+
+    Counters are written below a random prefix of the configured TSDB cluster
+    and deleted again afterwards.
+    """
+    from datetime import timedelta
+    from uuid import uuid4
+
+    from django.conf import settings
+    from django.utils import timezone
+
+    from sentry.tsdb.base import TSDBModel
+    from sentry.tsdb.redis import RedisTSDB
+
+    options = dict(settings.SENTRY_TSDB_OPTIONS)
+    options['prefix'] = 'benchmark:{}:'.format(uuid4().hex)
+    db = RedisTSDB(**options)
+
+    end = timezone.now()
+    start = end - timedelta(hours=hours)
+    keys = list(range(1, count + 1))
+    for hour in range(hours):
+        db.incr_multi(
+            [(TSDBModel.project, key) for key in keys],
+            timestamp=start + timedelta(hours=hour),
+        )
+
+    durations = {}
+    responses = {}
+    try:
+        for name, scripted in (('get_range', False), ('get_range (scripted)', True)):
+            db.enable_scripted_counter_reads = scripted
+            begin = time()
+            for _ in range(iterations):
+                responses[name] = db.get_range(TSDBModel.project, keys, start, end, rollup=3600)
+            durations[name] = time() - begin
+    finally:
+        db.delete([TSDBModel.project], keys, start, end)
+
+    if responses['get_range'] != responses['get_range (scripted)']:
+        raise click.ClickException('Read paths returned different results.')
+
+    for name, duration in sorted(durations.items()):
+        click.echo(
+            '{:<24} {:>10.2f} ms total {:>8.2f} ms/call'.format(
+                name,
+                duration * 1000,
+                duration * 1000 / iterations,
+            )
+        )
+
+
+@benchmark.command('nodestore-codecs')
+@click.option('--sample', default=1000, show_default=True,
+              help='Number of recent events to encode.')
+@click.option('--project', 'project_id', type=int, help='Only use events of a project.')
+@click.option('--dictionaries', is_flag=True,
+              help='Also compare zstd with a dictionary per platform trained on the sample.')
+@configuration
+def nodestore_codecs(sample, project_id, dictionaries):
+    """
+    Compare node encodings on existing nodes.
+
+    The legacy encoding is the compressed pickle used by the default node
+    storage.
+    """
+    import os
+    import shutil
+    import tempfile
+
+    from collections import defaultdict
+
+    from sentry.nodestore.codecs import NodeCodec, SERIALIZERS
+    from sentry.runner.commands.nodestore import get_sample
+    from sentry.utils.compat import pickle
+    from sentry.utils.strings import compress, decompress
+
+    nodes = [data for _, data in get_sample(sample, project_id)]
+    if not nodes:
+        raise click.ClickException('No nodes found.')
+
+    codecs = [
+        ('legacy', lambda data: compress(pickle.dumps(data)),
+         lambda value: pickle.loads(decompress(value))),
+    ]
+    for serializer in ('json', 'msgpack'):
+        for compressor in ('zlib', 'zstd'):
+            codec = NodeCodec(serializer=serializer, compressor=compressor)
+            codecs.append(('{}+{}'.format(serializer, compressor), codec.encode, codec.decode))
+
+    directory = None
+    if dictionaries:
+        import zstandard
+
+        directory = tempfile.mkdtemp()
+        for serializer in ('json', 'msgpack'):
+            samples = defaultdict(list)
+            for data in nodes:
+                samples[data.get('platform')].append(SERIALIZERS[serializer]().dumps(data))
+
+            paths = {}
+            for platform, values in samples.items():
+                if platform is None or len(values) < 10:
+                    continue
+                path = os.path.join(directory, '{}-{}.dict'.format(serializer, platform))
+                with open(path, 'wb') as f:
+                    f.write(zstandard.train_dictionary(112640, values).as_bytes())
+                paths[platform] = path
+
+            codec = NodeCodec(serializer=serializer, compressor='zstd', dictionaries=paths)
+            codecs.append(('{}+zstd+dict'.format(serializer), codec.encode, codec.decode))
+
+    try:
+        for name, encode, decode in codecs:
+            start = time()
+            values = [encode(data) for data in nodes]
+            encode_duration = time() - start
+
+            start = time()
+            for value in values:
+                decode(value)
+            decode_duration = time() - start
+
+            click.echo(
+                '{:<20} {:>12} bytes {:>8.2f} ms encode {:>8.2f} ms decode'.format(
+                    name,
+                    sum(map(len, values)),
+                    encode_duration * 1000,
+                    decode_duration * 1000,
+                )
+            )
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+
+
+@benchmark.command('minhash')
+@click.option('--sample', default=1000, show_default=True,
+              help='Number of recent events to extract features from.')
+@click.option('--project', 'project_id', type=int, help='Only use events of a project.')
+@click.option('--iterations', default=5, show_default=True,
+              help='Number of times the signatures of every event are built.')
+@configuration
+def minhash(sample, project_id, iterations):
+    """
+    Compare the MinHash signature builders on the similarity features of
+    existing events.
+
+    The signatures of both builders are checked to be identical.
+    """
+    from collections import defaultdict
+
+    from sentry.models import Event
+    from sentry.similarity import features
+    from sentry.similarity.signatures import (
+        MinHashSignatureBuilder, VectorizedMinHashSignatureBuilder,
+    )
+
+    queryset = Event.objects.all()
+    if project_id is not None:
+        queryset = queryset.filter(project_id=project_id)
+    events = list(queryset.order_by('-id')[:sample])
+    Event.objects.bind_nodes(events, 'data')
+
+    feature_sets = defaultdict(list)
+    for event in events:
+        for label, values in features.extract(event).items():
+            try:
+                values = map(features.encoder.dumps, values)
+            except Exception:
+                continue
+            if values:
+                feature_sets[label].append(values)
+
+    if not feature_sets:
+        raise click.ClickException('No events with similarity features found.')
+
+    builders = (
+        ('scalar', MinHashSignatureBuilder(16, 0xFFFF)),
+        ('vectorized', VectorizedMinHashSignatureBuilder(16, 0xFFFF)),
+    )
+    for label, values in sorted(feature_sets.items()):
+        durations = {}
+        signatures = {}
+        for name, builder in builders:
+            start = time()
+            for _ in range(iterations):
+                signatures[name] = [builder(v) for v in values]
+            durations[name] = (time() - start) / iterations
+
+        if signatures['scalar'] != signatures['vectorized']:
+            raise click.ClickException('Signatures for {} differ.'.format(label))
+
+        click.echo(
+            '{:<42} {:>6} sets {:>8.1f} features/set {:>9.2f} ms scalar '
+            '{:>9.2f} ms vectorized {:>6.2f}x'.format(
+                label,
+                len(values),
+                sum(map(len, values)) / float(len(values)),
+                durations['scalar'] * 1000,
+                durations['vectorized'] * 1000,
+                durations['scalar'] / durations['vectorized'],
+            )
+        )
+
+
+@contextmanager
+def in_memory_services():
+    """
+    Replaces the Redis backed services that events are written to with
+    in-memory backends while the block runs.
+    """
+    from sentry import buffer, digests, tsdb
+    from sentry.buffer.inprocess import InProcessBuffer
+    from sentry.digests.backends.dummy import DummyBackend
+    from sentry.tsdb.inmemory import InMemoryTSDB
+
+    services = (
+        (buffer.backend, InProcessBuffer()),
+        (digests.backend, DummyBackend()),
+        (tsdb.backend, InMemoryTSDB()),
+    )
+    for service, _ in services:
+        # make sure the configured backend is set up, so it can be restored
+        getattr(service, 'validate')
+
+    previous = [service._wrapped for service, _ in services]
+    try:
+        for service, stand_in in services:
+            service._wrapped = stand_in
+        yield
+    finally:
+        for (service, _), wrapped in zip(services, previous):
+            service._wrapped = wrapped
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+@benchmark.command('ingest')
+@click.option('--project', 'project_id', type=int, required=True, help='Project to store into.')
+@click.option('--platform', 'platforms', multiple=True,
+              help='Platform of the sample events to replay, defaults to all samples.')
+@click.option('--iterations', default=20, show_default=True,
+              help='Number of times every sample is replayed.')
+@click.option('--in-memory', is_flag=True,
+              help='Use in-memory TSDB, buffer and digest backends instead of the configured ones.')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'json']), default='text',
+              show_default=True, help='Output format, JSON includes the revision for comparisons.')
+@click.option('--output', type=click.File('w'), default='-', help='File to write the results to.')
+@configuration
+def ingest(project_id, platforms, iterations, in_memory, output_format, output):
+    """
+    Measure the stages of the ingest pipeline on the sample events.
+
+    Every sample is normalized, its stack traces are processed, and it is
+    saved and post processed, inside of a transaction that is rolled back
+    afterwards. Reports latency percentiles, SQL queries and net allocations
+    of objects tracked by the garbage collector per stage.
+
+    Processing the JavaScript sample fetches its sources, unless scraping is
+    disabled for the project.
+    """
+    import gc
+    import os
+
+    from collections import defaultdict
+    from copy import deepcopy
+    from uuid import uuid4
+
+    from sentry import get_revision, get_version
+    from sentry.event_manager import EventManager
+    from sentry.models import Project
+    from sentry.stacktraces import process_stacktraces
+    from sentry.tasks.post_process import post_process_group
+    from sentry.utils import json
+    from sentry.utils.performance import SqlQueryCountMonitor
+    from sentry.utils.samples import DATA_ROOT, load_data
+
+    project = Project.objects.get_from_cache(id=project_id)
+
+    if not platforms:
+        platforms = sorted(
+            os.path.splitext(name)[0] for name in os.listdir(os.path.join(DATA_ROOT, 'samples'))
+        )
+    samples = []
+    for platform in platforms:
+        # the sample name only ends up in the message, passing it avoids a
+        # dependency on the integration docs
+        data = load_data(platform, sample_name=platform)
+        if data is None:
+            click.echo('Skipping {!r}, no sample event.'.format(platform), err=True)
+            continue
+        samples.append(data)
+    if not samples:
+        raise click.ClickException('No sample events found.')
+
+    stats = defaultdict(lambda: {'durations': [], 'queries': 0, 'allocations': 0})
+
+    @contextmanager
+    def stage(name):
+        monitor = SqlQueryCountMonitor(name, max_queries=float('inf'), max_dupes=float('inf'))
+        # gc is paused so that the count of tracked objects isn't reset
+        gc.disable()
+        allocations = gc.get_count()[0]
+        start = time()
+        try:
+            with monitor:
+                yield
+        finally:
+            duration = time() - start
+            allocations = gc.get_count()[0] - allocations
+            gc.enable()
+        stats[name]['durations'].append(duration)
+        stats[name]['queries'] += monitor.state.count
+        stats[name]['allocations'] += allocations
+
+    def run():
+        for _ in range(iterations):
+            for sample in samples:
+                data = deepcopy(sample)
+                data['event_id'] = uuid4().hex
+                data['project'] = project.id
+
+                manager = EventManager(data)
+                with stage('normalize'):
+                    data = manager.normalize()
+
+                with stage('process_stacktraces'):
+                    data = process_stacktraces(data) or data
+
+                with stage('save'):
+                    event = EventManager(data).save(project.id, raw=True)
+
+                with stage('post_process_group'):
+                    post_process_group(
+                        event=event,
+                        is_new=False,
+                        is_regression=False,
+                        is_sample=False,
+                        is_new_group_environment=False,
+                    )
+
+    with rollback():
+        if in_memory:
+            with in_memory_services():
+                run()
+        else:
+            run()
+
+    count = iterations * len(samples)
+    results = {}
+    for name, stat in six.iteritems(stats):
+        durations = stat['durations']
+        results[name] = {
+            'count': len(durations),
+            'p50': percentile(durations, 0.5) * 1000,
+            'p90': percentile(durations, 0.9) * 1000,
+            'p99': percentile(durations, 0.99) * 1000,
+            'max': max(durations) * 1000,
+            'queries': float(stat['queries']) / count,
+            'allocations': float(stat['allocations']) / count,
+        }
+
+    if output_format == 'json':
+        click.echo(json.dumps({
+            'version': get_version(),
+            'revision': get_revision(),
+            'platforms': [sample['platform'] for sample in samples],
+            'iterations': iterations,
+            'stages': results,
+        }), file=output)
+        return
+
+    for name in ('normalize', 'process_stacktraces', 'save', 'post_process_group'):
+        result = results[name]
+        click.echo(
+            '{:<20} {:>8.2f} ms p50 {:>8.2f} ms p90 {:>8.2f} ms p99 {:>8.2f} ms max '
+            '{:>8.2f} queries/event {:>10.1f} allocations/event'.format(
+                name,
+                result['p50'],
+                result['p90'],
+                result['p99'],
+                result['max'],
+                result['queries'],
+                result['allocations'],
+            ),
+            file=output,
+        )
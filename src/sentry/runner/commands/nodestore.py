@@ -0,0 +1,106 @@
+"""
+sentry.runner.commands.nodestore
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import click
+
+from sentry.runner.decorators import configuration
+from sentry.utils.iterators import chunked
+
+
+def get_sample(limit, project_id=None, platform=None):
+    """
+    Returns a list of ``(node_id, data)`` tuples for the most recent events.
+
+    Nodes that are missing from the node storage are left out.
+    """
+    from sentry import nodestore
+    from sentry.models import Event
+
+    queryset = Event.objects.all()
+    if project_id is not None:
+        queryset = queryset.filter(project_id=project_id)
+    if platform is not None:
+        queryset = queryset.filter(platform=platform)
+
+    node_ids = [
+        event.data.id for event in queryset.order_by('-id')[:limit]
+        if event.data.id
+    ]
+    if not node_ids:
+        return []
+
+    # read the stored documents directly: bound node data replaces anything
+    # the backend failed to return with an empty dict, which must never be
+    # written back over the real node.
+    nodes = nodestore.get_multi(node_ids)
+    return [(node_id, nodes[node_id]) for node_id in node_ids if nodes.get(node_id)]
+
+
+@click.group()
+def nodestore():
+    """Manage the node storage."""
+
+
+@nodestore.command('train-dictionary')
+@click.argument('platform')
+@click.argument('output', type=click.File('wb'))
+@click.option('--sample', default=1000, show_default=True,
+              help='Number of recent events to train with.')
+@click.option('--project', 'project_id', type=int, help='Only train with events of a project.')
+@click.option('--serializer', type=click.Choice(['json', 'msgpack']), default='json',
+              show_default=True, help='Serializer that the dictionary is used with.')
+@click.option('--size', default=112640, show_default=True,
+              help='Size of the dictionary in bytes.')
+@configuration
+def train_dictionary(platform, output, sample, project_id, serializer, size):
+    """
+    Train a zstd dictionary for the node data of a platform.
+
+    The dictionary can be configured for the platform with the `dictionaries`
+    option of `sentry.nodestore.codecs.NodeCodec`.
+    """
+    import zstandard
+
+    from sentry.nodestore.codecs import SERIALIZERS
+
+    serializer = SERIALIZERS[serializer]()
+    samples = [serializer.dumps(data) for _, data in get_sample(sample, project_id, platform)]
+    if not samples:
+        raise click.ClickException('No events found for platform {!r}'.format(platform))
+
+    dictionary = zstandard.train_dictionary(size, samples)
+    output.write(dictionary.as_bytes())
+    click.echo(
+        'Trained dictionary {} with {} samples.'.format(dictionary.dict_id(), len(samples)),
+        err=True,
+    )
+
+
+@nodestore.command()
+@click.option('--limit', default=10000, show_default=True,
+              help='Number of recent events to migrate.')
+@click.option('--project', 'project_id', type=int, help='Only migrate events of a project.')
+@click.option('--batch-size', default=100, show_default=True,
+              help='Number of nodes written at once.')
+@configuration
+def migrate(limit, project_id, batch_size):
+    """
+    Rewrite existing nodes with the configured codec.
+    """
+    from sentry import nodestore
+
+    if getattr(nodestore.backend, 'codec', None) is None:
+        raise click.ClickException('The configured node storage does not use a codec.')
+
+    count = 0
+    for batch in chunked(get_sample(limit, project_id), batch_size):
+        nodestore.set_multi(dict(batch))
+        count += len(batch)
+
+    click.echo('Migrated {} nodes.'.format(count), err=True)
@@ -0,0 +1,70 @@
+"""
+sentry.runner.commands.search
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import click
+
+from sentry.runner.decorators import configuration
+
+
+@click.group()
+def search():
+    """Manage the search index."""
+
+
+@search.command('rebuild-index')
+@click.option('--project', 'project_ids', type=int, multiple=True,
+              help='Only rebuild the index of a project, can be given multiple times.')
+@click.option('--reset', default=False, is_flag=True,
+              help='Remove the indexed groups of every project before rebuilding it.')
+@configuration
+def rebuild_index(project_ids, reset):
+    """
+    Add the existing groups to the index of the search backend.
+
+    This has to be done once after enabling a search backend which keeps an
+    index, projects whose index is incomplete are searched without it.
+    """
+    from sentry import search
+    from sentry.models import Project
+    from sentry.utils.query import RangeQuerySetWrapper
+
+    projects = Project.objects.all()
+    if project_ids:
+        projects = projects.filter(id__in=project_ids)
+
+    for project in RangeQuerySetWrapper(projects):
+        search.backend.rebuild_index(project, reset=reset)
+        click.echo('Rebuilt the index of project {}.'.format(project.id), err=True)
+
+
+@search.command('rebuild-tag-index')
+@click.option('--project', 'project_ids', type=int, multiple=True,
+              help='Only rebuild the index of a project, can be given multiple times.')
+@configuration
+def rebuild_tag_index(project_ids):
+    """
+    Add the existing tagged groups to the search index of the tagstore.
+
+    This has to be done once after enabling the search index of the tagstore,
+    groups are only added to it when they are tagged again otherwise.
+    """
+    from sentry import tagstore
+    from sentry.models import Project
+    from sentry.utils.query import RangeQuerySetWrapper
+
+    projects = Project.objects.all()
+    if project_ids:
+        projects = projects.filter(id__in=project_ids)
+
+    for project in RangeQuerySetWrapper(projects):
+        try:
+            tagstore.rebuild_search_index(project.id)
+        except NotImplementedError:
+            raise click.ClickException('The tagstore does not keep a search index.')
+        click.echo('Rebuilt the tag index of project {}.'.format(project.id), err=True)
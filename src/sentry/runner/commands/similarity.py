@@ -0,0 +1,157 @@
+"""
+sentry.runner.commands.similarity
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import time
+from collections import OrderedDict, deque
+
+import click
+
+from sentry.runner.decorators import configuration
+from sentry.utils.iterators import chunked
+
+# the similarity index expires after 90 days (3 intervals of 30 days), a
+# backfill that is continued after that has to start over anyway
+CHECKPOINT_TTL = 60 * 60 * 24 * 90
+
+
+def get_checkpoint_key(project_id):
+    return 'similarity:backfill:{}'.format(project_id)
+
+
+def get_events(project_id, min_id=None, batch_size=500):
+    """
+    Yields chunks of ``(id, project_id, group_id, datetime, data)`` tuples for
+    the events of a project in the order of their ids.
+    """
+    from sentry.models import Event
+    from sentry.utils.query import RangeQuerySetWrapper
+
+    events = RangeQuerySetWrapper(
+        Event.objects.filter(project_id=project_id, group_id__isnull=False),
+        step=batch_size,
+        min_id=min_id,
+        callbacks=[lambda events: Event.objects.bind_nodes(events, 'data')],
+    )
+    for chunk in chunked(events, batch_size):
+        yield [
+            (event.id, event.project_id, event.group_id, event.datetime, dict(event.data))
+            for event in chunk
+        ]
+
+
+def record_events(chunk):
+    """
+    Records a chunk of events (as returned by ``get_events``) in the
+    similarity index. This runs in the worker processes of the backfill, so
+    the events are only built from their data and are never saved.
+    """
+    from sentry import similarity
+    from sentry.models import Event
+
+    groups = OrderedDict()
+    for id, project_id, group_id, datetime, data in chunk:
+        groups.setdefault(group_id, []).append(Event(
+            id=id,
+            project_id=project_id,
+            group_id=group_id,
+            datetime=datetime,
+            data=data,
+        ))
+
+    similarity.features.bulk_record(list(groups.values()))
+
+
+@click.group()
+def similarity():
+    """Manage the similarity index."""
+
+
+@similarity.command()
+@click.option('--project', 'project_ids', type=int, multiple=True,
+              help='Only backfill the events of a project, can be given multiple times.')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Number of events read and recorded at once.')
+@click.option('--concurrency', default=4, show_default=True,
+              help='Number of processes which extract features and write to the index.')
+@click.option('--rate', type=float, help='Maximum number of events recorded per second.')
+@click.option('--reset', default=False, is_flag=True,
+              help='Start from the first event of every project instead of the checkpoint.')
+@configuration
+def backfill(project_ids, batch_size, concurrency, rate, reset):
+    """
+    Record existing events in the similarity index.
+
+    The events of every project are read in the order of their ids, and the
+    id of the last recorded event is kept as a checkpoint, so that a backfill
+    which was interrupted continues where it stopped.
+    """
+    from multiprocessing import Pool
+
+    from sentry.models import Project
+    from sentry.utils.query import RangeQuerySetWrapper
+    from sentry.utils.redis import clusters
+
+    if concurrency < 1:
+        raise click.BadParameter('must be at least 1', param_hint='--concurrency')
+
+    projects = Project.objects.all()
+    if project_ids:
+        projects = projects.filter(id__in=project_ids)
+
+    # the workers are forked before any events are read
+    pool = Pool(concurrency) if concurrency > 1 else None
+    started = time.time()
+    total = 0
+
+    try:
+        for project in RangeQuerySetWrapper(projects):
+            key = get_checkpoint_key(project.id)
+            client = clusters.get('default').get_local_client_for_key(key)
+            checkpoint = None if reset else client.get(key)
+            min_id = int(checkpoint) + 1 if checkpoint is not None else None
+
+            # chunks are checkpointed in order once they are recorded, at
+            # most one chunk per worker is queued to bound the memory usage
+            pending = deque()
+            count = 0
+
+            def complete():
+                last_id, result = pending.popleft()
+                if result is not None:
+                    result.get()
+                client.setex(key, CHECKPOINT_TTL, last_id)
+
+            for chunk in get_events(project.id, min_id, batch_size):
+                if pool is not None:
+                    pending.append((chunk[-1][0], pool.apply_async(record_events, (chunk, ))))
+                else:
+                    record_events(chunk)
+                    pending.append((chunk[-1][0], None))
+
+                while len(pending) > concurrency:
+                    complete()
+
+                count += len(chunk)
+                total += len(chunk)
+                if rate:
+                    delay = total / rate - (time.time() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+
+            while pending:
+                complete()
+
+            click.echo(
+                'Recorded {} events of project {}.'.format(count, project.id),
+                err=True,
+            )
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
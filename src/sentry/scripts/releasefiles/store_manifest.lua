@@ -0,0 +1,26 @@
+-- Store a manifest built from the database, unless it was cleared while it
+-- was being built. Clearing a manifest replaces it with a hash that only
+-- contains a new version, so a manifest built before that would reintroduce
+-- files which were renamed or deleted in the meantime.
+--
+-- KEYS = {manifest}
+-- ARGV = {version field, expected version ("" for none), complete field,
+--         ttl, name, entry, name, entry, ...}
+--
+-- Returns 1 if the manifest was stored, 0 if it was discarded.
+local key = KEYS[1]
+local version_field = ARGV[1]
+local expected_version = ARGV[2]
+local complete_field = ARGV[3]
+local ttl = tonumber(ARGV[4])
+
+if (redis.call('HGET', key, version_field) or '') ~= expected_version then
+    return 0
+end
+
+for i = 5, #ARGV, 2 do
+    redis.call('HSET', key, ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', key, complete_field, '1')
+redis.call('EXPIRE', key, ttl)
+return 1
@@ -606,6 +606,20 @@ end
 
 -- Command Parsing
 
+local function record(configuration, key, signatures)
+    return table.imap(
+        signatures,
+        function (signature)
+            set_frequencies(configuration, signature.index, key, signature.frequencies)
+            for band, buckets in ipairs(signature.frequencies) do
+                for bucket in pairs(buckets) do
+                    get_bucket_membership_set(configuration, signature.index, band, bucket):add(key)
+                end
+            end
+        end
+    )
+end
+
 local commands = {
     RECORD = function (configuration, cursor, arguments)
         local cursor, key, signatures = multiple_argument_parser(
@@ -618,17 +632,32 @@ local commands = {
             )
         )(cursor, arguments)
 
-        return table.imap(
-            signatures,
-            function (signature)
-                set_frequencies(configuration, signature.index, key, signature.frequencies)
-                for band, buckets in ipairs(signature.frequencies) do
-                    for bucket in pairs(buckets) do
-                        get_bucket_membership_set(configuration, signature.index, band, bucket):add(key)
-                    end
-                end
-            end
-        )
+        return record(configuration, key, signatures)
+    end,
+    BULK_RECORD = function (configuration, cursor, arguments)
+        -- Records many keys of the scope at once. Every key is followed by
+        -- its timestamp and the number of its signatures, which are passed
+        -- as for RECORD.
+        local cursor, records = variadic_argument_parser(
+            object_argument_parser({
+                {"key", argument_parser(validate_value)},
+                {"timestamp", argument_parser(validate_number)},
+                {"signatures", repeated_argument_parser(
+                    object_argument_parser({
+                        {"index", argument_parser(validate_value)},
+                        {"frequencies", frequencies_argument_parser(configuration)},
+                    })
+                )},
+            })
+        )(cursor, arguments)
+
+        for _, entry in ipairs(records) do
+            record(
+                setmetatable({timestamp = entry.timestamp}, {__index = configuration}),
+                entry.key,
+                entry.signatures
+            )
+        end
     end,
     CLASSIFY = function (configuration, cursor, arguments)
         local cursor, limit, parameters = multiple_argument_parser(
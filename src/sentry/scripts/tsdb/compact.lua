@@ -0,0 +1,59 @@
+--[[
+
+Counter Compaction
+==================
+
+Marks a completed counter hash of the finest rollup as compacted and returns
+the values that still have to be added to the coarser rollups.
+
+``KEYS[1]`` is the hash key. ``ARGV[1]`` is the name of the field that marks
+the hash as compacted, and ``ARGV[2]`` is the suffix of fields that record
+the part of a counter that has already been written to every rollup (because
+it arrived after the hash became eligible for compaction.)
+
+The reply is a flat array of ``field, value`` pairs. It is empty if the key
+does not exist, is not a hash, or has been compacted before.
+
+]]--
+
+local key = KEYS[1]
+local marker = ARGV[1]
+local suffix = ARGV[2]
+
+if redis.call('TYPE', key)['ok'] ~= 'hash' then
+    return {}
+end
+
+if redis.call('HSETNX', key, marker, 1) == 0 then
+    return {}
+end
+
+local fields = {}
+local values = {}
+local written = {}
+
+local entries = redis.call('HGETALL', key)
+for i = 1, #entries, 2 do
+    local field = entries[i]
+    local value = tonumber(entries[i + 1])
+    if field ~= marker then
+        if string.sub(field, -#suffix) == suffix then
+            field = string.sub(field, 1, #field - #suffix)
+            written[field] = (written[field] or 0) + value
+        else
+            table.insert(fields, field)
+            values[field] = value
+        end
+    end
+end
+
+local results = {}
+for _, field in ipairs(fields) do
+    local value = values[field] - (written[field] or 0)
+    if value ~= 0 then
+        table.insert(results, field)
+        table.insert(results, value)
+    end
+end
+
+return results
@@ -0,0 +1,38 @@
+--[[
+
+Counter Aggregation
+===================
+
+Reads a batch of simple counters, which are stored as fields of hashes, and
+adds them up on the server in a single call.
+
+Every hash key in ``KEYS`` is paired with two ``ARGV`` entries: the hash field
+to read, followed by the (1-based) position of the result that the value
+should be added to. The reply is an array of sums which contains an element
+for every position up to the highest one that was referenced. Missing fields
+count as zero.
+
+All keys have to be located on the server the script is executed on.
+
+]]--
+
+local results = {}
+local size = 0
+
+for i = 1, #KEYS do
+    local field = ARGV[i * 2 - 1]
+    local position = tonumber(ARGV[i * 2])
+    local value = tonumber(redis.call('HGET', KEYS[i], field)) or 0
+    results[position] = (results[position] or 0) + value
+    if position > size then
+        size = position
+    end
+end
+
+for i = 1, size do
+    if results[i] == nil then
+        results[i] = 0
+    end
+end
+
+return results
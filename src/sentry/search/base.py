@@ -15,7 +15,8 @@ EMPTY = object()
 
 
 class SearchBackend(Service):
-    __all__ = ('query', 'validate')
+    __all__ = ('query', 'validate', 'index_group', 'unindex_group', 'rebuild_index',
+               'delete_index')
 
     def __init__(self, **options):
         pass
@@ -46,3 +47,28 @@ class SearchBackend(Service):
         CursorResult.
         """
         raise NotImplementedError
+
+    def index_group(self, group, message=None, culprit=None):
+        """
+        Called when a group is created, or with the new ``message`` and
+        ``culprit`` when an event changes them, for backends which keep an
+        index of groups.
+        """
+
+    def unindex_group(self, group):
+        """
+        Called when a group is deleted, for backends which keep an index of
+        groups.
+        """
+
+    def rebuild_index(self, project, reset=False):
+        """
+        Adds all groups of a project to the index of the backend, if it keeps
+        one.
+        """
+
+    def delete_index(self, project):
+        """
+        Called when a project is deleted, for backends which keep an index of
+        groups.
+        """
@@ -12,7 +12,7 @@ from django.db import router
 from django.db.models import Q
 
 from sentry import tagstore
-from sentry.api.paginator import DateTimePaginator, Paginator
+from sentry.api.paginator import DateTimeKeysetPaginator, KeysetPaginator, Paginator
 from sentry.search.base import EMPTY, SearchBackend
 from sentry.search.django.constants import (
     MSSQL_ENGINES, MSSQL_SORT_CLAUSES, MYSQL_SORT_CLAUSES, ORACLE_SORT_CLAUSES, SORT_CLAUSES,
@@ -22,6 +22,13 @@ from sentry.utils.db import get_db_engine
 
 
 class DjangoSearchBackend(SearchBackend):
+    def _get_group_ids_for_query(self, project, query):
+        """
+        Returns the ids of the groups of a project which may match a text
+        query, or ``None`` if the groups have to be scanned.
+        """
+        return None
+
     def _build_queryset(
         self,
         project,
@@ -65,7 +72,14 @@ class DjangoSearchBackend(SearchBackend):
 
         queryset = Group.objects.filter(project=project)
 
+        query_matches = None
         if query:
+            query_matches = self._get_group_ids_for_query(project, query)
+            if query_matches is not None:
+                if not query_matches:
+                    return queryset.none(), None
+                queryset = queryset.filter(id__in=query_matches)
+
             # TODO(dcramer): if we want to continue to support search on SQL
             # we should at least optimize this in Postgres so that it does
             # the query filter **after** the index filters, and restricts the
@@ -109,16 +123,22 @@ class DjangoSearchBackend(SearchBackend):
 
         if first_release:
             if first_release is EMPTY:
-                return queryset.none()
+                return queryset.none(), None
             queryset = queryset.filter(
                 first_release__organization_id=project.organization_id,
                 first_release__version=first_release,
             )
 
+        # the number of groups with the tags if only some of them could be
+        # matched, which is an estimate of the hits
+        tag_hits = None
         if tags:
-            matches = tagstore.get_group_ids_for_search_filter(project.id, environment_id, tags)
+            matches, hits = tagstore.get_group_ids_and_hits_for_search_filter(
+                project.id, environment_id, tags)
             if not matches:
-                return queryset.none()
+                return queryset.none(), None
+            if hits is not None and hits > len(matches):
+                tag_hits = hits
             queryset = queryset.filter(
                 id__in=matches,
             )
@@ -200,6 +220,9 @@ class DjangoSearchBackend(SearchBackend):
             event_queryset = Event.objects.filter(**params)
 
             if query:
+                if query_matches is not None:
+                    event_queryset = event_queryset.filter(
+                        group_id__in=query_matches)
                 event_queryset = event_queryset.filter(
                     message__icontains=query)
 
@@ -233,13 +256,13 @@ class DjangoSearchBackend(SearchBackend):
         queryset = queryset.extra(
             select={'sort_value': score_clause},
         )
-        return queryset
+        return queryset, tag_hits
 
     def query(self, project, count_hits=False, paginator_options=None, **kwargs):
         if paginator_options is None:
             paginator_options = {}
 
-        queryset = self._build_queryset(project=project, **kwargs)
+        queryset, tag_hits = self._build_queryset(project=project, **kwargs)
 
         sort_by = kwargs.get('sort_by', 'date')
         limit = kwargs.get('limit', 100)
@@ -247,16 +270,16 @@ class DjangoSearchBackend(SearchBackend):
 
         # HACK: don't sort by the same column twice
         if sort_by == 'date':
-            paginator_cls = DateTimePaginator
+            paginator_cls = DateTimeKeysetPaginator
             sort_clause = '-last_seen'
         elif sort_by == 'priority':
-            paginator_cls = Paginator
+            paginator_cls = KeysetPaginator
             sort_clause = '-score'
         elif sort_by == 'new':
-            paginator_cls = DateTimePaginator
+            paginator_cls = DateTimeKeysetPaginator
             sort_clause = '-first_seen'
         elif sort_by == 'freq':
-            paginator_cls = Paginator
+            paginator_cls = KeysetPaginator
             sort_clause = '-times_seen'
         else:
             paginator_cls = Paginator
@@ -264,4 +287,8 @@ class DjangoSearchBackend(SearchBackend):
 
         queryset = queryset.order_by(sort_clause)
         paginator = paginator_cls(queryset, sort_clause, **paginator_options)
-        return paginator.get_result(limit, cursor, count_hits=count_hits)
+        result = paginator.get_result(limit, cursor, count_hits=count_hits)
+        if result.hits is not None and tag_hits is not None and tag_hits > result.hits:
+            result.hits = tag_hits
+            result.hits_estimated = True
+        return result
@@ -0,0 +1,161 @@
+"""
+sentry.search.redis.backend
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+from uuid import uuid4
+
+from django.utils.encoding import force_text
+
+from sentry.search.django.backend import DjangoSearchBackend
+from sentry.utils import metrics
+from sentry.utils.iterators import chunked
+from sentry.utils.redis import clusters
+
+
+def get_trigrams(text):
+    """
+    Returns the set of case insensitive trigrams of a text.
+    """
+    text = force_text(text, errors='replace').lower()
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class RedisSearchBackend(DjangoSearchBackend):
+    """
+    Keeps a trigram index of the messages and culprits of the groups of every
+    project in Redis, so that text queries only have to check the groups which
+    contain all trigrams of the query instead of scanning all groups.
+
+    The message of a group also contains the values of its metadata, so these
+    are indexed as well.
+
+    The index only ever has groups added to it, so it may contain groups which
+    no longer match (e.g. after their message changed) but never misses any:
+    the candidates are still filtered by the query in the database. A project
+    is only searched with the index once all of its groups were indexed, which
+    happens when its first group is created, or with ``rebuild_index``.
+    Deleted groups are removed from the sets of their current message and
+    culprit, and the sets of deleted projects are removed.
+    Queries shorter than a trigram, or with more than ``max_candidates``
+    candidates, scan the groups as before.
+    """
+
+    def __init__(self, cluster='default', max_candidates=10000, **options):
+        super(RedisSearchBackend, self).__init__(**options)
+        self.cluster = clusters.get(cluster)
+        self.max_candidates = max_candidates
+
+    def _get_client(self, project_id):
+        return self.cluster.get_local_client_for_key(u'si:{}'.format(project_id))
+
+    def _get_key(self, project_id, trigram):
+        return u'si:{}:t:{}'.format(project_id, trigram).encode('utf-8')
+
+    def _get_ready_key(self, project_id):
+        return u'si:{}:ready'.format(project_id)
+
+    def _add(self, project_id, groups):
+        """
+        Adds ``(group_id, trigrams)`` items of a project to the index.
+        """
+        with self._get_client(project_id).pipeline(transaction=False) as pipe:
+            for group_id, trigrams in groups:
+                for trigram in trigrams:
+                    pipe.sadd(self._get_key(project_id, trigram), group_id)
+            pipe.execute()
+
+    def index_group(self, group, message=None, culprit=None):
+        if message is None and culprit is None:
+            trigrams = get_trigrams(group.message) | get_trigrams(group.culprit or '')
+        else:
+            # the current message and culprit are already indexed
+            trigrams = set()
+            if message is not None:
+                trigrams |= get_trigrams(message) - get_trigrams(group.message)
+            if culprit is not None:
+                trigrams |= get_trigrams(culprit) - get_trigrams(group.culprit or '')
+
+        if trigrams:
+            self._add(group.project_id, [(group.id, trigrams)])
+
+        # projects which receive their first group are complete, projects
+        # which have groups but never received an event (e.g. because their
+        # groups were imported) have to be rebuilt
+        if message is None and culprit is None and not group.project.first_event:
+            from sentry.models import Group
+
+            if not Group.objects.filter(
+                project_id=group.project_id,
+            ).exclude(id=group.id).exists():
+                self._get_client(group.project_id).set(self._get_ready_key(group.project_id), 1)
+
+    def unindex_group(self, group):
+        trigrams = get_trigrams(group.message) | get_trigrams(group.culprit or '')
+        with self._get_client(group.project_id).pipeline(transaction=False) as pipe:
+            for trigram in trigrams:
+                pipe.srem(self._get_key(group.project_id, trigram), group.id)
+            pipe.execute()
+
+    def _delete_trigrams(self, client, project_id, batch_size=500):
+        for keys in chunked(client.scan_iter(u'si:{}:t:*'.format(project_id)), batch_size):
+            client.delete(*keys)
+
+    def rebuild_index(self, project, reset=False, batch_size=500):
+        from sentry.models import Group
+
+        client = self._get_client(project.id)
+        # the project is searched without the index until it is complete
+        client.delete(self._get_ready_key(project.id))
+        if reset:
+            self._delete_trigrams(client, project.id, batch_size)
+
+        queryset = Group.objects.filter(project=project).order_by('id')
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id).values_list(
+                'id', 'message', 'culprit',
+            )[:batch_size])
+            if not chunk:
+                break
+
+            self._add(project.id, [
+                (group_id, get_trigrams(message) | get_trigrams(culprit or ''))
+                for group_id, message, culprit in chunk
+            ])
+            last_id = chunk[-1][0]
+
+        client.set(self._get_ready_key(project.id), 1)
+
+    def delete_index(self, project):
+        client = self._get_client(project.id)
+        client.delete(self._get_ready_key(project.id))
+        self._delete_trigrams(client, project.id)
+
+    def _get_group_ids_for_query(self, project, query):
+        trigrams = get_trigrams(query)
+        if not trigrams:
+            return None
+
+        destination = u'si:{}:search:{}'.format(project.id, uuid4().hex)
+        with self._get_client(project.id).pipeline() as pipe:
+            pipe.exists(self._get_ready_key(project.id))
+            pipe.sinterstore(destination, [self._get_key(project.id, t) for t in trigrams])
+            pipe.srandmember(destination, self.max_candidates + 1)
+            pipe.delete(destination)
+            ready, hits, group_ids, _ = pipe.execute()
+
+        if not ready:
+            metrics.incr('search.index.not_ready')
+            return None
+
+        metrics.timing('search.index.candidates', hits)
+        if hits > self.max_candidates:
+            return None
+
+        return [int(group_id) for group_id in group_ids]
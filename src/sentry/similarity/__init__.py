@@ -17,7 +17,10 @@ from sentry.similarity.features import (
     MessageFeature,
     get_application_chunks,
 )
-from sentry.similarity.signatures import MinHashSignatureBuilder
+from sentry.similarity.signatures import (
+    MinHashSignatureBuilder,
+    VectorizedMinHashSignatureBuilder,
+)
 from sentry.utils import redis
 from sentry.utils.datastructures import BidirectionalMapping
 from sentry.utils.iterators import shingle
@@ -62,6 +65,13 @@ def get_frame_attributes(frame):
     return attributes
 
 
+def _make_signature_builder():
+    try:
+        return VectorizedMinHashSignatureBuilder(16, 0xFFFF)
+    except ImportError:
+        return MinHashSignatureBuilder(16, 0xFFFF)
+
+
 def _make_index_backend(cluster=None):
     if not cluster:
         cluster_id = getattr(
@@ -81,7 +91,7 @@ def _make_index_backend(cluster=None):
         RedisScriptMinHashIndexBackend(
             cluster,
             'sim:1',
-            MinHashSignatureBuilder(16, 0xFFFF),
+            _make_signature_builder(),
             8,
             60 * 60 * 24 * 30,
             3,
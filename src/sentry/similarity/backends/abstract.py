@@ -19,6 +19,10 @@ class AbstractIndexBackend(object):
     def record(self, scope, key, items, timestamp=None):
         pass
 
+    @abstractmethod
+    def bulk_record(self, records):
+        pass
+
     @abstractmethod
     def merge(self, scope, destination, items, timestamp=None):
         pass
@@ -13,6 +13,9 @@ class DummyIndexBackend(AbstractIndexBackend):
     def record(self, scope, key, items, timestamp=None):
         return {}
 
+    def bulk_record(self, records):
+        pass
+
     def merge(self, scope, destination, items, timestamp=None):
         return False
 
@@ -20,6 +20,11 @@ class MetricsWrapper(AbstractIndexBackend):
     def record(self, *args, **kwargs):
         return self.__instrumented_method_call('record', *args, **kwargs)
 
+    def bulk_record(self, records):
+        # the records may belong to different scopes
+        with timer(self.template.format('bulk_record')):
+            return self.backend.bulk_record(records)
+
     def classify(self, *args, **kwargs):
         return self.__instrumented_method_call('classify', *args, **kwargs)
 
@@ -3,6 +3,12 @@ from __future__ import absolute_import
 import itertools
 import time
 
+from collections import OrderedDict
+
+import rb
+from redis import StrictRedis
+from rediscluster import StrictRedisCluster
+
 from sentry.similarity.backends.abstract import AbstractIndexBackend
 from sentry.utils.iterators import chunked
 from sentry.utils.redis import load_script
@@ -126,10 +132,7 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
 
         return self._as_search_result(self.__index(scope, arguments))
 
-    def record(self, scope, key, items, timestamp=None):
-        if not items:
-            return  # nothing to do
-
+    def _build_record_arguments(self, scope, key, items, timestamp):
         if timestamp is None:
             timestamp = int(time.time())
 
@@ -149,7 +152,72 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
             arguments.append(idx)
             arguments.extend(self._build_signature_arguments(features))
 
-        return self.__index(scope, arguments)
+        return arguments
+
+    def record(self, scope, key, items, timestamp=None):
+        if not items:
+            return  # nothing to do
+
+        return self.__index(scope, self._build_record_arguments(scope, key, items, timestamp))
+
+    def _build_bulk_record_arguments(self, scope, records):
+        arguments = [
+            'BULK_RECORD',
+            int(time.time()),
+            self.namespace,
+            self.bands,
+            self.interval,
+            self.retention,
+            self.candidate_set_limit,
+            scope,
+        ]
+
+        for key, items, timestamp in records:
+            arguments.extend([key, timestamp if timestamp is not None else arguments[1], len(items)])
+            for idx, features in items:
+                arguments.append(idx)
+                arguments.extend(self._build_signature_arguments(features))
+
+        return arguments
+
+    def _get_pipeline_host(self, scope):
+        # The script is executed on the host that the scope is routed to, so
+        # all scopes of a host can share a pipeline. Pipelines can't be used
+        # with Redis Cluster, where the script may have to be loaded first.
+        if isinstance(self.cluster, rb.Cluster):
+            return self.cluster.get_router().get_host_for_key(scope)
+        elif isinstance(self.cluster, StrictRedis) and \
+                not isinstance(self.cluster, StrictRedisCluster):
+            return 0
+        return None
+
+    def bulk_record(self, records):
+        # The script uses the scope as the hash tag of all of its keys, so
+        # all records of a scope are sent in a single call, even to Redis
+        # Cluster. The calls for different scopes are pipelined per host
+        # where the client allows it.
+        scopes = OrderedDict()
+        for scope, key, items, timestamp in records:
+            if items:
+                scopes.setdefault(scope, []).append((key, items, timestamp))
+
+        pipelines = {}
+        for scope, scope_records in scopes.items():
+            arguments = self._build_bulk_record_arguments(scope, scope_records)
+            host = self._get_pipeline_host(scope)
+            if host is None:
+                self.__index(scope, arguments)
+                continue
+
+            pipeline = pipelines.get(host)
+            if pipeline is None:
+                client = self.cluster.get_local_client(host) \
+                    if isinstance(self.cluster, rb.Cluster) else self.cluster
+                pipeline = pipelines[host] = client.pipeline(transaction=False)
+            index(pipeline, [scope], arguments)
+
+        for pipeline in pipelines.values():
+            pipeline.execute()
 
     def merge(self, scope, destination, items, timestamp=None):
         if timestamp is None:
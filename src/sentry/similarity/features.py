@@ -93,10 +93,13 @@ class FeatureSet(object):
                 )
         return results
 
-    def record(self, events):
-        if not events:
-            return []
-
+    def get_record(self, events):
+        """
+        Returns the ``(scope, key, items, timestamp)`` record of the events,
+        which all have to belong to the same group. The scope and key are
+        derived from the identifiers of the events, so that records can be
+        built without fetching the project and group.
+        """
         scope = None
         key = None
 
@@ -104,17 +107,17 @@ class FeatureSet(object):
         for event in events:
             for label, features in self.extract(event).items():
                 if scope is None:
-                    scope = self.__get_scope(event.project)
+                    scope = '{}'.format(event.project_id)
                 else:
-                    assert self.__get_scope(
-                        event.project
+                    assert '{}'.format(
+                        event.project_id
                     ) == scope, 'all events must be associated with the same project'
 
                 if key is None:
-                    key = self.__get_key(event.group)
+                    key = '{}'.format(event.group_id)
                 else:
-                    assert self.__get_key(
-                        event.group
+                    assert '{}'.format(
+                        event.group_id
                     ) == key, 'all events must be associated with the same group'
 
                 try:
@@ -134,12 +137,21 @@ class FeatureSet(object):
                     if features:
                         items.append((self.aliases[label], features, ))
 
-        return self.index.record(
-            scope,
-            key,
-            items,
-            timestamp=int(to_timestamp(event.datetime)),
-        )
+        return (scope, key, items, int(to_timestamp(event.datetime)))
+
+    def record(self, events):
+        if not events:
+            return []
+
+        scope, key, items, timestamp = self.get_record(events)
+        return self.index.record(scope, key, items, timestamp=timestamp)
+
+    def bulk_record(self, groups):
+        """
+        Records the events of many groups at once, ``groups`` is a sequence of
+        lists of events which each belong to a single group.
+        """
+        return self.index.bulk_record([self.get_record(events) for events in groups if events])
 
     def classify(self, events, limit=None, thresholds=None):
         if not events:
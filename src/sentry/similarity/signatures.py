@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import mmh3
+import six
 
 
 class MinHashSignatureBuilder(object):
@@ -21,3 +22,88 @@ class MinHashSignatureBuilder(object):
             ),
             range(self.columns),
         )
+
+
+class VectorizedMinHashSignatureBuilder(MinHashSignatureBuilder):
+    """
+    Builds the same signatures as ``MinHashSignatureBuilder`` with NumPy.
+
+    The 32 bit MurmurHash3 of every feature is computed for all columns
+    (which are used as the seeds) at once: the blocks of the features are
+    only mixed once, and the hash states of all features and columns are
+    updated together as a 2-D array, of which the column minima are the
+    signature.
+
+    Since the hash states have to be updated block by block, few but long
+    features (such as encoded frames) are hashed faster one at a time, for
+    which the scalar builder is used.
+    """
+
+    def __init__(self, columns, rows):
+        import numpy
+        self.numpy = numpy
+        super(VectorizedMinHashSignatureBuilder, self).__init__(columns, rows)
+        self.seeds = numpy.arange(columns, dtype=numpy.uint32)
+
+    def __call__(self, features):
+        np = self.numpy
+        features = [f.encode('utf8') if isinstance(f, six.text_type) else f for f in features]
+        if not features:
+            raise ValueError('Cannot build a signature without features.')
+
+        # features are processed from the longest to the shortest, so that
+        # the features which still have blocks left are always a prefix
+        features.sort(key=len, reverse=True)
+        if len(features[0]) // 4 * 4 >= len(features):
+            return super(VectorizedMinHashSignatureBuilder, self).__call__(features)
+
+        lengths = np.array([len(f) for f in features], dtype=np.uint32)
+        nblocks = lengths // 4
+
+        # pad every feature with at least one null byte, so that the tail
+        # bytes can be read as a complete block
+        width = (len(features[0]) // 4 + 1) * 4
+        blocks = np.frombuffer(
+            b''.join(f.ljust(width, b'\x00') for f in features), dtype='<u4',
+        ).reshape(len(features), width // 4).astype(np.uint32)
+
+        # the blocks are mixed independently of the seed
+        k = self._mix(blocks)
+
+        h = np.empty((len(features), self.columns), dtype=np.uint32)
+        h[:] = self.seeds
+        # the number of features which have more than i blocks
+        remaining = len(features) - np.cumsum(np.bincount(nblocks))
+        for i in range(int(nblocks[0])):
+            state = h[:remaining[i]]
+            state ^= k[:remaining[i], i:i + 1]
+            state[:] = self._rotl(state, 13)
+            state *= np.uint32(5)
+            state += np.uint32(0xe6546b64)
+
+        # the tail block contains the remaining bytes followed by null bytes,
+        # which mix to zero for features without tail
+        tail = blocks[np.arange(len(features)), nblocks] & \
+            ((np.uint32(1) << (np.uint32(8) * (lengths % 4))) - np.uint32(1))
+        h ^= self._mix(tail)[:, None]
+
+        h ^= lengths[:, None]
+        h ^= h >> np.uint32(16)
+        h *= np.uint32(0x85ebca6b)
+        h ^= h >> np.uint32(13)
+        h *= np.uint32(0xc2b2ae35)
+        h ^= h >> np.uint32(16)
+
+        # mmh3 returns signed values, the modulo has to match Python's
+        hashes = h.view(np.int32).astype(np.int64) % self.rows
+        return hashes.min(axis=0).tolist()
+
+    def _rotl(self, value, bits):
+        np = self.numpy
+        return (value << np.uint32(bits)) | (value >> np.uint32(32 - bits))
+
+    def _mix(self, k):
+        np = self.numpy
+        k = k * np.uint32(0xcc9e2d51)
+        k = self._rotl(k, 15)
+        return k * np.uint32(0x1b873593)
@@ -2,11 +2,17 @@ from __future__ import absolute_import
 
 import logging
 import hashlib
+import os
+import threading
 from datetime import datetime
+from time import time
 
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
 
 from sentry.models import Project, Release
+from sentry.utils import metrics
 from sentry.utils.safe import safe_execute
 from sentry.utils.cache import cache
 
@@ -20,6 +26,54 @@ StacktraceInfo.__hash__ = lambda x: id(x)
 StacktraceInfo.__eq__ = lambda a, b: a is b
 StacktraceInfo.__ne__ = lambda a, b: a is not b
 
+# marks frames without a cache value to be written
+NO_VALUE = object()
+
+
+class LocalFrameCache(object):
+    """Memoizes frame cache values in the current process, so that frames
+    which show up in many events handled by the same worker don't require a
+    round trip to the cache.  The values are shared between events, which
+    is fine because processors treat cache values as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get_many(self, keys):
+        now = time()
+        rv = {}
+        with self._lock:
+            for key in keys:
+                item = self._data.pop(key, None)
+                if item is None:
+                    continue
+                expires, value = item
+                if expires > now:
+                    self._data[key] = item
+                    rv[key] = value
+        return rv
+
+    def set_many(self, values, timeout):
+        max_size = settings.SENTRY_FRAME_CACHE_LOCAL_SIZE
+        if not max_size:
+            return
+        expires = time() + min(timeout, settings.SENTRY_FRAME_CACHE_LOCAL_TTL)
+        with self._lock:
+            for key, value in six.iteritems(values):
+                self._data.pop(key, None)
+                self._data[key] = (expires, value)
+            while len(self._data) > max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_frame_cache = LocalFrameCache()
+
 
 class ProcessableFrame(object):
     def __init__(self, frame, idx, processor, stacktrace_info, processable_frames):
@@ -30,6 +84,7 @@ class ProcessableFrame(object):
         self.data = None
         self.cache_key = None
         self.cache_value = None
+        self.new_cache_value = NO_VALUE
         self.processable_frames = processable_frames
 
     def __repr__(self):
@@ -59,8 +114,11 @@ class ProcessableFrame(object):
         return self.processable_frames[last_idx]
 
     def set_cache_value(self, value):
+        """Stores a value for the cache key of the frame.  The values of all
+        frames are written together once the stacktraces are processed.
+        """
         if self.cache_key is not None:
-            cache.set(self.cache_key, value, 3600)
+            self.new_cache_value = value
             return True
         return False
 
@@ -127,6 +185,10 @@ class StacktraceProcessingTask(object):
 
 
 class StacktraceProcessor(object):
+    # number of seconds frame cache values are kept, can be overridden per
+    # processor class with ``SENTRY_FRAME_CACHE_TTLS``
+    frame_cache_ttl = 3600
+
     def __init__(self, data, stacktrace_infos, project=None):
         self.data = data
         self.stacktrace_infos = stacktrace_infos
@@ -137,6 +199,10 @@ class StacktraceProcessor(object):
     def close(self):
         pass
 
+    def get_frame_cache_ttl(self):
+        return settings.SENTRY_FRAME_CACHE_TTLS.get(
+            type(self).__name__, self.frame_cache_ttl)
+
     def get_release(self, create=False):
         """Convenient helper to return the release for the current data
         and optionally creates the release if it's missing.  In case there
@@ -346,17 +412,41 @@ def process_single_stacktrace(processing_task, stacktrace_info, processable_fram
 
 
 def lookup_frame_cache(keys):
-    rv = {}
-    for key in keys:
-        rv[key] = cache.get(key)
+    rv = local_frame_cache.get_many(keys)
+    if rv:
+        metrics.incr('stacktraces.frame_cache.local_hit', len(rv))
+
+    missing = [key for key in keys if key not in rv]
+    if missing:
+        values = cache.get_many(missing)
+        # the remaining lifetime of shared values is not known, the local
+        # ttl is short enough for that not to matter
+        local_frame_cache.set_many(values, settings.SENTRY_FRAME_CACHE_LOCAL_TTL)
+        rv.update(values)
     return rv
 
 
+def write_frame_cache(processing_task):
+    """Writes the new cache values of all frames with one call per ttl."""
+    by_ttl = {}
+    for processor, processable_frames in six.iteritems(processing_task.processors):
+        values = {}
+        for processable_frame in processable_frames:
+            if processable_frame.new_cache_value is not NO_VALUE:
+                values[processable_frame.cache_key] = processable_frame.new_cache_value
+        if values:
+            by_ttl.setdefault(processor.get_frame_cache_ttl(), {}).update(values)
+
+    for ttl, values in six.iteritems(by_ttl):
+        cache.set_many(values, ttl)
+        local_frame_cache.set_many(values, ttl)
+
+
 def get_stacktrace_processing_task(infos, processors):
     """Returns a list of all tasks for the processors.  This can skip over
     processors that seem to not handle any frames.
     """
-    by_processor = {}
+    by_processor = OrderedDict()
     by_stacktrace_info = {}
     to_lookup = {}
 
@@ -369,17 +459,119 @@ def get_stacktrace_processing_task(infos, processors):
             by_stacktrace_info.setdefault(processable_frame.stacktrace_info, []) \
                 .append(processable_frame)
             if processable_frame.cache_key is not None:
-                to_lookup[processable_frame.cache_key] = processable_frame
-
-    frame_cache = lookup_frame_cache(to_lookup)
-    for cache_key, processable_frame in six.iteritems(to_lookup):
-        processable_frame.cache_value = frame_cache.get(cache_key)
+                to_lookup.setdefault(processable_frame.cache_key, []) \
+                    .append(processable_frame)
+
+    if to_lookup:
+        frame_cache = lookup_frame_cache(list(to_lookup))
+        hits = {}
+        misses = {}
+        for cache_key, processable_frames in six.iteritems(to_lookup):
+            cache_value = frame_cache.get(cache_key)
+            for processable_frame in processable_frames:
+                processable_frame.cache_value = cache_value
+                counts = misses if cache_value is None else hits
+                name = type(processable_frame.processor).__name__
+                counts[name] = counts.get(name, 0) + 1
+
+        for name, count in six.iteritems(hits):
+            metrics.incr('stacktraces.frame_cache.hit', count, instance=name)
+        for name, count in six.iteritems(misses):
+            metrics.incr('stacktraces.frame_cache.miss', count, instance=name)
 
     return StacktraceProcessingTask(
         processable_stacktraces=by_stacktrace_info, processors=by_processor
     )
 
 
+# The threads that run preprocess steps concurrently are kept per process (and
+# hold on to their own database connections).
+_preprocess_executor = None
+_preprocess_executor_lock = threading.Lock()
+
+
+def get_preprocess_executor():
+    global _preprocess_executor
+    pid = os.getpid()
+    size = settings.SENTRY_STACKTRACE_PREPROCESS_CONCURRENCY
+    with _preprocess_executor_lock:
+        # a forked process has to start its own threads
+        if _preprocess_executor is None or _preprocess_executor[:2] != (pid, size):
+            if _preprocess_executor is not None and _preprocess_executor[0] == pid:
+                _preprocess_executor[2].shutdown(wait=False)
+            _preprocess_executor = (pid, size, ThreadPoolExecutor(size))
+        return _preprocess_executor[2]
+
+
+def run_preprocess_step(processor, processing_task):
+    start = time()
+    try:
+        return processor.preprocess_step(processing_task)
+    finally:
+        metrics.timing('stacktraces.preprocess_step', time() - start,
+                       instance=type(processor).__name__)
+
+
+def merge_preprocessed_data(data, original, view):
+    """Applies the changes that a processor made to its copy of the event
+    data during a concurrent preprocess step to the event data.
+    """
+    for key, value in six.iteritems(view):
+        if key == 'errors':
+            data.setdefault('errors', []).extend(value[len(original.get('errors') or ()):])
+        elif key == 'processing_issues':
+            data.setdefault('processing_issues', {}).update(value)
+        elif key not in original or original[key] is not value:
+            data[key] = value
+    for key in original:
+        if key not in view:
+            data.pop(key, None)
+
+
+def preprocess_concurrently(processing_task, data):
+    """Runs the preprocess steps of all processors at the same time, so
+    that their source, debug file and symbol lookups overlap.
+
+    Every processor works on its own copy of the top level of the event data
+    (with copies of the errors and processing issues), and the changes are
+    merged into the data in the order of the processors afterwards, so the
+    result does not depend on the order in which the steps finish.
+    """
+    def copy():
+        rv = dict(data)
+        if 'errors' in data:
+            rv['errors'] = list(data['errors'])
+        if 'processing_issues' in data:
+            rv['processing_issues'] = dict(data['processing_issues'])
+        return rv
+
+    processors = list(processing_task.iter_processors())
+    original = copy()
+    views = []
+    for processor in processors:
+        processor.data = copy()
+        views.append(processor.data)
+
+    executor = get_preprocess_executor()
+    futures = []
+    try:
+        for processor in processors:
+            futures.append(executor.submit(run_preprocess_step, processor, processing_task))
+    finally:
+        wait(futures)
+        for processor in processors:
+            processor.data = data
+
+    changed = False
+    for view, future in zip(views, futures):
+        merge_preprocessed_data(data, original, view)
+        # errors are raised for the first failed processor, like they would
+        # be if the steps ran one after another
+        if future.result():
+            changed = True
+    return changed
+
+
 def process_stacktraces(data, make_processors=None):
     infos = find_stacktraces_in_data(data)
     if make_processors is None:
@@ -399,9 +591,17 @@ def process_stacktraces(data, make_processors=None):
     try:
 
         # Preprocess step
-        for processor in processing_task.iter_processors():
-            if processor.preprocess_step(processing_task):
-                changed = True
+        start = time()
+        concurrent = settings.SENTRY_STACKTRACE_PREPROCESS_CONCURRENCY > 1 and \
+            len(processing_task.processors) > 1
+        if concurrent:
+            changed = preprocess_concurrently(processing_task, data)
+        else:
+            for processor in processing_task.iter_processors():
+                if run_preprocess_step(processor, processing_task):
+                    changed = True
+        metrics.timing('stacktraces.preprocess', time() - start,
+                       tags={'concurrent': concurrent})
 
         # Process all stacktraces
         for stacktrace_info, processable_frames in processing_task.iter_processable_stacktraces():
@@ -422,6 +622,10 @@ def process_stacktraces(data, make_processors=None):
                 changed = True
 
     finally:
+        try:
+            write_frame_cache(processing_task)
+        except Exception:
+            logger.exception('Failed to write frame cache')
         for processor in processors:
             processor.close()
         processing_task.close()
@@ -72,9 +72,14 @@ class TagStorage(Service):
         'get_release_tags',
         'incr_tag_value_times_seen',
         'incr_group_tag_value_times_seen',
+        'incr_group_tag_values_times_seen',
         'get_group_ids_for_users',
         'get_group_tag_values_for_users',
         'get_group_ids_for_search_filter',
+        'get_group_ids_and_hits_for_search_filter',
+        'rebuild_search_index',
+        'merge_group_search_index',
+        'delete_group_search_index',
         'update_group_tag_key_values_seen',
         'update_group_for_events',
 
@@ -322,6 +327,18 @@ class TagStorage(Service):
         """
         raise NotImplementedError
 
+    def incr_group_tag_values_times_seen(
+            self, project_id, group_id, environment_id, tags, extra=None, count=1):
+        """
+        Increments the ``(key, value)`` tags of an event, for backends which
+        can write them together.
+
+        >>> incr_group_tag_values_times_seen(1, 2, 3, [("key1", "value1")])
+        """
+        for key, value in tags:
+            self.incr_group_tag_value_times_seen(
+                project_id, group_id, environment_id, key, value, extra=extra, count=count)
+
     def get_group_event_ids(self, project_id, group_id, environment_id, tags):
         """
         >>> get_group_event_ids(1, 2, 3, {'key1': 'value1', 'key2': 'value2'})
@@ -388,12 +405,49 @@ class TagStorage(Service):
         """
         raise NotImplementedError
 
-    def get_group_ids_for_search_filter(self, project_id, environment_id, tags):
+    def get_group_ids_for_search_filter(self, project_id, environment_id, tags, limit=1000):
         """
         >>> get_group_ids_for_search_filter(1, 2, [('key1', 'value1'), ('key2', 'value2')])
         """
         raise NotImplementedError
 
+    def get_group_ids_and_hits_for_search_filter(self, project_id, environment_id, tags,
+                                                 limit=1000):
+        """
+        Returns the result of ``get_group_ids_for_search_filter`` and the
+        number of all matching groups, or ``None`` if the backend can't count
+        them.
+
+        >>> get_group_ids_and_hits_for_search_filter(1, 2, [('key1', 'value1')])
+        """
+        return self.get_group_ids_for_search_filter(
+            project_id, environment_id, tags, limit=limit), None
+
+    def rebuild_search_index(self, project_id):
+        """
+        Adds all tagged groups of a project to the search index, for backends
+        which keep one.
+
+        >>> rebuild_search_index(1)
+        """
+        raise NotImplementedError
+
+    def merge_group_search_index(self, project_id, source_id, destination_id):
+        """
+        Moves a group to another group in the search index, if there is one.
+
+        >>> merge_group_search_index(1, 2, 3)
+        """
+        raise NotImplementedError
+
+    def delete_group_search_index(self, project_id, group_id):
+        """
+        Removes a group from the search index, if there is one.
+
+        >>> delete_group_search_index(1, 2)
+        """
+        raise NotImplementedError
+
     def update_group_for_events(self, project_id, event_ids, destination_id):
         """
         >>> update_group_for_events(1, [2, 3], 4)
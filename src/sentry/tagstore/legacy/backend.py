@@ -578,6 +578,13 @@ class LegacyTagStorage(TagStorage):
 
         return matches
 
+    def merge_group_search_index(self, project_id, source_id, destination_id):
+        # there is no search index, groups are searched in the database
+        pass
+
+    def delete_group_search_index(self, project_id, group_id):
+        pass
+
     def update_group_tag_key_values_seen(self, project_id, group_ids):
         gtk_qs = GroupTagKey.objects.filter(
             project_id=project_id,
@@ -198,6 +198,9 @@ class MultiTagStorage(TagStorage):
     def incr_group_tag_value_times_seen(self, *args, **kwargs):
         return self._call_all_backends('incr_group_tag_value_times_seen', *args, **kwargs)
 
+    def incr_group_tag_values_times_seen(self, *args, **kwargs):
+        return self._call_all_backends('incr_group_tag_values_times_seen', *args, **kwargs)
+
     def get_group_event_ids(self, *args, **kwargs):
         return self._call_one_backend('get_group_event_ids', *args, **kwargs)
 
@@ -228,6 +231,30 @@ class MultiTagStorage(TagStorage):
     def get_group_ids_for_search_filter(self, *args, **kwargs):
         return self._call_one_backend('get_group_ids_for_search_filter', *args, **kwargs)
 
+    def get_group_ids_and_hits_for_search_filter(self, *args, **kwargs):
+        return self._call_one_backend(
+            'get_group_ids_and_hits_for_search_filter', *args, **kwargs)
+
+    def rebuild_search_index(self, *args, **kwargs):
+        # this is not dual-written in the background, the index of every
+        # backend which keeps one is rebuilt right away
+        rebuilt = False
+        for backend in self.backends:
+            try:
+                backend.rebuild_search_index(*args, **kwargs)
+            except NotImplementedError:
+                continue
+            rebuilt = True
+
+        if not rebuilt:
+            raise NotImplementedError('None of the backends keeps a search index.')
+
+    def merge_group_search_index(self, *args, **kwargs):
+        return self._call_all_backends('merge_group_search_index', *args, **kwargs)
+
+    def delete_group_search_index(self, *args, **kwargs):
+        return self._call_all_backends('delete_group_search_index', *args, **kwargs)
+
     def update_group_tag_key_values_seen(self, *args, **kwargs):
         return self._call_all_backends('update_group_tag_key_values_seen', *args, **kwargs)
 
@@ -22,8 +22,10 @@ from six.moves import reduce
 from sentry import buffer
 from sentry.tagstore import TagKeyStatus
 from sentry.tagstore.base import TagStorage
-from sentry.utils import db
+from sentry.utils import db, metrics
+from sentry.utils.query import RangeQuerySetWrapper
 
+from .index import GroupTagIndex
 from .models import EventTag, GroupTagKey, GroupTagValue, TagKey, TagValue
 
 
@@ -36,8 +38,18 @@ class V2TagStorage(TagStorage):
 
     An ``environment_id`` value of ``None`` is used to keep track of the aggregate value across
     all environments.
+
+    If ``search_index_cluster`` is set, the groups are additionally indexed by their tags in that
+    Redis cluster, which is used to search for groups by tags (see ``GroupTagIndex``).  Groups
+    which were tagged before the index was enabled can be added with ``rebuild_search_index``.
     """
 
+    def __init__(self, search_index_cluster=None, search_index_options=None):
+        if search_index_cluster is not None:
+            self.search_index = GroupTagIndex(search_index_cluster, **(search_index_options or {}))
+        else:
+            self.search_index = None
+
     def setup(self):
         self.setup_deletions(
             tagkey_model=TagKey,
@@ -414,6 +426,9 @@ class V2TagStorage(TagStorage):
                 delete_tag_key_task.delay(object_id=tagkey.id, model=TagKey)
                 deleted.append(tagkey)
 
+        if deleted and self.search_index is not None:
+            self.search_index.delete_key(project_id, key)
+
         return deleted
 
     def delete_all_group_tag_keys(self, project_id, group_id):
@@ -427,6 +442,7 @@ class V2TagStorage(TagStorage):
             project_id=project_id,
             group_id=group_id,
         ).delete()
+        self.delete_group_search_index(project_id, group_id)
 
     def incr_tag_value_times_seen(self, project_id, environment_id,
                                   key, value, extra=None, count=1):
@@ -446,21 +462,36 @@ class V2TagStorage(TagStorage):
 
     def incr_group_tag_value_times_seen(self, project_id, group_id, environment_id,
                                         key, value, extra=None, count=1):
-        for env in [environment_id, None]:
-            tagkey, _ = self.get_or_create_tag_key(project_id, env, key)
-            tagvalue, _ = self.get_or_create_tag_value(project_id, env, key, value)
+        self.incr_group_tag_values_times_seen(
+            project_id, group_id, environment_id, [(key, value)], extra=extra, count=count)
+
+    def incr_group_tag_values_times_seen(self, project_id, group_id, environment_id,
+                                         tags, extra=None, count=1):
+        if self.search_index is not None:
+            # all tags are added to the index with one round trip
+            last_seen = (extra or {}).get('last_seen') or timezone.now()
+            self.search_index.record(project_id, group_id, [
+                (env, key, value, last_seen)
+                for key, value in tags
+                for env in [environment_id, None]
+            ])
 
-            buffer.incr(GroupTagValue,
-                        columns={
-                            'times_seen': count,
-                        },
-                        filters={
-                            'project_id': project_id,
-                            'group_id': group_id,
-                            '_key_id': tagkey.id,
-                            '_value_id': tagvalue.id,
-                        },
-                        extra=extra)
+        for key, value in tags:
+            for env in [environment_id, None]:
+                tagkey, _ = self.get_or_create_tag_key(project_id, env, key)
+                tagvalue, _ = self.get_or_create_tag_value(project_id, env, key, value)
+
+                buffer.incr(GroupTagValue,
+                            columns={
+                                'times_seen': count,
+                            },
+                            filters={
+                                'project_id': project_id,
+                                'group_id': group_id,
+                                '_key_id': tagkey.id,
+                                '_value_id': tagvalue.id,
+                            },
+                            extra=extra)
 
     def get_group_event_ids(self, project_id, group_id, environment_id, tags):
         # NOTE: `environment_id=None` needs to be filtered differently in this method.
@@ -666,8 +697,32 @@ class V2TagStorage(TagStorage):
             _key__key='sentry:user',
         ).order_by('-last_seen')[:limit])
 
+    def get_group_ids_and_hits_for_search_filter(self, project_id, environment_id, tags,
+                                                 limit=1000):
+        from sentry.search.base import ANY, EMPTY
+
+        if self.search_index is None:
+            return super(V2TagStorage, self).get_group_ids_and_hits_for_search_filter(
+                project_id, environment_id, tags, limit=limit)
+
+        if not tags or any(v is EMPTY for v in six.itervalues(tags)):
+            return None, None
+
+        # the matches are exact, so the most recently seen ones are the
+        # same as the first ones of a complete search
+        matches, hits = self.search_index.search(project_id, environment_id, [
+            (k, None if v == ANY else v) for k, v in six.iteritems(tags)
+        ], limit=limit)
+        metrics.timing('tagstore.search_index.hits', hits)
+        return matches or None, hits
+
     def get_group_ids_for_search_filter(self, project_id, environment_id, tags, limit=1000):
         from sentry.search.base import ANY, EMPTY
+
+        if self.search_index is not None:
+            return self.get_group_ids_and_hits_for_search_filter(
+                project_id, environment_id, tags, limit=limit)[0]
+
         # Django doesnt support union, so we limit results and try to find
         # reasonable matches
 
@@ -712,6 +767,27 @@ class V2TagStorage(TagStorage):
 
         return matches
 
+    def rebuild_search_index(self, project_id):
+        if self.search_index is None:
+            raise NotImplementedError('The search index is not enabled.')
+
+        queryset = GroupTagValue.objects.filter(
+            project_id=project_id,
+        ).select_related('_key', '_value')
+
+        for gtv in RangeQuerySetWrapper(queryset):
+            self.search_index.record(project_id, gtv.group_id, [
+                (gtv._key.environment_id, gtv._key.key, gtv._value.value, gtv.last_seen),
+            ])
+
+    def merge_group_search_index(self, project_id, source_id, destination_id):
+        if self.search_index is not None:
+            self.search_index.merge(project_id, source_id, destination_id)
+
+    def delete_group_search_index(self, project_id, group_id):
+        if self.search_index is not None:
+            self.search_index.remove(project_id, group_id)
+
     def update_group_tag_key_values_seen(self, project_id, group_ids):
         gtk_qs = GroupTagKey.objects.filter(
             project_id=project_id,
@@ -0,0 +1,152 @@
+"""
+sentry.tagstore.v2.index
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+from hashlib import md5
+from uuid import uuid4
+
+from sentry.utils.dates import to_timestamp
+from sentry.utils.redis import clusters
+
+
+class GroupTagIndex(object):
+    """\
+    An inverted index of the groups of a project by tag, which is kept in a
+    Redis cluster.
+
+    For every tag value (and every key, for searches that match any value)
+    there is a sorted set of the groups it was seen in, scored by the time
+    it was last seen in the group.  Searching for groups with several tags
+    intersects the sets, which gives the exact matches.
+
+    The sets every group is in and the sets of every tag key are tracked as
+    well, so that groups can be removed or merged and tag keys deleted.
+
+    All sets of a project are kept on the same host, and expire after
+    ``ttl`` seconds without updates.
+    """
+
+    def __init__(self, cluster='default', ttl=60 * 60 * 24 * 90):
+        self.cluster = clusters.get(cluster)
+        self.ttl = ttl
+
+    def _get_client(self, project_id):
+        return self.cluster.get_local_client_for_key('ts:gi:{}'.format(project_id))
+
+    def _get_key(self, project_id, environment_id, key, value=None):
+        parts = [
+            'ts:gi',
+            project_id,
+            environment_id if environment_id is not None else '',
+            md5(key.encode('utf-8')).hexdigest(),
+        ]
+        if value is not None:
+            parts.append(md5(value.encode('utf-8')).hexdigest())
+        return u':'.join(map(u'{}'.format, parts))
+
+    def _get_group_key(self, project_id, group_id):
+        # the sets that contain a group
+        return u'ts:gi:{}:g:{}'.format(project_id, group_id)
+
+    def _get_tag_key_key(self, project_id, key):
+        # the sets of a tag key, in all environments
+        return u'ts:gi:{}:k:{}'.format(project_id, md5(key.encode('utf-8')).hexdigest())
+
+    def record(self, project_id, group_id, items):
+        """\
+        Adds a group to the sets of ``(environment_id, key, value,
+        last_seen)`` items.
+        """
+        group_key = self._get_group_key(project_id, group_id)
+        with self._get_client(project_id).pipeline(transaction=False) as pipe:
+            for environment_id, key, value, last_seen in items:
+                score = to_timestamp(last_seen)
+                tag_key_key = self._get_tag_key_key(project_id, key)
+                for index_key in (self._get_key(project_id, environment_id, key),
+                                  self._get_key(project_id, environment_id, key, value)):
+                    pipe.zadd(index_key, score, group_id)
+                    pipe.expire(index_key, self.ttl)
+                    pipe.sadd(group_key, index_key)
+                    pipe.sadd(tag_key_key, index_key)
+                pipe.expire(tag_key_key, self.ttl)
+            pipe.expire(group_key, self.ttl)
+            pipe.execute()
+
+    def search(self, project_id, environment_id, tags, limit=1000):
+        """\
+        Returns the ids of the ``limit`` most recently seen groups which have
+        all ``(key, value)`` tags, where a value of ``None`` matches any
+        value, and the number of all groups that match.
+        """
+        keys = [
+            self._get_key(project_id, environment_id, key, value)
+            for key, value in tags
+        ]
+        destination = u'ts:gi:{}:search:{}'.format(project_id, uuid4().hex)
+
+        with self._get_client(project_id).pipeline() as pipe:
+            pipe.zinterstore(destination, keys, aggregate='MAX')
+            pipe.zrevrange(destination, 0, limit - 1)
+            pipe.delete(destination)
+            hits, group_ids, _ = pipe.execute()
+
+        return [int(group_id) for group_id in group_ids], hits
+
+    def remove(self, project_id, group_id):
+        """\
+        Removes a group from all sets.
+        """
+        client = self._get_client(project_id)
+        group_key = self._get_group_key(project_id, group_id)
+
+        with client.pipeline(transaction=False) as pipe:
+            for index_key in client.smembers(group_key):
+                pipe.zrem(index_key, group_id)
+            pipe.delete(group_key)
+            pipe.execute()
+
+    def merge(self, project_id, source_id, destination_id):
+        """\
+        Moves a group to the sets of another group, keeping the most recent
+        time either group was last seen with a tag.
+        """
+        client = self._get_client(project_id)
+        source_key = self._get_group_key(project_id, source_id)
+        destination_key = self._get_group_key(project_id, destination_id)
+
+        index_keys = list(client.smembers(source_key))
+        with client.pipeline(transaction=False) as pipe:
+            for index_key in index_keys:
+                pipe.zscore(index_key, source_id)
+                pipe.zscore(index_key, destination_id)
+            scores = pipe.execute()
+
+        with client.pipeline(transaction=False) as pipe:
+            for i, index_key in enumerate(index_keys):
+                source_score, destination_score = scores[i * 2:i * 2 + 2]
+                if source_score is not None:
+                    pipe.zadd(index_key, max(source_score, destination_score or 0), destination_id)
+                    pipe.zrem(index_key, source_id)
+                    pipe.sadd(destination_key, index_key)
+            pipe.expire(destination_key, self.ttl)
+            pipe.delete(source_key)
+            pipe.execute()
+
+    def delete_key(self, project_id, key):
+        """\
+        Removes the sets of a tag key and all of its values.
+        """
+        client = self._get_client(project_id)
+        tag_key_key = self._get_tag_key_key(project_id, key)
+
+        with client.pipeline(transaction=False) as pipe:
+            for index_key in client.smembers(tag_key_key):
+                pipe.delete(index_key)
+            pipe.delete(tag_key_key)
+            pipe.execute()
@@ -13,6 +13,7 @@ import logging
 from django.db import DataError, IntegrityError, router, transaction
 from django.db.models import F
 
+from sentry import tagstore
 from sentry.app import tsdb
 from sentry.similarity import features
 from sentry.tasks.base import instrumented_task, retry
@@ -120,6 +121,7 @@ def merge_group(
         return
 
     features.merge(new_group, [group], allow_unsafe=True)
+    tagstore.merge_group_search_index(group.project_id, group.id, new_group.id)
 
     environment_ids = list(
         Environment.objects.filter(
@@ -13,12 +13,13 @@ from datetime import datetime
 
 from raven.contrib.django.models import client as Raven
 from time import time
+from django.conf import settings
 from django.utils import timezone
 
 from sentry import reprocessing
 from sentry.cache import default_cache
 from sentry.tasks.base import instrumented_task
-from sentry.utils import metrics
+from sentry.utils import json, metrics, redis
 from sentry.utils.safe import safe_execute
 from sentry.stacktraces import process_stacktraces, \
     should_process_for_stacktraces
@@ -75,7 +76,7 @@ def _do_preprocess_event(cache_key, data, start_time, event_id, process_event):
     # so we can jump directly to save_event
     if cache_key:
         data = None
-    save_event.delay(
+    _queue_save_event(
         cache_key=cache_key, data=data, start_time=start_time, event_id=event_id,
         project_id=project
     )
@@ -163,7 +164,7 @@ def _do_process_event(cache_key, start_time, event_id, process_task):
 
         default_cache.set(cache_key, data, 3600)
 
-    save_event.delay(
+    _queue_save_event(
         cache_key=cache_key, data=None, start_time=start_time, event_id=event_id,
         project_id=project
     )
@@ -286,16 +287,46 @@ def create_failed_event(cache_key, project_id, issues, event_id, start_time=None
     return True
 
 
-@instrumented_task(name='sentry.tasks.store.save_event', queue='events.save_event')
-def save_event(cache_key=None, data=None, start_time=None, event_id=None,
-               project_id=None, **kwargs):
-    """
-    Saves an event to the database.
-    """
-    from sentry.event_manager import HashDiscarded, EventManager
+def _record_hash_discarded(project_id, data, start_time):
     from sentry import quotas, tsdb
     from sentry.models import ProjectKey
 
+    increment_list = [
+        (tsdb.models.project_total_received_discarded, project_id),
+    ]
+
+    try:
+        project = Project.objects.get_from_cache(id=project_id)
+    except Project.DoesNotExist:
+        pass
+    else:
+        increment_list.extend([
+            (tsdb.models.project_total_blacklisted, project.id),
+            (tsdb.models.organization_total_blacklisted, project.organization_id),
+        ])
+
+        project_key = None
+        if data.get('key_id') is not None:
+            try:
+                project_key = ProjectKey.objects.get_from_cache(id=data['key_id'])
+            except ProjectKey.DoesNotExist:
+                pass
+            else:
+                increment_list.append((tsdb.models.key_total_blacklisted, project_key.id))
+
+        quotas.refund(
+            project,
+            key=project_key,
+            timestamp=start_time,
+        )
+
+    tsdb.incr_multi(
+        increment_list,
+        timestamp=to_datetime(start_time) if start_time is not None else None,
+    )
+
+
+def _fetch_event_for_save(cache_key, data, event_id, project_id):
     if cache_key:
         data = default_cache.get(cache_key)
 
@@ -321,6 +352,31 @@ def save_event(cache_key=None, data=None, start_time=None, event_id=None,
     # to future proof this correctly we just handle this case here.
     if not data:
         metrics.incr('events.failed', tags={'reason': 'cache', 'stage': 'post'})
+        return project_id, None
+
+    return project_id, data
+
+
+def _finish_save_event(cache_key, data, start_time):
+    if cache_key:
+        default_cache.delete(cache_key)
+    if start_time:
+        metrics.timing(
+            'events.time-to-process',
+            time() - start_time,
+            instance=data['platform'])
+
+
+@instrumented_task(name='sentry.tasks.store.save_event', queue='events.save_event')
+def save_event(cache_key=None, data=None, start_time=None, event_id=None,
+               project_id=None, **kwargs):
+    """
+    Saves an event to the database.
+    """
+    from sentry.event_manager import HashDiscarded, EventManager
+
+    project_id, data = _fetch_event_for_save(cache_key, data, event_id, project_id)
+    if data is None:
         return
 
     Raven.tags_context({
@@ -331,45 +387,83 @@ def save_event(cache_key=None, data=None, start_time=None, event_id=None,
         manager = EventManager(data)
         manager.save(project_id)
     except HashDiscarded:
-        increment_list = [
-            (tsdb.models.project_total_received_discarded, project_id),
-        ]
+        _record_hash_discarded(project_id, data, start_time)
+    finally:
+        _finish_save_event(cache_key, data, start_time)
 
-        try:
-            project = Project.objects.get_from_cache(id=project_id)
-        except Project.DoesNotExist:
-            pass
-        else:
-            increment_list.extend([
-                (tsdb.models.project_total_blacklisted, project.id),
-                (tsdb.models.organization_total_blacklisted, project.organization_id),
-            ])
-
-            project_key = None
-            if data.get('key_id') is not None:
-                try:
-                    project_key = ProjectKey.objects.get_from_cache(id=data['key_id'])
-                except ProjectKey.DoesNotExist:
-                    pass
-                else:
-                    increment_list.append((tsdb.models.key_total_blacklisted, project_key.id))
-
-            quotas.refund(
-                project,
-                key=project_key,
-                timestamp=start_time,
-            )
-
-        tsdb.incr_multi(
-            increment_list,
-            timestamp=to_datetime(start_time) if start_time is not None else None,
+
+def _get_save_queue_key(project_id):
+    return 'save:q:{}'.format(project_id)
+
+
+def _queue_save_event(cache_key, data, start_time, event_id, project_id):
+    """
+    Hands an event to ``save_event``, or adds it to the queue of its project
+    if ``SENTRY_SAVE_EVENT_BATCH_SIZE`` is set. Queued events are stored in
+    batches by ``save_events``.
+    """
+    batch_size = settings.SENTRY_SAVE_EVENT_BATCH_SIZE
+    # events which are not in the cache are passed along with the task
+    if not batch_size or not cache_key:
+        save_event.delay(
+            cache_key=cache_key, data=data, start_time=start_time, event_id=event_id,
+            project_id=project_id
         )
+        return
+
+    key = _get_save_queue_key(project_id)
+    client = redis.clusters.get('default').get_local_client_for_key(key)
+    size = client.rpush(key, json.dumps({
+        'cache_key': cache_key,
+        'start_time': start_time,
+        'event_id': event_id,
+    }))
 
+    # a drain is scheduled for an empty queue and for every batch that was
+    # filled since, so queues keep draining if a task got lost
+    if (size - 1) % batch_size == 0:
+        save_events.delay(project_id=project_id)
+
+
+@instrumented_task(name='sentry.tasks.store.save_events', queue='events.save_event')
+def save_events(project_id, **kwargs):
+    """
+    Saves the next batch of queued events of a project to the database.
+    """
+    from sentry.event_manager import EventManager
+
+    batch_size = max(settings.SENTRY_SAVE_EVENT_BATCH_SIZE, 1)
+
+    key = _get_save_queue_key(project_id)
+    client = redis.clusters.get('default').get_local_client_for_key(key)
+    with client.pipeline() as pipe:
+        pipe.lrange(key, 0, batch_size - 1)
+        pipe.ltrim(key, batch_size, -1)
+        pipe.llen(key)
+        items, _, remaining = pipe.execute()
+
+    if remaining:
+        save_events.delay(project_id=project_id)
+
+    batch = []
+    for item in map(json.loads, items):
+        data = _fetch_event_for_save(item['cache_key'], None, item['event_id'], project_id)[1]
+        if data is not None:
+            batch.append((item, data))
+
+    if not batch:
+        return
+
+    Raven.tags_context({
+        'project': project_id,
+    })
+
+    items, datas = zip(*batch)
+    try:
+        results = EventManager.save_many(project_id, list(datas))
+        for item, data, result in zip(items, datas, results):
+            if result is None:
+                _record_hash_discarded(project_id, data, item['start_time'])
     finally:
-        if cache_key:
-            default_cache.delete(cache_key)
-        if start_time:
-            metrics.timing(
-                'events.time-to-process',
-                time() - start_time,
-                instance=data['platform'])
+        for item, data in batch:
+            _finish_save_event(item['cache_key'], data, item['start_time'])
@@ -0,0 +1,32 @@
+"""
+sentry.tasks.tsdb
+~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2017 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+import logging
+
+from sentry.tasks.base import instrumented_task
+from sentry.utils.locking import UnableToAcquireLock
+
+logger = logging.getLogger(__name__)
+
+
+@instrumented_task(name='sentry.tasks.tsdb.compact_rollups')
+def compact_rollups():
+    """
+    Add completed fine buckets to the coarser TSDB rollups.
+    """
+    from sentry import tsdb
+    from sentry.app import locks
+
+    lock = locks.get('tsdb:compact_rollups', duration=300)
+    try:
+        with lock.acquire():
+            tsdb.compact_rollups()
+    except UnableToAcquireLock as error:
+        logger.warning('compact_rollups.fail', extra={'error': error})
@@ -5,7 +5,7 @@ from collections import defaultdict
 
 from django.db import transaction
 
-from sentry import tagstore
+from sentry import search, tagstore
 from sentry.app import tsdb
 from sentry.constants import DEFAULT_LOGGER_NAME, LOG_LEVELS_MAP
 from sentry.event_manager import (
@@ -17,6 +17,7 @@ from sentry.models import (
 )
 from sentry.similarity import features
 from sentry.tasks.base import instrumented_task
+from sentry.utils.safe import safe_execute
 from six.moves import reduce
 
 
@@ -174,6 +175,7 @@ def migrate_events(caches, project, source_id, destination_id, fingerprints, eve
             short_id=project.next_short_id(),
             **get_group_creation_attributes(caches, events)
         )
+        safe_execute(search.index_group, destination, _with_transaction=False)
 
         destination_id = destination.id
 
@@ -563,10 +565,20 @@ def unmerge(
 
     if source_events:
         if not source_fields_reset:
-            source.update(**get_group_creation_attributes(
+            attributes = get_group_creation_attributes(
                 caches,
                 source_events,
-            ))
+            )
+            # the search index has to cover the new message and culprit before
+            # they are visible (``backfill_fields`` never change them)
+            safe_execute(
+                search.index_group,
+                source,
+                message=attributes['message'],
+                culprit=attributes['culprit'],
+                _with_transaction=False,
+            )
+            source.update(**attributes)
             source_fields_reset = True
         else:
             source.update(**get_group_backfill_attributes(
@@ -50,8 +50,11 @@ from sentry.constants import MODULE_ROOT
 from sentry.models import (
     GroupMeta, ProjectOption, DeletedOrganization, Environment, GroupStatus, Organization, TotpInterface, UserReport
 )
+from sentry.lang.javascript.cache import view_cache
+from sentry.models.dsymfile import symcache_pool
 from sentry.plugins import plugins
 from sentry.rules import EventState
+from sentry.stacktraces import local_frame_cache
 from sentry.utils import json
 from sentry.utils.auth import SSO_SESSION_KEY
 
@@ -172,6 +175,9 @@ class BaseTestCase(Fixtures, Exam):
         super(BaseTestCase, self)._pre_setup()
 
         cache.clear()
+        local_frame_cache.clear()
+        view_cache.clear()
+        symcache_pool.clear()
         ProjectOption.objects.clear_local_cache()
         GroupMeta.objects.clear_local_cache()
 
@@ -103,7 +103,7 @@ class TSDBModel(Enum):
 class BaseTSDB(Service):
     __all__ = (
         'models', 'incr', 'incr_multi', 'get_range', 'get_rollups', 'get_sums', 'rollup',
-        'validate', 'make_series',
+        'validate', 'make_series', 'compact_rollups',
     )
 
     models = TSDBModel
@@ -291,6 +291,14 @@ class BaseTSDB(Service):
         """
         raise NotImplementedError
 
+    def compact_rollups(self, timestamp=None):
+        """
+        Add completed buckets of the finest rollup to the coarser rollups.
+
+        This is only required by backends that defer writes to the coarser
+        rollups, all others don't need to do anything.
+        """
+
     def get_range(self, model, keys, start, end, rollup=None, environment_id=None):
         """
         To get a range of data for group ID=[1, 2, 3]:
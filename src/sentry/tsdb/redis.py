@@ -14,6 +14,7 @@ import random
 import uuid
 from binascii import crc32
 from collections import defaultdict, namedtuple
+from datetime import timedelta
 from hashlib import md5
 
 import six
@@ -22,6 +23,7 @@ from pkg_resources import resource_string
 from redis.client import Script
 
 from sentry.tsdb.base import BaseTSDB
+from sentry.utils import metrics
 from sentry.utils.dates import to_datetime, to_timestamp
 from sentry.utils.redis import check_cluster_versions, get_cluster_from_options
 from sentry.utils.versioning import Version
@@ -36,6 +38,23 @@ CountMinScript = Script(
     resource_string('sentry', 'scripts/tsdb/cmsketch.lua'),
 )
 
+CounterScript = Script(
+    None,
+    resource_string('sentry', 'scripts/tsdb/counters.lua'),
+)
+
+CompactionScript = Script(
+    None,
+    resource_string('sentry', 'scripts/tsdb/compact.lua'),
+)
+
+# Hash field that marks a counter hash of the finest rollup as compacted.
+COMPACTED_FIELD = '!compacted'
+
+# Suffix of the hash fields that record which part of a counter in the finest
+# rollup has been written to every rollup directly.
+WRITTEN_FIELD_SUFFIX = '!written'
+
 
 class SuppressionWrapper(object):
     """\
@@ -116,6 +135,24 @@ class RedisTSDB(BaseTSDB):
     frequency table can be displayed as percentages of the whole data set.
     (Additional documentation and the bulk of the logic for implementing the
     frequency table API can be found in the ``cmsketch.lua`` script.)
+
+    When ``enable_scripted_counter_reads`` is set, ``get_range`` and
+    ``get_sums`` read all requested counter buckets that live on the same host
+    with a single call to the ``counters.lua`` script, which also adds up the
+    buckets for ``get_sums``, instead of issuing one ``HGET`` per key and
+    bucket.
+
+    When ``enable_rollup_compaction`` is set, counters are only written to the
+    finest rollup while their bucket is recent. The ``compact_rollups`` method
+    (called periodically by the ``sentry.tasks.tsdb.compact_rollups`` task)
+    adds every fine bucket to the coarser rollups once it is older than
+    ``compaction_delay`` seconds. A cursor records the
+    first bucket that has not been compacted yet. Reads from the coarser
+    rollups add the counts from fine buckets that have not been compacted, so
+    results do not change. Counters for older timestamps are written to every
+    rollup, and the compaction skips those writes. The models that are
+    written to each vnode of a fine bucket are recorded in a set, so that
+    compactions and reads only touch the hashes that have counters.
     """
     DEFAULT_SKETCH_PARAMETERS = SketchParameters(3, 128, 50)
 
@@ -124,8 +161,13 @@ class RedisTSDB(BaseTSDB):
         self.prefix = prefix
         self.vnodes = vnodes
         self.enable_frequency_sketches = options.pop('enable_frequency_sketches', False)
+        self.enable_scripted_counter_reads = options.pop('enable_scripted_counter_reads', False)
+        self.enable_rollup_compaction = options.pop('enable_rollup_compaction', False)
+        self.compaction_delay = options.pop('compaction_delay', 60)
         super(RedisTSDB, self).__init__(**options)
 
+        self.__compaction_start = None
+
     def validate(self):
         logger.debug('Validating Redis version...')
         version = Version((2, 8, 18)) if self.enable_frequency_sketches else Version((2, 8, 9))
@@ -182,20 +224,38 @@ class RedisTSDB(BaseTSDB):
         Returns a 2-tuple that contains the hash key and the hash field.
         """
         model_key = self.get_model_key(key)
+        if isinstance(model_key, six.text_type):
+            model_key = model_key.encode('utf-8')
+
+        return self.make_counter_hash_key(
+            model,
+            rollup,
+            timestamp,
+            self.get_counter_vnode(model_key),
+        ), self.add_environment_parameter(model_key, environment_id)
 
+    def get_counter_vnode(self, model_key):
         if isinstance(model_key, six.integer_types):
-            vnode = model_key % self.vnodes
-        else:
-            if isinstance(model_key, six.text_type):
-                model_key = model_key.encode('utf-8')
-            vnode = crc32(model_key) % self.vnodes
+            return model_key % self.vnodes
+        if isinstance(model_key, six.text_type):
+            model_key = model_key.encode('utf-8')
+        return crc32(model_key) % self.vnodes
 
+    def make_counter_hash_key(self, model, rollup, timestamp, vnode):
         return '{prefix}{model}:{epoch}:{vnode}'.format(
             prefix=self.prefix,
             model=model.value,
             epoch=self.normalize_to_rollup(timestamp, rollup),
             vnode=vnode,
-        ), self.add_environment_parameter(model_key, environment_id)
+        )
+
+    def get_counter_field_suffixes(self, rollup):
+        """
+        Returns the suffixes of all hash fields that belong to a counter.
+        """
+        if self.enable_rollup_compaction and rollup == self.get_compaction_rollup():
+            return ('', WRITTEN_FIELD_SUFFIX)
+        return ('', )
 
     def get_model_key(self, key):
         # We specialize integers so that a pure int-map can be optimized by
@@ -224,6 +284,22 @@ class RedisTSDB(BaseTSDB):
         if timestamp is None:
             timestamp = timezone.now()
 
+        rollups = list(self.rollups.items())
+
+        # Counters of buckets which may still be compacted only go to the
+        # finest rollup, all others are written to every rollup and marked as
+        # such in the finest one so that the compaction doesn't count them
+        # twice.
+        written_rollup = None
+        compacted_rollup = None
+        if self.enable_rollup_compaction:
+            epoch = self.normalize_to_epoch(timestamp, rollups[0][0])
+            if epoch >= max(self.get_compaction_start(), self.get_compaction_horizon()):
+                rollups = rollups[:1]
+                compacted_rollup = rollups[0][0]
+            else:
+                written_rollup = rollups[0][0]
+
         for (cluster, durable), environment_ids in self.get_cluster_groups(
                 set([None, environment_id])):
             manager = cluster.map()
@@ -231,17 +307,29 @@ class RedisTSDB(BaseTSDB):
                 manager = SuppressionWrapper(manager)
 
             with manager as client:
-                for rollup, max_values in six.iteritems(self.rollups):
+                for rollup, max_values in rollups:
                     for model, key in items:
                         for environment_id in environment_ids:
                             hash_key, hash_field = self.make_counter_key(
                                 model, rollup, timestamp, key, environment_id)
                             client.hincrby(hash_key, hash_field, count)
+                            if rollup == written_rollup:
+                                client.hincrby(
+                                    hash_key, '{}{}'.format(hash_field, WRITTEN_FIELD_SUFFIX), count)
                             client.expireat(
                                 hash_key,
                                 self.calculate_expiry(rollup, max_values, timestamp),
                             )
 
+                if compacted_rollup is not None:
+                    self.record_compaction_sources(
+                        client,
+                        compacted_rollup,
+                        timestamp,
+                        set((model, self.get_counter_vnode(self.get_model_key(key)))
+                            for model, key in items),
+                    )
+
     def get_range(self, model, keys, start, end, rollup=None, environment_id=None):
         """
         To get a range of data for group ID=[1, 2, 3]:
@@ -256,6 +344,26 @@ class RedisTSDB(BaseTSDB):
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
         series = map(to_datetime, series)
 
+        if self.enable_scripted_counter_reads:
+            requests = list(itertools.product(keys, series))
+            values = self.sum_counters(
+                model,
+                rollup,
+                [(key, timestamp, index) for index, (key, timestamp) in enumerate(requests)],
+                len(requests),
+                environment_id,
+            )
+
+            uncompacted = self.get_uncompacted_counts(
+                model, keys, rollup, series, environment_id)
+
+            results_by_key = defaultdict(list)
+            for (key, timestamp), value in zip(requests, values):
+                epoch = to_timestamp(timestamp)
+                value += uncompacted.get(key, {}).get(epoch, 0)
+                results_by_key[key].append((epoch, value))
+            return dict(results_by_key)
+
         results = []
         cluster, _ = self.get_cluster(environment_id)
         with cluster.map() as client:
@@ -267,14 +375,278 @@ class RedisTSDB(BaseTSDB):
                         (to_timestamp(timestamp), key, client.hget(
                             hash_key, hash_field)))
 
+        uncompacted = self.get_uncompacted_counts(
+            model, keys, rollup, series, environment_id)
+
         results_by_key = defaultdict(dict)
         for epoch, key, count in results:
-            results_by_key[key][epoch] = int(count.value or 0)
+            results_by_key[key][epoch] = int(count.value or 0) + \
+                uncompacted.get(key, {}).get(epoch, 0)
 
         for key, points in six.iteritems(results_by_key):
             results_by_key[key] = sorted(points.items())
         return dict(results_by_key)
 
+    def get_sums(self, model, keys, start, end, rollup=None, environment_id=None):
+        if not self.enable_scripted_counter_reads:
+            return super(RedisTSDB, self).get_sums(
+                model, keys, start, end, rollup, environment_id)
+
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+        series = map(to_datetime, series)
+
+        keys = list(keys)
+        values = self.sum_counters(
+            model,
+            rollup,
+            [(key, timestamp, index) for index, key in enumerate(keys) for timestamp in series],
+            len(keys),
+            environment_id,
+        )
+
+        uncompacted = self.get_uncompacted_counts(
+            model, keys, rollup, series, environment_id)
+        for index, key in enumerate(keys):
+            values[index] += sum(uncompacted.get(key, {}).values())
+
+        return dict(zip(keys, values))
+
+    def sum_counters(self, model, rollup, requests, size, environment_id=None):
+        """
+        Reads counters with one ``counters.lua`` call per host.
+
+        ``requests`` is a sequence of ``(key, timestamp, index)`` tuples.
+        Returns a list of ``size`` values where each one is the sum of the
+        counters that were requested with its index.
+        """
+        cluster, _ = self.get_cluster(environment_id)
+        router = cluster.get_router()
+
+        # the first hash key seen for a host doubles as the routing key for
+        # everything that is stored there
+        batches = {}
+        for key, timestamp, index in requests:
+            hash_key, hash_field = self.make_counter_key(
+                model, rollup, timestamp, key, environment_id)
+            host = router.get_host_for_key(hash_key)
+            if host not in batches:
+                batches[host] = (hash_key, [], [])
+            _, hash_keys, arguments = batches[host]
+            hash_keys.append(hash_key)
+            arguments.extend((hash_field, index + 1))
+
+        commands = {}
+        for routing_key, hash_keys, arguments in six.itervalues(batches):
+            commands[routing_key] = [(CounterScript, hash_keys, arguments)]
+
+        results = [0] * size
+        for responses in six.itervalues(cluster.execute_commands(commands)):
+            for index, value in enumerate(responses[0].value):
+                results[index] += int(value)
+        return results
+
+    def get_uncompacted_counts(self, model, keys, rollup, series, environment_id=None):
+        """
+        Returns the counts that have been written to fine buckets which have
+        not been added to ``rollup`` yet, as a ``{key: {epoch: count}}``
+        mapping of the epochs in ``series``.
+        """
+        compaction_rollup = self.get_compaction_rollup()
+        if not self.enable_rollup_compaction or rollup == compaction_rollup or not series:
+            return {}
+
+        cursor = self.get_compaction_cursor()
+        if cursor is None:
+            return {}
+
+        series = map(lambda timestamp: int(to_timestamp(timestamp)), series)
+        end = min(
+            int(to_timestamp(timezone.now())),
+            series[-1] + rollup - 1,
+        )
+        epochs = range(max(cursor, series[0]), end + 1, compaction_rollup)
+
+        cluster, _ = self.get_cluster(environment_id)
+
+        # only the hashes which were written since the last compaction of
+        # their bucket are read
+        vnodes = dict((key, self.get_counter_vnode(self.get_model_key(key))) for key in keys)
+        with cluster.map() as client:
+            sources = dict(
+                ((epoch, vnode), client.sismember(
+                    self.get_compaction_sources_key(epoch, vnode), model.value))
+                for epoch in epochs for vnode in set(vnodes.values())
+            )
+
+        results = []
+        with cluster.map() as client:
+            for key in keys:
+                for epoch in epochs:
+                    if not sources[(epoch, vnodes[key])].value:
+                        continue
+                    hash_key, hash_field = self.make_counter_key(
+                        model, compaction_rollup, to_datetime(epoch), key, environment_id)
+                    results.append((
+                        key,
+                        epoch,
+                        client.hget(hash_key, hash_field),
+                        client.hget(hash_key, '{}{}'.format(hash_field, WRITTEN_FIELD_SUFFIX)),
+                        client.hexists(hash_key, COMPACTED_FIELD),
+                    ))
+
+        counts = defaultdict(lambda: defaultdict(int))
+        for key, epoch, count, written, compacted in results:
+            if compacted.value:
+                continue
+            value = int(count.value or 0) - int(written.value or 0)
+            if value:
+                counts[key][self.normalize_ts_to_epoch(epoch, rollup)] += value
+        return counts
+
+    def get_compaction_rollup(self):
+        return list(self.rollups)[0]
+
+    def get_compaction_sources_key(self, epoch, vnode):
+        return '{}compaction:{}:{}'.format(self.prefix, epoch, vnode)
+
+    def record_compaction_sources(self, client, rollup, timestamp, sources):
+        """
+        Records that counters of the ``(model, vnode)`` sources were written
+        to the bucket of ``timestamp`` in the finest rollup.
+        """
+        epoch = self.normalize_to_epoch(timestamp, rollup)
+        expiry = self.calculate_expiry(rollup, self.rollups[rollup], timestamp)
+        for model, vnode in sources:
+            key = self.get_compaction_sources_key(epoch, vnode)
+            client.sadd(key, model.value)
+            client.expireat(key, expiry)
+
+    def get_compaction_horizon(self, timestamp=None):
+        """
+        Returns the epoch of the first bucket in the finest rollup that is
+        not eligible for compaction at ``timestamp``.
+        """
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        return self.normalize_to_epoch(
+            timestamp - timedelta(seconds=self.compaction_delay),
+            self.get_compaction_rollup(),
+        )
+
+    def get_compaction_cursor_key(self):
+        return '{}compaction'.format(self.prefix)
+
+    def get_compaction_cursor(self):
+        """
+        Returns the epoch of the first bucket in the finest rollup that has
+        not been compacted, or ``None`` if compaction has not started yet.
+        """
+        key = self.get_compaction_cursor_key()
+        value = self.cluster.get_local_client_for_key(key).get(key)
+        return int(value) if value is not None else None
+
+    def get_compaction_start(self):
+        """
+        Returns the epoch of the first bucket that may be written to the
+        finest rollup only. The cursor is initialized on first use, since
+        buckets before it may contain counters that were already written to
+        every rollup.
+        """
+        if self.__compaction_start is None:
+            rollup = self.get_compaction_rollup()
+            key = self.get_compaction_cursor_key()
+            client = self.cluster.get_local_client_for_key(key)
+            client.setnx(key, self.normalize_to_epoch(timezone.now(), rollup) + rollup)
+            self.__compaction_start = int(client.get(key))
+        return self.__compaction_start
+
+    def compact_rollups(self, timestamp=None):
+        if not self.enable_rollup_compaction:
+            return
+
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        cursor = self.get_compaction_cursor()
+        if cursor is None:
+            return
+
+        rollup = self.get_compaction_rollup()
+        earliest = self.get_earliest_timestamp(rollup, timestamp=timestamp)
+        if cursor < earliest:
+            logger.warning('tsdb.compaction.expired', extra={
+                'cursor': cursor,
+                'earliest': earliest,
+            })
+            metrics.incr('tsdb.compaction.expired', amount=(earliest - cursor) // rollup)
+            cursor = earliest
+
+        key = self.get_compaction_cursor_key()
+        client = self.cluster.get_local_client_for_key(key)
+        for epoch in range(cursor, self.get_compaction_horizon(timestamp), rollup):
+            self.compact_bucket(to_datetime(epoch))
+            client.set(key, epoch + rollup)
+            metrics.incr('tsdb.compaction.buckets')
+
+    def compact_bucket(self, timestamp):
+        """
+        Adds the counters of a bucket in the finest rollup to all coarser
+        rollups. Buckets that have been compacted before are skipped.
+        """
+        rollups = list(self.rollups.items())
+        compaction_rollup, coarse_rollups = rollups[0][0], rollups[1:]
+        epoch = self.normalize_to_epoch(timestamp, compaction_rollup)
+
+        with self.cluster.map() as client:
+            members = [
+                (vnode, client.smembers(self.get_compaction_sources_key(epoch, vnode)))
+                for vnode in range(self.vnodes)
+            ]
+
+        commands = {}
+        sources = {}
+        for vnode, models in members:
+            for value in models.value:
+                model = self.models(int(value))
+                hash_key = self.make_counter_hash_key(model, compaction_rollup, timestamp, vnode)
+                commands[hash_key] = [(
+                    CompactionScript,
+                    [hash_key],
+                    [COMPACTED_FIELD, WRITTEN_FIELD_SUFFIX],
+                )]
+                sources[hash_key] = (model, vnode)
+
+        fields = 0
+        with self.cluster.map() as client:
+            for hash_key, responses in six.iteritems(self.cluster.execute_commands(commands)):
+                values = responses[0].value
+                if not values:
+                    continue
+
+                model, vnode = sources[hash_key]
+                for rollup, max_values in coarse_rollups:
+                    coarse_hash_key = self.make_counter_hash_key(model, rollup, timestamp, vnode)
+                    for hash_field, value in zip(values[::2], values[1::2]):
+                        client.hincrby(coarse_hash_key, hash_field, int(value))
+                    client.expireat(
+                        coarse_hash_key,
+                        self.calculate_expiry(rollup, max_values, timestamp),
+                    )
+                fields += len(values) // 2
+
+        # the sets are only deleted once the hashes are marked as compacted,
+        # so that reads in between don't miss any counters
+        with self.cluster.map() as client:
+            for vnode, models in members:
+                if models.value:
+                    client.delete(self.get_compaction_sources_key(epoch, vnode))
+
+        metrics.timing('tsdb.compaction.hashes', len(commands))
+        metrics.timing('tsdb.compaction.fields', fields)
+
     def merge(self, model, destination, sources, timestamp=None, environment_ids=None):
         environment_ids = (
             set(environment_ids) if environment_ids is not None else set()).union(
@@ -304,14 +676,15 @@ class RedisTSDB(BaseTSDB):
                                     source,
                                     environment_id,
                                 )
-                                results[environment_id].append(
-                                    client.hget(source_hash_key, source_hash_field))
-                                client.hdel(source_hash_key, source_hash_field)
+                                for suffix in self.get_counter_field_suffixes(rollup):
+                                    results[(environment_id, suffix)].append(
+                                        client.hget(source_hash_key, '{}{}'.format(source_hash_field, suffix)))
+                                    client.hdel(source_hash_key, '{}{}'.format(source_hash_field, suffix))
 
             with cluster.map() as client:
                 for rollup, series in data.items():
                     for timestamp, results in series.items():
-                        for environment_id, promises in results.items():
+                        for (environment_id, suffix), promises in results.items():
                             total = sum([int(p.value) for p in promises if p.value])
                             if total:
                                 destination_hash_key, destination_hash_field = self.make_counter_key(
@@ -323,9 +696,18 @@ class RedisTSDB(BaseTSDB):
                                 )
                                 client.hincrby(
                                     destination_hash_key,
-                                    destination_hash_field,
+                                    '{}{}'.format(destination_hash_field, suffix),
                                     total,
                                 )
+                                if self.enable_rollup_compaction and \
+                                        rollup == self.get_compaction_rollup():
+                                    self.record_compaction_sources(
+                                        client,
+                                        rollup,
+                                        timestamp,
+                                        [(model, self.get_counter_vnode(
+                                            self.get_model_key(destination)))],
+                                    )
                                 client.expireat(
                                     destination_hash_key,
                                     self.calculate_expiry(
@@ -365,7 +747,8 @@ class RedisTSDB(BaseTSDB):
 
                                     client.hdel(
                                         hash_key,
-                                        hash_field,
+                                        *['{}{}'.format(hash_field, suffix) for suffix in
+                                          self.get_counter_field_suffixes(rollup)]
                                     )
 
     def record(self, model, key, values, timestamp=None, environment_id=None):
@@ -43,12 +43,13 @@ class Cursor(object):
 
 
 class CursorResult(Sequence):
-    def __init__(self, results, next, prev, hits=None, max_hits=None):
+    def __init__(self, results, next, prev, hits=None, max_hits=None, hits_estimated=False):
         self.results = results
         self.next = next
         self.prev = prev
         self.hits = hits
         self.max_hits = max_hits
+        self.hits_estimated = hits_estimated
 
     def __len__(self):
         return len(self.results)
@@ -367,8 +367,11 @@ class StoreView(APIView):
         )
         start_time = time()
         tsdb_start_time = to_datetime(start_time)
-        should_filter, filter_reason = helper.should_filter(
+        should_filter, filter_reason = helper.should_filter_early(
             project, data, ip_address=remote_addr)
+        if not should_filter:
+            should_filter, filter_reason = helper.should_filter(
+                project, data, ip_address=remote_addr)
         if should_filter:
             increment_list = [
                 (tsdb.models.project_total_received, project.id),
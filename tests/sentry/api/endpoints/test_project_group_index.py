@@ -5,11 +5,14 @@ from datetime import timedelta
 from uuid import uuid4
 
 import six
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from exam import fixture
 from mock import patch
 
 from sentry import tagstore
+from sentry.api.serializers.models.group import clear_user_state_cache
 from sentry.models import (
     Activity, EventMapping, Group, GroupAssignee, GroupBookmark, GroupHash, GroupResolution,
     GroupSeen, GroupSnooze, GroupStatus, GroupSubscription,
@@ -298,6 +301,38 @@ class GroupListTest(APITestCase):
         assert len(response.data) == 1
         assert response.data[0]['id'] == six.text_type(group.id)
 
+    def test_query_count(self):
+        self.login_as(user=self.user)
+
+        def create_group(i):
+            group = self.create_group(checksum='{:032d}'.format(i))
+            if i % 2 == 0:
+                GroupBookmark.objects.create(project=self.project, group=group, user=self.user)
+                GroupSeen.objects.create(project=self.project, group=group, user=self.user)
+                GroupAssignee.objects.create(project=self.project, group=group, user=self.user)
+
+        def get_query_count():
+            clear_user_state_cache(
+                self.user.id,
+                Group.objects.filter(project=self.project).values_list('id', flat=True),
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    '{}?limit=100&statsPeriod=24h'.format(self.path), format='json')
+            assert response.status_code == 200
+            return len(response.data), len(queries.captured_queries)
+
+        create_group(0)
+        # the first request also fills caches
+        get_query_count()
+        count, queries = get_query_count()
+        assert count == 1
+
+        # the number of queries doesn't depend on the number of results
+        for i in range(1, 100):
+            create_group(i)
+        assert get_query_count() == (100, queries)
+
 
 class GroupUpdateTest(APITestCase):
     @fixture
@@ -991,6 +1026,9 @@ class GroupUpdateTest(APITestCase):
             group2=group2,
             group4=group4,
         )
+        response = self.client.get('{}?query='.format(self.path), format='json')
+        assert not any(g['isBookmarked'] for g in response.data)
+
         response = self.client.put(
             url, data={
                 'isBookmarked': 'true',
@@ -1001,6 +1039,11 @@ class GroupUpdateTest(APITestCase):
             'isBookmarked': True,
         }
 
+        # the cached bookmarks of the stream were cleared
+        response = self.client.get('{}?query='.format(self.path), format='json')
+        assert set(g['id'] for g in response.data if g['isBookmarked']) == \
+            {six.text_type(group1.id), six.text_type(group2.id)}
+
         bookmark1 = GroupBookmark.objects.filter(group=group1, user=self.user)
         assert bookmark1.exists()
 
@@ -11,9 +11,9 @@ from django.utils import timezone
 from mock import patch
 
 from sentry.api.serializers import serialize
-from sentry.api.serializers.models.group import StreamGroupSerializer
+from sentry.api.serializers.models.group import StreamGroupSerializer, clear_user_state_cache
 from sentry.models import (
-    Environment, GroupResolution, GroupSnooze, GroupStatus,
+    Environment, GroupBookmark, GroupResolution, GroupSeen, GroupSnooze, GroupStatus,
     GroupSubscription, UserOption, UserOptionValue
 )
 from sentry.testutils import TestCase
@@ -270,6 +270,37 @@ class GroupSerializerTest(TestCase):
         result = serialize(group)
         assert not result['isSubscribed']
 
+    def test_bookmarked_and_seen_are_cached(self):
+        user = self.create_user()
+        group = self.create_group()
+
+        result = serialize(group, user)
+        assert not result['isBookmarked']
+        assert not result['hasSeen']
+
+        GroupBookmark.objects.create(project=group.project, group=group, user=user)
+        GroupSeen.objects.create(project=group.project, group=group, user=user)
+
+        result = serialize(group, user)
+        assert not result['isBookmarked']
+        assert not result['hasSeen']
+
+        clear_user_state_cache(user.id, [group.id])
+        result = serialize(group, user)
+        assert result['isBookmarked']
+        assert result['hasSeen']
+
+    def test_permalink(self):
+        group = self.create_group()
+        assert serialize(group, self.create_user())['permalink'] is None
+        assert serialize(group)['permalink'] is None
+
+        user = self.create_user()
+        self.create_member(user=user, organization=group.organization)
+        assert serialize(group, user)['permalink'].endswith(
+            '/{}/{}/issues/{}/'.format(group.organization.slug, group.project.slug, group.id),
+        )
+
 
 class StreamGroupSerializerTestCase(TestCase):
     def test_environment(self):
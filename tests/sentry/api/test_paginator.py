@@ -1,12 +1,15 @@
 from __future__ import absolute_import
 
+import mock
 import pytest
 from datetime import timedelta
 from django.utils import timezone
 
-from sentry.api.paginator import (Paginator, DateTimePaginator, OffsetPaginator)
-from sentry.models import User
+from sentry.api.paginator import (
+    Paginator, DateTimePaginator, DateTimeKeysetPaginator, KeysetPaginator, OffsetPaginator)
+from sentry.models import Group, Release, User
 from sentry.testutils import TestCase
+from sentry.utils.cursors import Cursor
 from sentry.utils.db import is_mysql
 
 
@@ -240,3 +243,109 @@ class DateTimePaginatorTest(TestCase):
 
         result5 = paginator.get_result(limit=10, cursor=result4.prev)
         assert len(result5) == 0, list(result5)
+
+
+class KeysetPaginatorTest(TestCase):
+    def get_pages(self, paginator, limit, cursor=None):
+        pages = []
+        while True:
+            result = paginator.get_result(limit=limit, cursor=cursor)
+            pages.append(list(result))
+            if not result.next:
+                return pages, result
+            # cursors make a round trip through their string form
+            cursor = Cursor.from_string(str(result.next))
+
+    def test_descending(self):
+        groups = [
+            self.create_group(checksum='{:032d}'.format(i), times_seen=i % 3)
+            for i in range(7)
+        ]
+        expected = sorted(groups, key=lambda g: (g.times_seen, g.id), reverse=True)
+
+        paginator = KeysetPaginator(Group.objects.all(), '-times_seen')
+        pages, last = self.get_pages(paginator, 3)
+        assert pages == [expected[:3], expected[3:6], expected[6:]]
+        assert not last.next
+
+        result = paginator.get_result(limit=3, cursor=last.prev)
+        assert list(result) == expected[3:6]
+        assert result.prev
+        result = paginator.get_result(limit=3, cursor=result.prev)
+        assert list(result) == expected[:3]
+        assert not result.prev
+
+        # paging forward from a previous page
+        result = paginator.get_result(limit=3, cursor=result.next)
+        assert list(result) == expected[3:6]
+
+    def test_prev_emptyset(self):
+        paginator = KeysetPaginator(User.objects.all(), 'id')
+        result1 = paginator.get_result(limit=1, cursor=None)
+        assert not result1.prev
+
+        res1 = self.create_user('foo@example.com')
+
+        result2 = paginator.get_result(limit=1, cursor=result1.prev)
+        assert list(result2) == [res1]
+
+        result3 = paginator.get_result(limit=1, cursor=result2.prev)
+        assert list(result3) == []
+        assert not result3.prev
+
+        result4 = paginator.get_result(limit=1, cursor=result3.next)
+        assert list(result4) == [res1]
+
+    @pytest.mark.skipif(is_mysql(), reason='MySQL does not support above second accuracy')
+    def test_datetime(self):
+        now = timezone.now().replace(microsecond=0)
+        groups = [
+            self.create_group(
+                checksum='{:032d}'.format(i),
+                last_seen=now - timedelta(microseconds=i // 2),
+            ) for i in range(5)
+        ]
+        expected = sorted(groups, key=lambda g: (g.last_seen, g.id), reverse=True)
+
+        paginator = DateTimeKeysetPaginator(Group.objects.all(), '-last_seen')
+        pages, _ = self.get_pages(paginator, 2)
+        assert pages == [expected[:2], expected[2:4], expected[4:]]
+
+    def test_extra_select(self):
+        now = timezone.now().replace(microsecond=0)
+        releases = [
+            Release.objects.create(
+                organization_id=self.organization.id,
+                version='{}'.format(i),
+                date_added=now - timedelta(days=i),
+                date_released=now if i % 2 else None,
+            ) for i in range(5)
+        ]
+        expected = sorted(
+            releases,
+            key=lambda r: (r.date_released or r.date_added, r.id),
+            reverse=True,
+        )
+
+        queryset = Release.objects.extra(select={
+            'sort': 'COALESCE(date_released, date_added)',
+        })
+        paginator = DateTimeKeysetPaginator(queryset, '-sort')
+        pages, _ = self.get_pages(paginator, 2)
+        assert pages == [expected[:2], expected[2:4], expected[4:]]
+
+    def test_estimated_hits(self):
+        for i in range(3):
+            self.create_user('{}@example.com'.format(i))
+
+        paginator = KeysetPaginator(User.objects.all(), 'id')
+        result = paginator.get_result(limit=1, count_hits=True)
+        assert result.hits == 3
+        assert not result.hits_estimated
+
+        with mock.patch('sentry.api.paginator.KeysetPaginator.count_hits', return_value=1000), \
+                mock.patch('sentry.api.paginator.KeysetPaginator.estimate_hits', return_value=5000):
+            result = paginator.get_result(limit=1, count_hits=True)
+        assert result.hits == 5000
+        assert result.max_hits == 1000
+        assert result.hits_estimated
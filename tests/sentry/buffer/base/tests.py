@@ -66,3 +66,65 @@ class BufferTest(TestCase):
         self.buf.process(ReleaseProject, columns, filters)
         release_project_ = ReleaseProject.objects.get(id=release_project.id)
         assert release_project_.new_groups == 1
+
+    def test_process_many_groups_updates(self):
+        project = self.create_project()
+        groups = [self.create_group(project=project, times_seen=1) for _ in range(4)]
+
+        items = [
+            (Group, {'times_seen': i + 1}, {'id': group.id}, None)
+            for i, group in enumerate(groups)
+        ]
+
+        # one lookup and one UPDATE for all rows
+        with self.assertNumQueries(2):
+            self.buf.process_many(items)
+
+        assert [Group.objects.get(id=g.id).times_seen for g in groups] == [2, 3, 4, 5]
+
+    def test_process_many_merges_extra(self):
+        project = self.create_project()
+        groups = [self.create_group(project=project, times_seen=1) for _ in range(3)]
+        now = timezone.now().replace(microsecond=0)
+        last_seen = [Group.objects.get(id=g.id).last_seen for g in groups]
+
+        items = [
+            (Group, {'times_seen': 1}, {'id': groups[0].id}, {'last_seen': now}),
+            (Group, {'times_seen': 2}, {'id': groups[1].id}, None),
+            (Group, {'times_seen': 1}, {'id': groups[2].id}, {'last_seen': now}),
+            (Group, {'times_seen': 1}, {'id': groups[0].id},
+             {'last_seen': now + timedelta(minutes=1)}),
+        ]
+        with self.assertNumQueries(2):
+            self.buf.process_many(items)
+
+        groups = [Group.objects.get(id=g.id) for g in groups]
+        assert [g.times_seen for g in groups] == [3, 3, 2]
+        # the latest extra value of a row wins, rows without one keep theirs
+        assert [g.last_seen.replace(microsecond=0) for g in groups] == [
+            now + timedelta(minutes=1),
+            last_seen[1].replace(microsecond=0),
+            now,
+        ]
+
+    def test_process_many_creates_missing_rows(self):
+        project = self.create_project()
+        release = Release.objects.create(organization_id=project.organization_id, version='abcabc')
+        release.add_project(project)
+        other_release = Release.objects.create(
+            organization_id=project.organization_id, version='defdef')
+
+        existing = ReleaseProject.objects.get(release=release, project=project)
+        ReleaseProject.objects.filter(id=existing.id).update(new_groups=1)
+
+        items = [
+            (ReleaseProject, {'new_groups': 1}, {'id': existing.id}, None),
+            (ReleaseProject, {'new_groups': 1}, {'id': existing.id + 1000}, None),
+            (ReleaseProject, {'new_groups': 1}, {
+                'release_id': other_release.id, 'project_id': project.id}, None),
+        ]
+        self.buf.process_many(items)
+
+        assert ReleaseProject.objects.get(id=existing.id).new_groups == 2
+        assert ReleaseProject.objects.get(
+            release_id=other_release.id, project_id=project.id).new_groups == 1
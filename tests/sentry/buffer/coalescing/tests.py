@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import gc
+import mock
+import threading
+
+from sentry.buffer import coalescing
+from sentry.buffer.coalescing import CoalescingBuffer
+from sentry.models import Group, Project
+from sentry.testutils import TestCase
+
+
+class CoalescingBufferTest(TestCase):
+    def setUp(self):
+        self.buf = CoalescingBuffer(
+            backend=mock.Mock,
+            flush_interval=60,
+            max_size=3,
+        )
+        self.addCleanup(self.buf.close)
+
+    def test_coalesces_increments(self):
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1}, {'last_seen': 1})
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1}, {'last_seen': 2})
+        self.buf.incr(Group, {'times_seen': 2}, {'id': 2})
+        assert not self.buf.backend.incr.called
+
+        self.buf.flush()
+
+        assert sorted(self.buf.backend.incr.mock_calls) == sorted([
+            mock.call(Group, {'times_seen': 2}, {'id': 1}, {'last_seen': 2}),
+            mock.call(Group, {'times_seen': 2}, {'id': 2}, None),
+        ])
+
+        self.buf.backend.incr.reset_mock()
+        self.buf.flush()
+        assert not self.buf.backend.incr.called
+
+    def test_coalesces_model_filters(self):
+        project = Project(id=1)
+        self.buf.incr(Group, {'times_seen': 1}, {'project': project})
+        self.buf.incr(Group, {'times_seen': 1}, {'project': project})
+        self.buf.flush()
+
+        self.buf.backend.incr.assert_called_once_with(
+            Group, {'times_seen': 2}, {'project': project}, None)
+
+    def test_flushes_at_max_size(self):
+        for i in range(3):
+            self.buf.incr(Group, {'times_seen': 1}, {'id': i})
+
+        assert len(self.buf.backend.incr.mock_calls) == 3
+
+    @mock.patch('sentry.buffer.coalescing.time')
+    def test_flushes_after_interval(self, time):
+        time.return_value = 1000
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+        assert not self.buf.backend.incr.called
+
+        time.return_value = 1000 + 61
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+        self.buf.backend.incr.assert_called_once_with(Group, {'times_seen': 2}, {'id': 1}, None)
+
+    def test_unhashable_filters_pass_through(self):
+        self.buf.incr(Group, {'times_seen': 1}, {'id': [1]})
+        self.buf.backend.incr.assert_called_once_with(Group, {'times_seen': 1}, {'id': [1]}, None)
+
+    def test_does_not_flush_parent_state_after_fork(self):
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.buf.flush()
+        assert not self.buf.backend.incr.called
+
+    def test_delegates_processing(self):
+        self.buf.process_pending()
+        self.buf.backend.process_pending.assert_called_once_with()
+
+        self.buf.process(batch_keys=['foo'])
+        self.buf.backend.process.assert_called_once_with(batch_keys=['foo'])
+
+    def test_close(self):
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+        timer, = [
+            t for t in threading.enumerate()
+            if getattr(t, '_Thread__args', ())[2:] == (self.buf._stopped, )
+        ]
+
+        self.buf.close()
+        self.buf.backend.incr.assert_called_once_with(Group, {'times_seen': 1}, {'id': 1}, None)
+        assert self.buf not in coalescing._buffers
+        timer.join(1)
+        assert not timer.is_alive()
+
+        # increments are no longer coalesced
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+        assert len(self.buf.backend.incr.mock_calls) == 2
+
+    @mock.patch('atexit.register')
+    def test_exit_hooks_are_registered_once(self, register):
+        with mock.patch.object(coalescing, '_hooks_registered', False):
+            buffers = [CoalescingBuffer(backend=mock.Mock) for _ in range(3)]
+        assert register.call_count == 1
+
+        for buf in buffers:
+            buf.incr(Group, {'times_seen': 1}, {'id': 1})
+        coalescing.flush_all()
+        for buf in buffers:
+            buf.backend.incr.assert_called_once_with(Group, {'times_seen': 1}, {'id': 1}, None)
+
+        del buffers, buf
+        gc.collect()
+        assert list(coalescing._buffers) == [self.buf]
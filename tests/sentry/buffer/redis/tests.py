@@ -99,3 +99,61 @@ class RedisBufferTest(TestCase):
         }
         pending = client.zrange('b:p', 0, -1)
         assert pending == ['foo']
+
+    def test_process_pending_bulk(self):
+        buf = RedisBuffer(bulk_flush=True, pending_chunk_size=2)
+        project = self.create_project()
+        groups = [self.create_group(project=project, times_seen=1) for _ in range(3)]
+
+        for group in groups:
+            buf.incr(Group, {'times_seen': 2}, {'id': group.id})
+        buf.incr(Group, {'times_seen': 1}, {'id': groups[0].id})
+
+        with mock.patch('sentry.buffer.redis.process_incr') as process_incr:
+            buf.process_pending()
+
+        assert not process_incr.apply_async.called
+        assert [Group.objects.get(id=g.id).times_seen for g in groups] == [4, 3, 3]
+
+        client = buf.cluster.get_routing_client()
+        assert client.zrange('b:p', 0, -1) == []
+        assert not client.exists(buf._make_key(Group, {'id': groups[0].id}))
+
+    @mock.patch('sentry.buffer.redis.time')
+    def test_process_pending_bulk_stops_before_lock_expires(self, time):
+        buf = RedisBuffer(bulk_flush=True, pending_chunk_size=1)
+        project = self.create_project()
+        groups = [self.create_group(project=project, times_seen=1) for _ in range(2)]
+
+        time.return_value = 10
+        for group in groups:
+            buf.incr(Group, {'times_seen': 1}, {'id': group.id})
+
+        def process_many(items):
+            time.return_value += buf.pending_lock_expire
+
+        with mock.patch.object(buf, 'process_many', side_effect=process_many) as mock_process:
+            buf.process_pending()
+
+        assert mock_process.call_count == 1
+        client = buf.cluster.get_routing_client()
+        assert len(client.zrange('b:p', 0, -1)) == 1
+        assert not client.exists(buf._make_lock_key(buf.pending_key))
+
+    @mock.patch('sentry.buffer.redis.time', mock.Mock(return_value=10))
+    @mock.patch('sentry.buffer.base.Buffer.process_many')
+    def test_process_pending_bulk_ignores_new_keys(self, process_many):
+        buf = RedisBuffer(bulk_flush=True)
+        client = buf.cluster.get_routing_client()
+        client.hmset('foo', {
+            'f': "(dp1\nS'pk'\np2\nI1\ns.",
+            'i+times_seen': '2',
+            'm': 'sentry.models.Group',
+        })
+        client.zadd('b:p', 1, 'foo')
+        client.zadd('b:p', 20, 'bar')
+
+        buf.process_pending()
+
+        process_many.assert_called_once_with([(Group, {'times_seen': 2}, {'pk': 1}, {})])
+        assert client.zrange('b:p', 0, -1) == ['bar']
@@ -2,24 +2,30 @@
 
 from __future__ import absolute_import
 
+import base64
 import six
 import mock
 import pytest
+import zlib
 
 from django.core.exceptions import SuspiciousOperation
+from sentry import coreapi
 from sentry.constants import VERSION_LENGTH, MAX_CULPRIT_LENGTH
 from uuid import UUID
 
 from sentry.coreapi import (
     APIError,
+    APIPayloadTooLarge,
     APIUnauthorized,
     Auth,
     ClientApiHelper,
+    LazyData,
     SecurityApiHelper,
 )
 from sentry.event_manager import EventManager
 from sentry.interfaces.base import get_interface
 from sentry.testutils import TestCase
+from sentry.utils import json
 
 
 class BaseAPITest(TestCase):
@@ -554,6 +560,116 @@ class DecodeDataTest(BaseAPITest):
             self.helper.decode_data('\x99')
 
 
+class DecompressPayloadTest(BaseAPITest):
+    def test_formats(self):
+        payload = b'{"message": "foo"}'
+        assert self.helper.decompress_payload(zlib.compress(payload), 'deflate') == payload
+        gzip = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        gzipped = gzip.compress(payload) + gzip.flush()
+        assert self.helper.decompress_payload(gzipped, 'gzip') == payload
+        assert self.helper.decompress_gzip(gzipped) == u'{"message": "foo"}'
+        assert self.helper.decompress_payload(
+            base64.b64encode(zlib.compress(payload)), 'base64') == payload
+        assert self.helper.decompress_payload(base64.b64encode(payload), 'base64') == payload
+
+    def test_invalid_data(self):
+        with self.assertRaises(APIError):
+            self.helper.decompress_payload(b'foo', 'gzip')
+
+    def test_size_limit(self):
+        bomb = zlib.compress(b'0' * (1024 * 1024))
+        with self.settings(SENTRY_MAX_EVENT_PAYLOAD_SIZE=512 * 1024):
+            with self.assertRaises(APIPayloadTooLarge):
+                self.helper.decompress_payload(bomb, 'deflate')
+            with self.assertRaises(APIPayloadTooLarge):
+                self.helper.decompress_payload(b'0' * (1024 * 1024), '')
+        assert len(self.helper.decompress_payload(bomb, 'deflate')) == 1024 * 1024
+
+
+class ShouldFilterEarlyTest(BaseAPITest):
+    def get_data(self, payload):
+        return LazyData(
+            data=zlib.compress(payload),
+            content_encoding='deflate',
+            helper=self.helper,
+            project=self.project,
+            key=self.pk,
+            auth=mock.Mock(client=None, version='7'),
+            client_ip='127.0.0.1',
+        )
+
+    def test_peek(self):
+        data = self.get_data(
+            b'{"extra": {"release": "nested"}, "release": "1.0", "tags": [], "message": "foo"}')
+        assert data.peek(['release', 'tags']) == {'release': '1.0', 'tags': None}
+        assert data.peek(['release', 'dist']) == {'release': '1.0'}
+        assert data['release'] == '1.0'
+        assert data.peek(['release']) is None
+
+    def test_peek_without_message_keys(self):
+        names = ['message', 'sentry.interfaces.Message', 'logentry']
+        data = self.get_data(
+            b'{"extra": {"message": "nested"}, "logentry": null, "release": "1.0"}')
+        assert data.peek(names) == {'logentry': None}
+        data = self.get_data(b'{"extra": {"message": "nested"}, "release": "1.0"}')
+        assert data.peek(names) == {}
+
+    def test_peek_stops_at_last_name(self):
+        data = self.get_data(b'{"release": "1.0", "extra": {"foo": ["bar", "baz"]}}')
+        events = []
+        parse = coreapi.ijson.basic_parse
+
+        def basic_parse(*args, **kwargs):
+            for event in parse(*args, **kwargs):
+                events.append(event)
+                yield event
+
+        with mock.patch.object(coreapi.ijson, 'basic_parse', basic_parse):
+            assert data.peek(['release']) == {'release': '1.0'}
+        assert events == [('start_map', None), ('map_key', 'release'), ('string', '1.0')]
+
+    def test_peek_without_c_parser(self):
+        data = self.get_data(b'{"release": "1.0", "tags": [], "message": "foo"}')
+        with mock.patch('sentry.coreapi.ijson', None), \
+                mock.patch.object(json, 'loads', wraps=json.loads) as loads:
+            assert data.peek(['release', 'tags']) == {'release': '1.0', 'tags': None}
+            assert data.peek(['message']) == {'message': 'foo'}
+            assert data['release'] == '1.0'
+        # the payload was only loaded once
+        assert loads.call_count == 1
+
+    def test_ip_address(self):
+        self.project.update_option('sentry:blacklisted_ips', ['127.0.0.1'])
+        data = self.get_data(b'{}')
+        assert self.helper.should_filter_early(self.project, data, '127.0.0.1') == \
+            (True, 'ip-address')
+
+    def test_release(self):
+        self.project.update_option('sentry:releases', ['1.*'])
+        with mock.patch.object(LazyData, '_decode') as decode:
+            assert self.helper.should_filter_early(
+                self.project, self.get_data(b'{"release": "1.0"}')) == (True, 'release-version')
+            assert self.helper.should_filter_early(
+                self.project, self.get_data(b'{"release": "2.0"}')) == (False, None)
+        assert not decode.called
+
+    def test_error_message(self):
+        self.project.update_option('sentry:error_messages', ['*bad*'])
+        assert self.helper.should_filter_early(
+            self.project, self.get_data(b'{"message": "a bad thing"}')) == \
+            (True, 'error-message')
+        # the message interface takes precedence over the raw message
+        assert self.helper.should_filter_early(self.project, self.get_data(
+            b'{"message": "a bad thing", "logentry": {"formatted": "fine"}}'
+        )) == (False, None)
+
+    def test_no_filters(self):
+        data = self.get_data(b'{"release": "1.0"}')
+        with mock.patch.object(LazyData, 'peek') as peek:
+            assert self.helper.should_filter_early(self.project, data) == (False, None)
+        assert not peek.called
+
+
 class GetInterfaceTest(TestCase):
     def test_does_not_let_through_disallowed_name(self):
         with self.assertRaises(ValueError):
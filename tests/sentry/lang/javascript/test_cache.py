@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 
 from sentry.testutils import TestCase
-from sentry.lang.javascript.cache import SourceCache
+from sentry.lang.javascript.cache import SourceCache, ViewCache
 
 
 class BasicCacheTest(TestCase):
@@ -38,3 +38,25 @@ class BasicCacheTest(TestCase):
         # fall back to utf-8
         cache.add(url, 'foobar'.encode('utf-32'), encoding='utf-32')
         assert cache.get(url)[0] == u'foobar'
+
+
+class ViewCacheTest(TestCase):
+    def test_eviction(self):
+        cache = ViewCache()
+        with self.settings(SENTRY_JS_VIEW_CACHE_SIZE=10):
+            cache.set(('source', 1, 'a'), 'a', 4)
+            cache.set(('source', 1, 'b'), 'b', 4)
+            assert cache.get(('source', 1, 'a')) == 'a'
+
+            cache.set(('source', 1, 'c'), 'c', 4)
+            assert cache.get(('source', 1, 'b')) is None
+            assert cache.get(('source', 1, 'a')) == 'a'
+            assert cache.size == 8
+
+            cache.set(('source', 1, 'd'), 'd', 11)
+            assert cache.get(('source', 1, 'd')) is None
+            assert cache.size == 8
+
+        cache.clear()
+        assert cache.get(('source', 1, 'a')) is None
+        assert cache.size == 0
@@ -5,7 +5,7 @@ from __future__ import absolute_import
 import responses
 import os.path
 
-from mock import patch
+from mock import ANY, patch
 
 from sentry.models import Event, File, Release, ReleaseFile
 from sentry.testutils import TestCase
@@ -126,8 +126,8 @@ class JavascriptIntegrationTest(TestCase):
             'brand': 'Sony',
         }
 
-    @patch('sentry.lang.javascript.processor.fetch_file')
-    def test_source_expansion(self, mock_fetch_file):
+    @patch('sentry.lang.javascript.processor.fetch_remote_file')
+    def test_source_expansion(self, mock_fetch_remote_file):
         data = {
             'message': 'hello',
             'platform': 'javascript',
@@ -156,18 +156,17 @@ class JavascriptIntegrationTest(TestCase):
             }
         }
 
-        mock_fetch_file.return_value.body = '\n'.join('hello world')
-        mock_fetch_file.return_value.encoding = None
+        mock_fetch_remote_file.return_value.body = '\n'.join('hello world')
+        mock_fetch_remote_file.return_value.encoding = None
 
         resp = self._postWithHeader(data)
         assert resp.status_code, 200
 
-        mock_fetch_file.assert_called_once_with(
+        mock_fetch_remote_file.assert_called_once_with(
             'http://example.com/foo.js',
             project=self.project,
-            release=None,
-            dist=None,
             allow_scraping=True,
+            options=ANY,
         )
 
         event = Event.objects.get()
@@ -187,9 +186,9 @@ class JavascriptIntegrationTest(TestCase):
         # no source map means no raw_stacktrace
         assert exception.values[0].raw_stacktrace is None
 
-    @patch('sentry.lang.javascript.processor.fetch_file')
+    @patch('sentry.lang.javascript.processor.fetch_remote_file')
     @patch('sentry.lang.javascript.processor.discover_sourcemap')
-    def test_inlined_sources(self, mock_discover_sourcemap, mock_fetch_file):
+    def test_inlined_sources(self, mock_discover_sourcemap, mock_fetch_remote_file):
         data = {
             'message': 'hello',
             'platform': 'javascript',
@@ -214,19 +213,18 @@ class JavascriptIntegrationTest(TestCase):
 
         mock_discover_sourcemap.return_value = BASE64_SOURCEMAP
 
-        mock_fetch_file.return_value.url = 'http://example.com/test.min.js'
-        mock_fetch_file.return_value.body = '\n'.join('<generated source>')
-        mock_fetch_file.return_value.encoding = None
+        mock_fetch_remote_file.return_value.url = 'http://example.com/test.min.js'
+        mock_fetch_remote_file.return_value.body = '\n'.join('<generated source>')
+        mock_fetch_remote_file.return_value.encoding = None
 
         resp = self._postWithHeader(data)
         assert resp.status_code, 200
 
-        mock_fetch_file.assert_called_once_with(
+        mock_fetch_remote_file.assert_called_once_with(
             'http://example.com/test.min.js',
             project=self.project,
-            release=None,
-            dist=None,
             allow_scraping=True,
+            options=ANY,
         )
 
         event = Event.objects.get()
@@ -1,9 +1,11 @@
 from __future__ import absolute_import
 
+import os
 import pytest
 import re
 import responses
 import six
+import threading
 from symbolic import SourceMapTokenMatch
 
 from mock import patch
@@ -21,9 +23,11 @@ from sentry.lang.javascript.processor import (
     get_max_age,
     CACHE_CONTROL_MAX,
     CACHE_CONTROL_MIN,
+    JavaScriptStacktraceProcessor,
+    get_fetch_executor,
 )
 from sentry.lang.javascript.errormapping import (rewrite_exception, REACT_MAPPING_URL)
-from sentry.models import File, Release, ReleaseFile, EventError
+from sentry.models import File, Project, Release, ReleaseFile, EventError
 from sentry.testutils import TestCase
 from sentry.utils.strings import truncatechars
 
@@ -167,6 +171,34 @@ class FetchReleaseFileTest(TestCase):
             'utf-8',
         )
 
+    def test_rolled_back_upload(self):
+        project = self.project
+        release = Release.objects.create(
+            organization_id=project.organization_id,
+            version='abc',
+        )
+        release.add_project(project)
+
+        file = File.objects.create(
+            name='file.min.js',
+            type='release.file',
+            headers={'Content-Type': 'application/json; charset=utf-8'},
+        )
+        file.putfile(six.BytesIO(unicode_body.encode('utf-8')))
+        assert ReleaseFile.get_manifest_entries(release.id, None, ['file.min.js']) == [None]
+
+        # the manifest entry of an upload whose transaction was rolled back
+        ReleaseFile.add_to_manifest(ReleaseFile(
+            id=1234,
+            name='file.min.js',
+            release=release,
+            organization_id=project.organization_id,
+            file=file,
+        ))
+
+        assert fetch_release_file('file.min.js', release) is None
+        assert ReleaseFile.get_manifest_entries(release.id, None, ['file.min.js']) == [None]
+
 
 class FetchFileTest(TestCase):
     @responses.activate
@@ -491,6 +523,155 @@ class FetchSourcemapTest(TestCase):
             fetch_sourcemap('http://example.com')
 
 
+class ViewCacheTest(TestCase):
+    def create_artifact(self, release, name, fixture):
+        path = os.path.join(os.path.dirname(__file__), 'fixtures', fixture)
+        file = File.objects.create(name=fixture, type='release.file')
+        with open(path, 'rb') as fp:
+            file.putfile(fp)
+        return ReleaseFile.objects.create(
+            name=name,
+            release=release,
+            organization_id=self.project.organization_id,
+            file=file,
+        )
+
+    def cache_source(self, release, filename):
+        processor = JavaScriptStacktraceProcessor(
+            data={'platform': 'javascript'},
+            stacktrace_infos=[],
+            project=self.project,
+        )
+        processor.release = release
+        processor.cache_source(filename)
+        return processor
+
+    def test_parses_artifacts_once(self):
+        release = Release.objects.create(
+            organization_id=self.project.organization_id,
+            version='abc',
+        )
+        release.add_project(self.project)
+        self.create_artifact(release, 'http://example.com/file.min.js', 'file.min.js')
+        sourcemap = self.create_artifact(
+            release, 'http://example.com/file.sourcemap.js', 'file.sourcemap.js')
+
+        with patch('sentry.lang.javascript.processor.fetch_release_file',
+                   wraps=fetch_release_file) as fetch, \
+                patch('sentry.lang.javascript.processor.SourceMapView') as view:
+            for _ in range(2):
+                processor = self.cache_source(release, 'http://example.com/file.min.js')
+                assert processor.cache.get('http://example.com/file.min.js') is not None
+                assert processor.sourcemaps.get_link('http://example.com/file.min.js')[0] == \
+                    'http://example.com/file.sourcemap.js'
+            assert fetch.call_count == 2
+            assert view.from_json_bytes.call_count == 1
+
+            # replacing an artifact invalidates it
+            sourcemap.file = File.objects.create(name='empty.js', type='release.file')
+            sourcemap.file.putfile(six.BytesIO(b'{}'))
+            sourcemap.save()
+            self.cache_source(release, 'http://example.com/file.min.js')
+            assert fetch.call_count == 3
+            assert view.from_json_bytes.call_count == 2
+
+
+class CacheSourcesTest(TestCase):
+    def get_processor(self):
+        return JavaScriptStacktraceProcessor(
+            data={'platform': 'javascript'},
+            stacktrace_infos=[],
+            project=self.project,
+        )
+
+    def get_fixture(self, name):
+        with open(os.path.join(os.path.dirname(__file__), 'fixtures', name), 'rb') as fp:
+            return fp.read()
+
+    @responses.activate
+    def test_fetches_concurrently(self):
+        for name in ('file1.js', 'file2.js', 'file.min.js', 'file.sourcemap.js'):
+            responses.add(
+                responses.GET, 'http://example.com/%s' % name, body=self.get_fixture(name))
+        responses.add(
+            responses.GET, 'http://example.com/missing.js', body='Not Found', status=404)
+
+        processor = self.get_processor()
+        filenames = [
+            'http://example.com/file1.js',
+            'http://example.com/file2.js',
+            'http://example.com/file.min.js',
+            'http://example.com/missing.js',
+        ]
+        option_threads = set()
+        get_option = Project.get_option
+
+        def record_get_option(project, *args, **kwargs):
+            option_threads.add(threading.current_thread())
+            return get_option(project, *args, **kwargs)
+
+        with self.settings(SENTRY_JS_FETCH_CONCURRENCY=2), \
+                patch('sentry.lang.javascript.processor.get_fetch_executor',
+                      wraps=get_fetch_executor) as executor, \
+                patch.object(Project, 'get_option', record_get_option), \
+                patch('sentry.utils.metrics.timing') as timing:
+            processor.cache_sources(filenames)
+
+            # the threads are kept for the next events
+            assert get_fetch_executor() is get_fetch_executor()
+            assert get_fetch_executor()._max_workers == 2
+
+        # only the sources are fetched concurrently, there is a single sourcemap
+        assert executor.call_count == 1
+        # project options are only read by the processing thread
+        assert option_threads == set([threading.current_thread()])
+        assert ('sourcemaps.fetch.fanout', 4) in [c[0][:2] for c in timing.call_args_list]
+
+        for filename in filenames[:3]:
+            assert processor.cache.get(filename) is not None
+        assert processor.cache.get_errors('http://example.com/missing.js') == [{
+            'type': EventError.FETCH_INVALID_HTTP_CODE,
+            'value': 404,
+            'url': 'http://example.com/missing.js',
+        }]
+        assert processor.sourcemaps.get_link('http://example.com/file.min.js')[0] == \
+            'http://example.com/file.sourcemap.js'
+        # inlined sources of the sourcemap are cached as well
+        assert processor.cache.get('http://example.com/file1.js') is not None
+
+    @responses.activate
+    def test_sourcemap_errors(self):
+        responses.add(
+            responses.GET, 'http://example.com/file.min.js',
+            body=self.get_fixture('file.min.js'))
+        responses.add(
+            responses.GET, 'http://example.com/file.sourcemap.js', body='Not Found', status=404)
+
+        processor = self.get_processor()
+        processor.cache_sources(['http://example.com/file.min.js'])
+        assert processor.cache.get('http://example.com/file.min.js') is not None
+        assert processor.cache.get_errors('http://example.com/file.min.js') == [{
+            'type': EventError.FETCH_INVALID_HTTP_CODE,
+            'value': 404,
+            'url': 'http://example.com/file.sourcemap.js',
+        }]
+
+    @responses.activate
+    def test_max_fetches(self):
+        for name in ('file1.js', 'file2.js'):
+            responses.add(
+                responses.GET, 'http://example.com/%s' % name, body=self.get_fixture(name))
+
+        processor = self.get_processor()
+        processor.max_fetches = 1
+        processor.cache_sources(['http://example.com/file1.js', 'http://example.com/file2.js'])
+        assert processor.cache.get('http://example.com/file1.js') is not None
+        assert processor.cache.get_errors('http://example.com/file2.js') == [{
+            'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
+        }]
+        assert len(responses.calls) == 1
+
+
 class TrimLineTest(TestCase):
     long_line = 'The public is more familiar with bad design than good design. It is, in effect, conditioned to prefer bad design, because that is what it lives with. The new becomes threatening, the old reassuring.'
 
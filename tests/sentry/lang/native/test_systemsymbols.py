@@ -0,0 +1,151 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+
+from sentry.lang.native.systemsymbols import LookupCoalescer, lookup_system_symbols
+from sentry.testutils import TestCase
+from sentry.utils import json
+
+SDK_INFO = {
+    'sdk_name': 'iOS',
+    'version_major': 10,
+    'version_minor': 3,
+    'version_patchlevel': 0,
+}
+
+SYMBOLS = {
+    '0x1000': {'symbol': 'UIApplicationMain', 'sym_addr': '0x1000', 'object_name': 'UIKit'},
+    '0x2000': {'symbol': 'objc_msgSend', 'sym_addr': '0x2000', 'object_name': 'libobjc'},
+}
+
+
+class SymbolServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Local stand-in for the symbol server, which records its requests."""
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), SymbolServerHandler)
+        self.requests = []
+        self.blocked = threading.Event()
+        self.blocked.set()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+
+class SymbolServerHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(query)
+        self.server.blocked.wait()
+
+        body = json.dumps({
+            'symbols': [SYMBOLS.get(symbol['addr']) for symbol in query['symbols']],
+        })
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_symbol(addr):
+    return {
+        'object_uuid': '6fc0f0de-5e4d-3f2a-9fd4-3a5a4f5b8c01',
+        'object_name': 'UIKit',
+        'addr': addr,
+    }
+
+
+class SystemSymbolsTest(TestCase):
+    def setUp(self):
+        self.server = SymbolServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        # options are patched globally, so this has to happen outside of the
+        # threads of the tests
+        self.options_override = self.options({
+            'symbolserver.enabled': True,
+            'symbolserver.options': {'url': self.server.url},
+        })
+        self.options_override.__enter__()
+
+    def tearDown(self):
+        self.options_override.__exit__(None, None, None)
+        self.server.blocked.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def lookup(self, addrs):
+        return lookup_system_symbols([make_symbol(addr) for addr in addrs], SDK_INFO, 'arm64')
+
+    def test_results_are_cached(self):
+        assert self.lookup(['0x1000', '0x3000']) == [SYMBOLS['0x1000'], None]
+        assert self.server.requests == [{
+            'sdk_id': 'iOS_10.3.0',
+            'cpu_name': 'arm64',
+            'symbols': [make_symbol('0x1000'), make_symbol('0x3000')],
+        }]
+
+        # only addresses which were not looked up before go to the server
+        assert self.lookup(['0x3000', '0x2000', '0x1000']) == \
+            [None, SYMBOLS['0x2000'], SYMBOLS['0x1000']]
+        assert len(self.server.requests) == 2
+        assert self.server.requests[1]['symbols'] == [make_symbol('0x2000')]
+
+    def test_server_unavailable(self):
+        self.server.shutdown()
+        self.server.server_close()
+        assert self.lookup(['0x1000']) is None
+
+    def test_concurrent_lookups_are_coalesced(self):
+        coalescer = LookupCoalescer()
+        group = ('iOS_10.3.0', 'arm64')
+        results = {}
+
+        def lookup(name, addrs):
+            results[name] = coalescer.lookup(group, [make_symbol(addr) for addr in addrs])
+
+        def wait_for(condition):
+            deadline = time.time() + 5
+            while not condition():
+                assert time.time() < deadline
+                time.sleep(0.01)
+
+        # the first lookup is in flight while the others come in
+        self.server.blocked.clear()
+        threads = [threading.Thread(target=lookup, args=('a', ['0x1000']))]
+        threads[0].start()
+        wait_for(lambda: len(self.server.requests) == 1)
+
+        for name, addrs in (('b', ['0x1000', '0x2000']), ('c', ['0x2000']), ('d', ['0x3000'])):
+            thread = threading.Thread(target=lookup, args=(name, addrs))
+            thread.start()
+            threads.append(thread)
+        wait_for(lambda: group in coalescer._pending and
+                 len(coalescer._pending[group].symbols) == 3)
+
+        self.server.blocked.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == {
+            'a': [SYMBOLS['0x1000']],
+            'b': [SYMBOLS['0x1000'], SYMBOLS['0x2000']],
+            'c': [SYMBOLS['0x2000']],
+            'd': [None],
+        }
+        # the address of the first request came from the cache
+        assert [r['symbols'] for r in self.server.requests] == [
+            [make_symbol('0x1000')],
+            [make_symbol('0x2000'), make_symbol('0x3000')],
+        ]
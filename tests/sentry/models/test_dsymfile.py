@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
+import mock
 import os
+import tempfile
 import time
 import uuid
 import zipfile
@@ -9,12 +11,14 @@ from six import BytesIO, text_type
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
 
-from sentry.testutils import APITestCase
+from sentry.testutils import APITestCase, TestCase
 from sentry.models import ProjectDSymFile
+from sentry.models.dsymfile import SymCachePool, symcache_pool
 
 # This is obviously a freely generated UUID and not the checksum UUID.
 # This is permissible if users want to send different UUIDs
 PROGUARD_UUID = uuid.UUID('6dc7fdb0-d2fb-4c8e-9d6b-bb1aa98929b1')
+HELLO_UUID = uuid.UUID('502fc0a5-1ec1-3e47-9998-684fa139dca7')
 PROGUARD_SOURCE = b'''\
 org.slf4j.helpers.Util$ClassContextSecurityManager -> org.a.b.g$a:
 65:65:void <init>() -> <init>
@@ -82,3 +86,109 @@ class DSymFilesClearTest(APITestCase):
 
         # But it's gone now
         assert not os.path.isfile(dsyms[PROGUARD_UUID])
+
+
+class SymCachePoolTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def create_file(self, name):
+        path = os.path.join(self.path, name)
+        with open(path, 'wb') as f:
+            f.write(b'symcache')
+        return path
+
+    def test_eviction(self):
+        pool = SymCachePool()
+        a, b, c = [self.create_file(name) for name in 'abc']
+        now = time.time()
+
+        with self.settings(SENTRY_SYMCACHE_POOL_SIZE=10):
+            pool.add(a, 1, 'a', 4, now)
+            pool.add(b, 2, 'b', 4, now)
+            assert pool.get(a, 1) == 'a'
+
+            with mock.patch('sentry.utils.metrics.incr') as incr:
+                pool.add(c, 3, 'c', 4, now)
+            incr.assert_called_once_with('symcache.pool.evict', 1)
+
+            assert pool.get(b, 2) is None
+            assert pool.get(a, 1) == 'a'
+            assert pool.get(c, 3) == 'c'
+            assert pool.size == 8
+
+            # regenerated symcaches are not confused with older ones
+            assert pool.get(a, 4) is None
+
+            pool.add(a, 4, 'aa', 11, now)
+            assert pool.get(a, 4) is None
+            assert pool.size == 8
+
+    def test_bump_timestamp(self):
+        pool = SymCachePool()
+        a = self.create_file('a')
+        old = time.time() - 60 * 60 * 25
+        os.utime(a, (old, old))
+
+        pool.add(a, 1, 'a', 4, old)
+        assert pool.get(a, 1) == 'a'
+        assert os.path.getmtime(a) > old + 60 * 60
+
+        # cleared files have to be stored again
+        pool.add(a, 1, 'a', 4, old)
+        os.remove(a)
+        assert pool.get(a, 1) is None
+        assert len(pool) == 0
+
+
+class SymCachePoolIntegrationTest(APITestCase):
+    def test_symcaches_are_pooled(self):
+        url = reverse(
+            'sentry-api-0-dsym-files',
+            kwargs={
+                'organization_slug': self.project.organization.slug,
+                'project_slug': self.project.slug,
+            }
+        )
+
+        self.login_as(user=self.user)
+
+        out = BytesIO()
+        f = zipfile.ZipFile(out, 'w')
+        f.write(os.path.join(os.path.dirname(__file__), os.pardir, 'lang', 'native',
+                             'fixtures', 'hello.dsym'), 'dSYM/hello')
+        f.close()
+
+        response = self.client.post(
+            url, {
+                'file':
+                SimpleUploadedFile('symbols.zip', out.getvalue(),
+                                   content_type='application/zip'),
+            },
+            format='multipart'
+        )
+        assert response.status_code == 201, response.content
+
+        with mock.patch('sentry.utils.metrics.incr') as incr:
+            first = ProjectDSymFile.dsymcache.get_symcaches(self.project, [HELLO_UUID])
+            second = ProjectDSymFile.dsymcache.get_symcaches(self.project, [HELLO_UUID])
+        assert first[HELLO_UUID] is second[HELLO_UUID]
+        assert len(symcache_pool) == 1
+        assert [c for c in incr.mock_calls if c[1][0].startswith('symcache.pool.')] == [
+            mock.call('symcache.pool.open'),
+            mock.call('symcache.pool.hit'),
+        ]
+
+        # a symcache that was cleared from disk is stored again
+        real_time = time.time
+        time.time = lambda: real_time() + 60 * 60 * 48
+        try:
+            ProjectDSymFile.dsymcache.clear_old_entries()
+            third = ProjectDSymFile.dsymcache.get_symcaches(self.project, [HELLO_UUID])
+        finally:
+            time.time = real_time
+        assert third[HELLO_UUID] is not first[HELLO_UUID]
+        assert os.path.isfile(os.path.join(
+            ProjectDSymFile.dsymcache.get_project_path(self.project),
+            '%s.symcache' % HELLO_UUID,
+        ))
@@ -1,10 +1,15 @@
 from __future__ import absolute_import
 
 import os
+import shutil
+import tempfile
+import time
 
+import mock
 from django.core.files.base import ContentFile
 
 from sentry.models import File, FileBlob
+from sentry.models.file import MappedFile, blob_cache
 from sentry.testutils import TestCase
 
 
@@ -22,6 +27,69 @@ class FileBlobTest(TestCase):
         assert my_file1.checksum == my_file2.checksum
         assert my_file1.path == my_file2.path
 
+    def test_from_files(self):
+        existing = FileBlob.from_file(ContentFile(b'foo'))
+
+        blobs = FileBlob.from_files([
+            ContentFile(b'bar'),
+            ContentFile(b'foo'),
+            ContentFile(b'baz'),
+            ContentFile(b'bar'),
+        ])
+        assert [blob.getfile().read() for blob in blobs] == [b'bar', b'foo', b'baz', b'bar']
+        assert blobs[1].id == existing.id
+        assert blobs[0].id == blobs[3].id
+        assert FileBlob.objects.count() == 3
+
+
+class FileBlobCacheTest(TestCase):
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_path)
+
+    def test_read_through_cache(self):
+        file = File.objects.create(name='test.bin', type='default')
+        file.putfile(ContentFile(b'foo bar baz'), 4)
+
+        with self.settings(SENTRY_FILE_BLOB_CACHE_PATH=self.cache_path), \
+                mock.patch('sentry.utils.metrics.incr') as incr:
+            with file.getfile() as fp:
+                assert fp.read(2) == b'fo'
+                fp.seek(5)
+                assert fp.read() == b'ar baz'
+            # cached blobs are mapped
+            with file.getfile() as fp:
+                assert isinstance(fp.file._curfile, MappedFile)
+                assert fp.read() == b'foo bar baz'
+            assert file.getfile(prefetch=True).read() == b'foo bar baz'
+
+        counts = {}
+        for call in incr.mock_calls:
+            counts[call[1][0]] = counts.get(call[1][0], 0) + 1
+        assert counts == {
+            'filestore.blob-cache.miss': 3,
+            'filestore.blob-cache.hit': 6,
+        }
+
+        # blobs are stored by their checksum
+        for index in file.fileblobindex_set.select_related('blob'):
+            checksum = index.blob.checksum
+            with open(os.path.join(self.cache_path, checksum[:2], checksum), 'rb') as f:
+                assert f.read() == index.blob.getfile().read()
+
+    def test_clear_old_entries(self):
+        blobs = FileBlob.from_files([ContentFile(b'a' * 10), ContentFile(b'b' * 10)])
+        with self.settings(SENTRY_FILE_BLOB_CACHE_PATH=self.cache_path,
+                           SENTRY_FILE_BLOB_CACHE_SIZE=15):
+            for blob in blobs:
+                blob_cache.open(blob).close()
+            paths = [blob_cache.get_path(blob.checksum) for blob in blobs]
+            os.utime(paths[0], (time.time() - 10, time.time() - 10))
+
+            blob_cache.clear_old_entries()
+        assert not os.path.exists(paths[0])
+        assert os.path.exists(paths[1])
+
 
 class FileTest(TestCase):
     def test_file_handling(self):
@@ -77,3 +145,25 @@ class FileTest(TestCase):
 
         f = file.getfile(prefetch=True)
         assert f.read() == random_data
+
+    def test_multi_chunk_readahead(self):
+        random_data = os.urandom(1 << 12)
+
+        file = File.objects.create(name='test.bin', type='default')
+        with self.settings(SENTRY_FILE_BLOB_UPLOAD_CONCURRENCY=3):
+            indexes = file.putfile(ContentFile(random_data), 256)
+        assert [index.offset for index in indexes] == list(range(0, 1 << 12, 256))
+        assert file.size == len(random_data)
+
+        with self.settings(SENTRY_FILE_BLOB_READAHEAD=3):
+            with file.getfile() as fp:
+                # nothing is fetched ahead until the reads are sequential
+                assert fp.read(100) == random_data[:100]
+                assert len(fp.file._fetches) == 0
+                assert fp.read(900) == random_data[100:1000]
+                assert len(fp.file._fetches) == 3
+                fp.seek(3000)
+                assert len(fp.file._fetches) == 0
+                assert fp.read() == random_data[3000:]
+                fp.seek(10)
+                assert fp.read(300) == random_data[10:310]
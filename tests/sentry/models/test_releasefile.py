@@ -1,6 +1,11 @@
 from __future__ import absolute_import
 
-from sentry.models import ReleaseFile
+import six
+
+from mock import patch
+
+from sentry.models import File, Release, ReleaseFile
+from sentry.models.releasefile import ManifestEntry, store_manifest
 from sentry.testutils import TestCase
 
 
@@ -34,3 +39,94 @@ class ReleaseFileTestCase(TestCase):
             'foo.js',
             '~foo.js',
         ]
+
+
+class ReleaseFileManifestTestCase(TestCase):
+    def setUp(self):
+        self.release = self.create_release(self.project)
+        self.dist = self.release.add_dist('foo')
+
+    def create_release_file(self, name, dist=None, release=None):
+        file = File.objects.create(name=name, type='release.file')
+        file.putfile(six.BytesIO(name.encode('utf-8')))
+        return ReleaseFile.objects.create(
+            organization_id=self.project.organization_id,
+            release=release or self.release,
+            dist=dist,
+            file=file,
+            name=name,
+        )
+
+    def test_lookup(self):
+        a = self.create_release_file('~/a.js')
+        self.create_release_file('~/b.js', dist=self.dist)
+        ReleaseFile.clear_manifest(self.release.id, None)
+
+        # the manifest is built once
+        with self.assertNumQueries(1):
+            assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js', '~/b.js']) \
+                == [ManifestEntry(a.id, a.file_id, a.file.checksum), None]
+        with self.assertNumQueries(0):
+            assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js']) \
+                == [ManifestEntry(a.id, a.file_id, a.file.checksum)]
+
+        # and uploaded files are added to it
+        c = self.create_release_file('~/c.js')
+        with self.assertNumQueries(0):
+            assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/c.js']) \
+                == [ManifestEntry(c.id, c.file_id, c.file.checksum)]
+
+    def test_dist(self):
+        self.create_release_file('~/a.js')
+        b = self.create_release_file('~/a.js', dist=self.dist)
+        assert ReleaseFile.get_manifest_entries(self.release.id, self.dist.id, ['~/a.js']) \
+            == [ManifestEntry(b.id, b.file_id, b.file.checksum)]
+
+    def test_invalidation(self):
+        a = self.create_release_file('~/a.js')
+        b = self.create_release_file('~/b.js')
+        assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js', '~/b.js']) \
+            == [ManifestEntry(a.id, a.file_id, a.file.checksum),
+                ManifestEntry(b.id, b.file_id, b.file.checksum)]
+
+        a.update(name='~/c.js')
+        b.delete()
+        assert ReleaseFile.get_manifest_entries(
+            self.release.id, None, ['~/a.js', '~/b.js', '~/c.js']) \
+            == [None, None, ManifestEntry(a.id, a.file_id, a.file.checksum)]
+
+    def test_outdated_build_is_discarded(self):
+        a = self.create_release_file('~/a.js')
+        ReleaseFile.clear_manifest(self.release.id, None)
+
+        def clear_while_building(client, keys, args):
+            # the file is renamed after the manifest was read from the
+            # database, but before it is stored
+            ReleaseFile.objects.filter(id=a.id).update(name='~/b.js')
+            ReleaseFile.clear_manifest(self.release.id, None)
+            return store_manifest(client, keys, args)
+
+        with patch('sentry.models.releasefile.store_manifest', clear_while_building):
+            assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js']) \
+                == [ManifestEntry(a.id, a.file_id, a.file.checksum)]
+
+        assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js', '~/b.js']) \
+            == [None, ManifestEntry(a.id, a.file_id, a.file.checksum)]
+
+    def test_merge(self):
+        other_release = Release.objects.create(
+            organization_id=self.project.organization_id,
+            version='def',
+        )
+        a = self.create_release_file('~/a.js')
+        b = self.create_release_file('~/b.js', release=other_release)
+        assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js', '~/b.js']) \
+            == [ManifestEntry(a.id, a.file_id, a.file.checksum), None]
+        generation = ReleaseFile.get_cache_generation(self.release.id)
+
+        Release.merge(self.release, [other_release])
+
+        assert ReleaseFile.get_cache_generation(self.release.id) != generation
+        assert ReleaseFile.get_manifest_entries(self.release.id, None, ['~/a.js', '~/b.js']) \
+            == [ManifestEntry(a.id, a.file_id, a.file.checksum),
+                ManifestEntry(b.id, b.file_id, b.file.checksum)]
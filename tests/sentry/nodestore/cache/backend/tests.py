@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from sentry.nodestore.base import NodeStorage
+from sentry.nodestore.cache.backend import CachedNodeStorage, LRUCache
+from sentry.testutils import TestCase
+from sentry.utils.redis import clusters
+
+
+class InMemoryBackend(NodeStorage):
+    def __init__(self):
+        self._data = {}
+        self.reads = []
+
+    def set(self, id, data):
+        self._data[id] = data
+
+    def get(self, id):
+        self.reads.append(id)
+        return self._data.get(id)
+
+    def delete(self, id):
+        self._data.pop(id, None)
+
+
+class LRUCacheTest(TestCase):
+    def test_eviction(self):
+        cache = LRUCache(10)
+        cache.set('a', b'aaaa')
+        cache.set('b', b'bbbb')
+        assert cache.get('a') == b'aaaa'
+
+        cache.set('c', b'cccc')
+        assert cache.get('b') is None
+        assert cache.get('a') == b'aaaa'
+        assert cache.get('c') == b'cccc'
+        assert cache.size == 8
+
+        cache.set('a', b'a')
+        assert cache.size == 5
+
+        cache.set('d', b'd' * 11)
+        assert cache.get('d') is None
+        assert cache.size == 5
+
+        cache.delete('a')
+        assert len(cache) == 1
+        assert cache.size == 4
+
+
+class CachedNodeStorageTest(TestCase):
+    def setUp(self):
+        self.ns = CachedNodeStorage(InMemoryBackend)
+
+    def test_read_through(self):
+        self.ns.backend.set('a', {'foo': 'bar'})
+
+        with mock.patch('sentry.utils.metrics.incr') as incr:
+            assert self.ns.get('a') == {'foo': 'bar'}
+            assert self.ns.get_multi(['a', 'b']) == {'a': {'foo': 'bar'}, 'b': None}
+        assert self.ns.backend.reads == ['a', 'b']
+        assert incr.mock_calls == [
+            mock.call('nodestore.cache.miss', 1, instance='local'),
+            mock.call('nodestore.cache.hit', 1, instance='local'),
+            mock.call('nodestore.cache.miss', 1, instance='local'),
+        ]
+
+        # callers must not be able to modify the cached data
+        self.ns.get('a')['foo'] = 'baz'
+        assert self.ns.get('a') == {'foo': 'bar'}
+
+    def test_miss_left_out_by_backend(self):
+        with mock.patch.object(self.ns.backend, 'get_multi', return_value={}):
+            assert self.ns.get('a') is None
+            assert self.ns.get_multi(['a', 'b']) == {'a': None, 'b': None}
+
+    def test_write_through(self):
+        self.ns.set_multi({'a': {'foo': 'bar'}, 'b': {'foo': 'baz'}})
+        assert self.ns.backend.get('a') == {'foo': 'bar'}
+        self.ns.backend.reads = []
+
+        assert self.ns.get_multi(['a', 'b']) == {'a': {'foo': 'bar'}, 'b': {'foo': 'baz'}}
+        assert self.ns.backend.reads == []
+
+    def test_delete(self):
+        self.ns.set('a', {'foo': 'bar'})
+        self.ns.set('b', {'foo': 'baz'})
+        self.ns.delete('a')
+        self.ns.delete_multi(['b'])
+        assert self.ns.get_multi(['a', 'b']) == {'a': None, 'b': None}
+        assert self.ns.backend.reads == ['a', 'b']
+
+    def test_memory_bound(self):
+        ns = CachedNodeStorage(InMemoryBackend, max_size=100)
+        ns.set('a', {'foo': 'a' * 50})
+        ns.set('b', {'foo': 'b' * 50})
+        assert ns.cache.size <= 100
+        assert ns.get('a') == {'foo': 'a' * 50}
+        assert ns.backend.reads == ['a']
+
+    def test_redis_tier(self):
+        ns = CachedNodeStorage(InMemoryBackend, redis_cluster='default')
+        ns.set('a', {'foo': 'bar'})
+        client = clusters.get('default').get_local_client_for_key('nodestore:a')
+        assert client.ttl('nodestore:a') > 0
+
+        # another process only shares the redis cache
+        ns.cache.clear()
+        with mock.patch('sentry.utils.metrics.incr') as incr:
+            assert ns.get('a') == {'foo': 'bar'}
+        assert ns.backend.reads == []
+        assert incr.mock_calls == [
+            mock.call('nodestore.cache.miss', 1, instance='local'),
+            mock.call('nodestore.cache.hit', 1, instance='redis'),
+        ]
+
+        ns.delete('a')
+        assert not client.exists('nodestore:a')
@@ -2,7 +2,10 @@
 
 from __future__ import absolute_import
 
+import mock
+
 from datetime import timedelta
+from django.db import IntegrityError
 from django.utils import timezone
 
 from sentry.nodestore.django.models import Node
@@ -65,6 +68,45 @@ class DjangoNodeStorageTest(TestCase):
             'foo': 'baz',
         }
 
+    def test_set_multi_existing(self):
+        Node.objects.create(id='d2502ebbd7df41ceba8d3275595cac33', data={
+            'foo': 'bar',
+        })
+
+        values = {
+            'd2502ebbd7df41ceba8d3275595cac33': {
+                'foo': 'baz',
+            },
+        }
+        values.update(('%032x' % i, {'foo': i}) for i in range(10))
+
+        # one select, one update and one insert (plus the savepoint)
+        with self.assertNumQueries(5):
+            self.ns.set_multi(values)
+
+        assert Node.objects.count() == 11
+        assert self.ns.get_multi(list(values)) == values
+
+    @mock.patch('sentry.nodestore.django.backend.DjangoNodeStorage.set')
+    def test_set_multi_conflict(self, mock_set):
+        values = {
+            'd2502ebbd7df41ceba8d3275595cac33': {
+                'foo': 'bar',
+            },
+        }
+
+        with mock.patch.object(Node.objects, 'bulk_create', side_effect=IntegrityError):
+            self.ns.set_multi(values)
+
+        mock_set.assert_called_once_with('d2502ebbd7df41ceba8d3275595cac33', {'foo': 'bar'})
+
+    @mock.patch('sentry.utils.metrics.timing')
+    def test_instrumentation(self, mock_timing):
+        self.ns.get_multi(['d2502ebbd7df41ceba8d3275595cac33', '5394aa025b8e401ca6bc3ddee3130edc'])
+
+        mock_timing.assert_any_call('nodestore.get_multi.size', 2, instance='DjangoNodeStorage')
+        assert mock_timing.call_args[0][0] == 'nodestore.get_multi'
+
     def test_create(self):
         node_id = self.ns.create({
             'foo': 'bar',
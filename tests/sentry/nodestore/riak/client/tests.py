@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from sentry.nodestore.riak.client import RiakClient
+from sentry.testutils import TestCase
+
+
+class RiakClientTest(TestCase):
+    def setUp(self):
+        self.client = RiakClient(multiget_pool_size=2)
+        self.client.manager = mock.Mock()
+
+    def test_multiget(self):
+        self.client.manager.urlopen.side_effect = lambda method, url, **kwargs: (method, url)
+
+        assert self.client.multiget('nodes', ['a', 'b'], r=1) == {
+            'a': ('GET', '/buckets/nodes/keys/a?r=1'),
+            'b': ('GET', '/buckets/nodes/keys/b?r=1'),
+        }
+
+    def test_multiput(self):
+        self.client.manager.urlopen.return_value = 'ok'
+
+        assert self.client.multiput('nodes', {'a': '{}', 'b': '[]'}) == {
+            'a': 'ok',
+            'b': 'ok',
+        }
+
+        calls = sorted(self.client.manager.urlopen.call_args_list)
+        assert calls == [
+            mock.call('PUT', '/buckets/nodes/keys/a', body='{}', headers={
+                'content-type': 'application/json',
+            }),
+            mock.call('PUT', '/buckets/nodes/keys/b', body='[]', headers={
+                'content-type': 'application/json',
+            }),
+        ]
+
+    def test_multidelete_errors(self):
+        error = Exception('Boom!')
+        self.client.manager.urlopen.side_effect = error
+
+        assert self.client.multidelete('nodes', ['a']) == {'a': error}
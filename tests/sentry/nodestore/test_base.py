@@ -4,6 +4,7 @@ from __future__ import absolute_import
 
 from sentry.nodestore.base import NodeStorage
 from sentry.testutils import TestCase
+from sentry.utils import json
 
 
 class NodeStorageTest(TestCase):
@@ -13,3 +14,18 @@ class NodeStorageTest(TestCase):
     def test_generate_id(self):
         result = self.ns.generate_id()
         assert result
+
+    def test_encode(self):
+        assert self.ns.encode({'foo': 'bar'}, json.dumps) == '{"foo":"bar"}'
+
+        ns = NodeStorage(codec={'options': {'compressor': 'zlib'}})
+        value = ns.encode({'foo': 'bar'}, json.dumps)
+        assert ns.codec.is_encoded(value)
+        assert ns.decode(value, json.loads) == {'foo': 'bar'}
+
+    def test_decode(self):
+        value = NodeStorage(codec={}).encode({'foo': 'bar'}, json.dumps)
+
+        # values written by a codec stay readable without one
+        assert self.ns.decode(value, json.loads) == {'foo': 'bar'}
+        assert self.ns.decode('{"foo":"bar"}', json.loads) == {'foo': 'bar'}
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+import os
+import pytest
+import six
+import shutil
+import tempfile
+
+from sentry.nodestore.codecs import CodecError, HEADER, NodeCodec, load
+from sentry.testutils import TestCase
+from sentry.utils import json
+from sentry.utils.settings import ConfigurationError
+
+
+class NodeCodecTest(TestCase):
+    data = {
+        'platform': 'python',
+        'message': u'h\xe9llo',
+        'tags': [['foo', 'bar']],
+        'extra': {'count': 1, 'ratio': 0.5, 'missing': None},
+    }
+
+    def test_round_trip(self):
+        for serializer in ('json', 'msgpack'):
+            for compressor in ('none', 'zlib', 'zstd'):
+                codec = NodeCodec(serializer=serializer, compressor=compressor)
+                value = codec.encode(self.data)
+                assert codec.is_encoded(value)
+                assert codec.decode(value) == self.data
+
+    def test_decode_with_other_configuration(self):
+        value = NodeCodec(serializer='msgpack', compressor='zlib').encode(self.data)
+        assert NodeCodec(serializer='json', compressor='none').decode(value) == self.data
+
+    def test_legacy_values(self):
+        codec = NodeCodec()
+        assert not codec.is_encoded(None)
+        assert not codec.is_encoded(json.dumps(self.data))
+
+        with pytest.raises(CodecError):
+            codec.decode(json.dumps(self.data))
+
+    def test_unsupported_version(self):
+        codec = NodeCodec()
+        value = codec.encode(self.data)
+        value = value[:1] + b'\x02' + value[2:]
+
+        with pytest.raises(CodecError):
+            codec.decode(value)
+
+    def test_dictionary(self):
+        import zstandard
+
+        samples = [
+            NodeCodec(compressor='none').encode(dict(self.data, event_id=i))[HEADER.size:]
+            for i in range(1000)
+        ]
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'python.dict')
+            dictionary = zstandard.train_dictionary(1024, samples)
+            with open(path, 'wb') as f:
+                f.write(dictionary.as_bytes())
+
+            codec = NodeCodec(dictionaries={'python': path})
+            value = codec.encode(self.data)
+            assert HEADER.unpack_from(value)[4] == dictionary.dict_id()
+            assert codec.decode(value) == self.data
+
+            # the dictionary is only used for the platform it was configured for
+            other = dict(self.data, platform='javascript')
+            assert HEADER.unpack_from(codec.encode(other))[4] == 0
+
+            with pytest.raises(CodecError):
+                NodeCodec().decode(value)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_load(self):
+        assert load(None) is None
+
+        codec = load({'options': {'serializer': 'msgpack'}})
+        assert isinstance(codec, NodeCodec)
+        assert codec.decode(codec.encode(self.data)) == self.data
+
+    def test_missing_dependency(self):
+        with mock.patch.dict('sys.modules', {'msgpack': None}):
+            with pytest.raises(ConfigurationError) as excinfo:
+                NodeCodec(serializer='msgpack')
+        assert 'msgpack' in six.text_type(excinfo.value)
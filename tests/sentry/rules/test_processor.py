@@ -2,13 +2,20 @@
 
 from __future__ import absolute_import
 
+import mock
+import re
+
 from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from sentry.models import GroupRuleStatus, Rule
+from sentry.models import GroupRuleStatus, Rule, RuleStatus
 from sentry.plugins import plugins
 from sentry.testutils import TestCase
-from sentry.rules.processor import EventCompatibilityProxy, RuleProcessor
+from sentry.utils.cache import cache
+from sentry.rules.conditions.event_frequency import EventFrequencyCondition
+from sentry.rules.processor import EventCompatibilityProxy, RuleProcessor, get_rule_set
 
 
 class RuleProcessorTest(TestCase):
@@ -54,6 +61,105 @@ class RuleProcessorTest(TestCase):
         results = list(rp.apply())
         assert len(results) == 1
 
+    def create_rules(self, project, count, conditions):
+        Rule.objects.filter(project=project).delete()
+        return [
+            Rule.objects.create(
+                project=project,
+                data={
+                    'conditions': conditions,
+                    'actions': [{
+                        'id': 'sentry.rules.actions.notify_event.NotifyEventAction',
+                    }],
+                },
+            ) for _ in range(count)
+        ]
+
+    def test_rule_statuses_are_batched(self):
+        event = self.create_event()
+        rule_list = self.create_rules(event.project, 10, [{
+            'id': 'sentry.rules.conditions.every_event.EveryEventCondition',
+        }])
+        rp = RuleProcessor(event, is_new=True, is_regression=True, is_new_group_environment=True)
+
+        def get_queries(*tables):
+            with CaptureQueriesContext(connection) as context:
+                results = list(rp.apply())
+            queries = [
+                re.search(r'(SELECT|INSERT|UPDATE)', query['sql']).group(1)
+                for query in context.captured_queries
+                if any('"{}"'.format(table) in query['sql'] for table in tables)
+            ]
+            return results, queries
+
+        # the rules, the statuses, a single insert of the missing statuses
+        # and one update per applied rule
+        results, queries = get_queries('sentry_rule', 'sentry_grouprulestatus')
+        assert queries == ['SELECT', 'SELECT', 'INSERT'] + ['UPDATE'] * len(rule_list)
+        assert len(results) == 1
+        assert len(results[0][1]) == len(rule_list)
+        assert set(GroupRuleStatus.objects.filter(
+            group=event.group,
+            last_active__isnull=False,
+        ).values_list('rule', flat=True)) == set(r.id for r in rule_list)
+
+        # the compiled rules are reused and existing statuses are read with
+        # a single query
+        with self.assertNumQueries(1):
+            assert list(rp.apply()) == []
+
+    def test_rule_set_is_invalidated_on_save(self):
+        event = self.create_event()
+        rule, = self.create_rules(event.project, 1, [{
+            'id': 'sentry.rules.conditions.every_event.EveryEventCondition',
+        }])
+
+        rule_set = get_rule_set(event.project)
+        assert [c.rule for c in rule_set] == [rule]
+        assert get_rule_set(event.project) is rule_set
+
+        rule.data['conditions'] = []
+        rule.save()
+        assert get_rule_set(event.project) == []
+
+    def test_rule_set_is_invalidated_on_update(self):
+        event = self.create_event()
+        rule, = self.create_rules(event.project, 1, [{
+            'id': 'sentry.rules.conditions.every_event.EveryEventCondition',
+        }])
+        assert [c.rule for c in get_rule_set(event.project)] == [rule]
+
+        rule.update(status=RuleStatus.PENDING_DELETION)
+        assert get_rule_set(event.project) == []
+
+    def test_rule_set_follows_cached_rules(self):
+        event = self.create_event()
+        rule, = self.create_rules(event.project, 1, [{
+            'id': 'sentry.rules.conditions.every_event.EveryEventCondition',
+        }])
+        assert [c.rule for c in get_rule_set(event.project)] == [rule]
+
+        # a queryset update does not clear the cached rules, the compiled
+        # rules change once the cached rules expire
+        Rule.objects.filter(id=rule.id).update(label='renamed')
+        assert get_rule_set(event.project)[0].rule.label == rule.label
+        cache.delete('project:{}:rules'.format(event.project.id))
+        assert get_rule_set(event.project)[0].rule.label == 'renamed'
+
+    def test_frequency_conditions_are_shared(self):
+        event = self.create_event()
+        self.create_rules(event.project, 5, [{
+            'id': 'sentry.rules.conditions.event_frequency.EventFrequencyCondition',
+            'interval': '1h',
+            'value': 0,
+        }])
+        rp = RuleProcessor(event, is_new=True, is_regression=True, is_new_group_environment=True)
+
+        with mock.patch.object(EventFrequencyCondition, 'query', return_value=1) as query:
+            results = list(rp.apply())
+        assert query.call_count == 1
+        assert len(results[0][1]) == 5
+
 
 class EventCompatibilityProxyTest(TestCase):
     def test_simple(self):
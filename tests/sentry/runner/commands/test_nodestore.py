@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from sentry import nodestore
+from sentry.runner.commands.nodestore import get_sample, migrate
+from sentry.testutils import CliTestCase
+
+
+class NodestoreMigrateTest(CliTestCase):
+    command = migrate
+
+    def setUp(self):
+        self.events = [
+            self.create_event(group=self.group, message='hello world'),
+            self.create_event(group=self.group, message='jello world'),
+        ]
+
+    def test_skips_missing_nodes(self):
+        missing, present = self.events[0].data.id, self.events[1].data.id
+        nodes = {missing: None, present: {'message': 'jello world'}}
+
+        with mock.patch.object(nodestore.backend, 'get_multi', return_value=nodes), \
+                mock.patch.object(nodestore.backend, 'set_multi') as set_multi, \
+                mock.patch.object(nodestore.backend, 'codec', mock.Mock()):
+            rv = self.invoke()
+
+        assert rv.exit_code == 0, rv.output
+        set_multi.assert_called_once_with({present: {'message': 'jello world'}})
+        assert 'Migrated 1 nodes.' in rv.output
+
+    def test_sample_reads_stored_data(self):
+        sample = dict(get_sample(10, self.project.id))
+        node = self.events[1].data
+        assert sample[node.id]['_ref'] == node.get_ref(self.events[1])
+        assert sample[node.id]['sentry.interfaces.Message'] == \
+            node['sentry.interfaces.Message']
+
+    def test_requires_codec(self):
+        with mock.patch.object(nodestore.backend, 'codec', None):
+            rv = self.invoke()
+        assert rv.exit_code != 0
+        assert 'does not use a codec' in rv.output
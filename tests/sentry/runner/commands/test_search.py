@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from sentry import tagstore
+from sentry.runner.commands.search import rebuild_tag_index
+from sentry.testutils import CliTestCase
+
+
+class RebuildTagIndexTest(CliTestCase):
+    command = rebuild_tag_index
+
+    def test_simple(self):
+        other = self.create_project()
+        with mock.patch.object(tagstore, 'rebuild_search_index') as rebuild:
+            rv = self.invoke('--project={}'.format(other.id))
+        assert rv.exit_code == 0, rv.output
+        assert rebuild.mock_calls == [mock.call(other.id)]
+
+    def test_not_supported(self):
+        rv = self.invoke()
+        assert rv.exit_code != 0
+        assert 'does not keep a search index' in rv.output
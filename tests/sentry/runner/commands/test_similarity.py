@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from sentry import similarity
+from sentry.runner.commands.similarity import backfill, get_checkpoint_key
+from sentry.testutils import CliTestCase
+from sentry.utils.redis import clusters
+
+
+class SimilarityBackfillTest(CliTestCase):
+    command = backfill
+    default_args = ['--concurrency=1', '--batch-size=2']
+
+    def setUp(self):
+        self.group2 = self.create_group(project=self.project)
+        self.events = [
+            self.create_event(group=self.group, message='hello world'),
+            self.create_event(group=self.group2, message='jello world'),
+            self.create_event(group=self.group, message='hello world'),
+        ]
+
+    def invoke(self, *args):
+        with mock.patch.object(similarity.features, 'index') as index:
+            rv = super(SimilarityBackfillTest, self).invoke(*args)
+        assert rv.exit_code == 0, rv.output
+        return [
+            (scope, key, len(items))
+            for call in index.bulk_record.mock_calls
+            for scope, key, items, timestamp in call[1][0]
+        ]
+
+    def get_checkpoint(self):
+        key = get_checkpoint_key(self.project.id)
+        return clusters.get('default').get_local_client_for_key(key).get(key)
+
+    def test_simple(self):
+        scope = '{}'.format(self.project.id)
+        assert self.invoke() == [
+            (scope, '{}'.format(self.group.id), 1),
+            (scope, '{}'.format(self.group2.id), 1),
+            (scope, '{}'.format(self.group.id), 1),
+        ]
+        assert self.get_checkpoint() == '{}'.format(self.events[-1].id)
+
+    def test_resume(self):
+        assert len(self.invoke()) == 3
+        assert self.invoke() == []
+
+        self.create_event(group=self.group2, message='jello world')
+        assert self.invoke() == [
+            ('{}'.format(self.project.id), '{}'.format(self.group2.id), 1),
+        ]
+
+        assert len(self.invoke('--reset')) == 4
+
+    def test_project(self):
+        assert self.invoke('--project={}'.format(self.project.id + 1)) == []
+        assert self.get_checkpoint() is None
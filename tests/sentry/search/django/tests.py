@@ -2,6 +2,8 @@
 
 from __future__ import absolute_import
 
+import mock
+
 from datetime import datetime, timedelta
 
 from sentry import tagstore
@@ -181,6 +183,21 @@ class DjangoSearchBackendTest(TestCase):
         )
         assert len(results) == 0
 
+    def test_tags_hits(self):
+        with mock.patch.object(tagstore, 'get_group_ids_and_hits_for_search_filter',
+                               return_value=([self.group2.id], 5000)):
+            results = self.backend.query(self.project1, tags={'env': ANY}, count_hits=True)
+        # only some of the matches were returned, so the hits are estimated
+        assert list(results) == [self.group2]
+        assert results.hits == 5000
+        assert results.hits_estimated
+
+        with mock.patch.object(tagstore, 'get_group_ids_and_hits_for_search_filter',
+                               return_value=([self.group2.id], 1)):
+            results = self.backend.query(self.project1, tags={'env': ANY}, count_hits=True)
+        assert results.hits == 1
+        assert not results.hits_estimated
+
     def test_bookmarked_by(self):
         results = self.backend.query(self.project1, bookmarked_by=self.user)
         assert len(results) == 1
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from sentry import search
+from sentry.event_manager import EventManager
+from sentry.search.redis.backend import RedisSearchBackend, get_trigrams
+from sentry.testutils import TestCase
+
+from tests.sentry.search.django.tests import DjangoSearchBackendTest
+
+
+class RedisSearchBackendTest(DjangoSearchBackendTest):
+    def create_backend(self):
+        return RedisSearchBackend()
+
+    def setUp(self):
+        super(RedisSearchBackendTest, self).setUp()
+        self.backend.rebuild_index(self.project1)
+        self.backend.rebuild_index(self.project2)
+
+
+class RedisSearchIndexTest(TestCase):
+    def setUp(self):
+        self.backend = RedisSearchBackend()
+
+    def search(self, query):
+        return list(self.backend.query(self.project, query=query))
+
+    def test_get_trigrams(self):
+        assert get_trigrams('FOO bar') == {'foo', 'oo ', 'o b', ' ba', 'bar'}
+        assert get_trigrams(u'Ärger') == {u'ärg', u'rge', u'ger'}
+        assert get_trigrams('ab') == set()
+
+    def test_index_group(self):
+        group = self.create_group(message='hello world', culprit='foo.bar in baz')
+        self.backend.rebuild_index(self.project)
+
+        other = self.create_group(message='hello world', culprit='foo.bar in baz')
+        assert self.search('hello') == [group]
+        assert self.search('bar in') == [group]
+
+        self.backend.index_group(other)
+        assert set(self.search('hello')) == {group, other}
+
+        # the new message is indexed before it is stored
+        self.backend.index_group(group, message='goodbye world')
+        assert self.search('goodbye') == []
+        group.update(message='goodbye world')
+        assert self.search('goodbye') == [group]
+        assert self.search('hello') == [other]
+
+    def test_incomplete_index(self):
+        group = self.create_group(message='hello world')
+        assert self.search('hello') == [group]
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') is None
+
+    def test_project_without_first_event(self):
+        group = self.create_group(message='hello world')
+        assert not self.project.first_event
+
+        # a project with other groups is incomplete until it is rebuilt
+        other = self.create_group(message='hello world')
+        self.backend.index_group(other)
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') is None
+
+        self.backend.rebuild_index(self.project)
+        assert set(self.backend._get_group_ids_for_query(self.project, 'hello')) \
+            == {group.id, other.id}
+
+    def test_first_group(self):
+        group = self.create_group(message='hello world')
+        self.backend.index_group(group)
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') == [group.id]
+
+    def test_unindex_group(self):
+        group = self.create_group(message='hello world')
+        other = self.create_group(message='hello world')
+        self.backend.rebuild_index(self.project)
+
+        self.backend.unindex_group(group)
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') == [other.id]
+
+    def test_delete_index(self):
+        self.create_group(message='hello world')
+        self.backend.rebuild_index(self.project)
+
+        self.backend.delete_index(self.project)
+        client = self.backend._get_client(self.project.id)
+        assert list(client.scan_iter(u'si:{}:*'.format(self.project.id))) == []
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') is None
+
+    def test_short_query(self):
+        group = self.create_group(message='hello world')
+        self.backend.rebuild_index(self.project)
+        assert self.backend._get_group_ids_for_query(self.project, 'he') is None
+        assert self.search('he') == [group]
+
+    def test_max_candidates(self):
+        self.backend.max_candidates = 1
+        groups = [self.create_group(message='hello world') for i in range(2)]
+        self.backend.rebuild_index(self.project)
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') is None
+        assert set(self.search('hello')) == set(groups)
+
+    def test_rebuild_index_reset(self):
+        group = self.create_group(message='hello world')
+        self.backend.rebuild_index(self.project)
+        group.update(message='goodbye world')
+        self.backend.rebuild_index(self.project, reset=True)
+        assert self.backend._get_group_ids_for_query(self.project, 'hello') == []
+        assert self.backend._get_group_ids_for_query(self.project, 'goodbye') == [group.id]
+
+    def test_event_manager(self):
+        project = self.create_project()
+
+        def save(message):
+            manager = EventManager({
+                'message': message,
+                'fingerprint': ['group1'],
+                'tags': [],
+            })
+            manager.normalize()
+            return manager.save(project.id)
+
+        with mock.patch.object(search.backend, '_wrapped', self.backend):
+            group = save('hello world').group
+            assert self.backend._get_group_ids_for_query(project, 'hello') == [group.id]
+
+            save('goodbye world')
+            assert self.backend._get_group_ids_for_query(project, 'goodbye') == [group.id]
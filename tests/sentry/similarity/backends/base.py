@@ -80,6 +80,20 @@ class MinHashIndexBackendTestMixin(object):
                 for key, _ in self.index.compare('example', '1', [('index',
                                                                    0)])] == ['1', '2', '4', '5']
 
+    def test_bulk_record(self):
+        self.index.bulk_record([
+            ('example', '1', [('index', 'hello world')], None),
+            ('example', '2', [('index', 'hello world')], None),
+            ('example', '3', [], None),
+            ('other', '1', [('index', 'jello world')], None),
+        ])
+
+        assert self.index.compare('example', '1', [('index', 0)]) == [
+            ('1', [1.0]),
+            ('2', [1.0]),
+        ]
+        assert self.index.compare('other', '1', [('index', 0)]) == [('1', [1.0])]
+
     def test_multiple_index(self):
         self.index.record('example', '1', [
             ('index:a', 'hello world'),
@@ -4,11 +4,13 @@ import time
 
 import msgpack
 from exam import fixture
+from mock import Mock, patch
 
 from sentry.similarity.backends.redis import RedisScriptMinHashIndexBackend
 from sentry.similarity.signatures import MinHashSignatureBuilder
 from sentry.testutils import TestCase
 from sentry.utils import redis
+from sentry.utils.redis import RetryingStrictRedisCluster
 
 from .base import MinHashIndexBackendTestMixin
 
@@ -49,3 +51,42 @@ class RedisScriptMinHashIndexBackendTestCase(MinHashIndexBackendTestMixin, TestC
 
         result = self.index.export('example', [('index', 2)], timestamp=timestamp)
         assert len(result) == 1
+
+    def test_bulk_record_timestamps(self):
+        timestamp = int(time.time())
+        self.index.bulk_record([
+            ('example', '1', [('index', 'hello world')], timestamp),
+            ('example', '2', [('index', 'hello world')], timestamp - 60 * 60 * 24),
+        ])
+
+        assert self.index.compare('example', '1', [('index', 0)], timestamp=timestamp) == [
+            ('1', [1.0]),
+        ]
+
+    def test_bulk_record_redis_cluster(self):
+        cluster = Mock(spec=RetryingStrictRedisCluster)
+        index = RedisScriptMinHashIndexBackend(
+            cluster,
+            'sim',
+            signature_builder,
+            16,
+            60 * 60,
+            12,
+            10,
+        )
+
+        with patch('sentry.similarity.backends.redis.index') as script:
+            index.bulk_record([
+                ('example', '1', [('index', 'hello world')], None),
+                ('example', '2', [('index', 'hello world')], None),
+                ('example', '3', [], None),
+                ('other', '1', [('index', 'jello world')], None),
+            ])
+
+        # one call per scope, as the keys of a scope share a hash slot
+        assert [(client, keys, args[0], args[8::(3 + 1 + 16 * 3)])
+                for (client, keys, args), _ in script.call_args_list] == [
+            (cluster, ['example'], 'BULK_RECORD', ['1', '2']),
+            (cluster, ['other'], 'BULK_RECORD', ['1']),
+        ]
+        assert not cluster.pipeline.called
@@ -1,9 +1,15 @@
 from __future__ import absolute_import
 
+import os
+import random
+
 from collections import Counter
 from unittest import TestCase
 
-from sentry.similarity.signatures import MinHashSignatureBuilder
+from sentry.similarity.signatures import (
+    MinHashSignatureBuilder,
+    VectorizedMinHashSignatureBuilder,
+)
 
 
 class MinHashSignatureBuilderTestCase(TestCase):
@@ -38,3 +44,22 @@ class MinHashSignatureBuilderTestCase(TestCase):
             estimation,
             delta=0.1,  # totally made up constant, seems reasonable
         )
+
+
+class VectorizedMinHashSignatureBuilderTestCase(TestCase):
+    def test_signatures_are_identical(self):
+        scalar = MinHashSignatureBuilder(16, 0xFFFF)
+        vectorized = VectorizedMinHashSignatureBuilder(16, 0xFFFF)
+
+        rng = random.Random(1)
+        for features, length in ((200, 5), (50, 12), (20, 200), (3, 2), (1, 0)):
+            for _ in range(20):
+                values = [os.urandom(rng.randint(0, length)) for _ in range(features)]
+                assert vectorized(values) == scalar(values)
+
+        assert vectorized(u'hello w\xf6rld'.split()) == \
+            scalar([v.encode('utf8') for v in u'hello w\xf6rld'.split()])
+        assert vectorized(set(['foo', 'bar', 'baz'])) == scalar(set(['foo', 'bar', 'baz']))
+
+        with self.assertRaises(ValueError):
+            vectorized([])
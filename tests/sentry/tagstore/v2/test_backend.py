@@ -1,11 +1,13 @@
 from __future__ import absolute_import
 
+import mock
 import pytest
 
 from collections import OrderedDict
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.utils import timezone
 
-from sentry.search.base import ANY
+from sentry.search.base import ANY, EMPTY
 from sentry.testutils import TestCase
 from sentry.tagstore import TagKeyStatus
 from sentry.tagstore.v2.backend import V2TagStorage
@@ -659,6 +661,110 @@ class TagStorage(TestCase):
             limit=2
         )) == 2
 
+    def test_get_group_ids_for_search_filter_with_index(self):
+        ts = V2TagStorage(search_index_cluster='default')
+        now = timezone.now()
+
+        # the groups are seen from the oldest to the most recent one
+        for i in range(4):
+            for k, v in (('foo', 'bar'), ('divides', 'even' if i % 2 == 0 else 'odd')):
+                ts.incr_group_tag_value_times_seen(
+                    self.proj1.id, i, self.proj1env1.id, k, v,
+                    extra={'last_seen': now + timedelta(minutes=i)},
+                )
+        ts.incr_group_tag_value_times_seen(
+            self.proj1.id, 4, self.proj1env2.id, 'foo', 'bar',
+            extra={'last_seen': now + timedelta(minutes=4)},
+        )
+
+        search = ts.get_group_ids_for_search_filter
+        assert search(self.proj1.id, self.proj1env1.id,
+                      {'foo': 'bar', 'divides': 'even'}) == [2, 0]
+        assert search(self.proj1.id, self.proj1env1.id,
+                      {'foo': ANY, 'divides': 'odd'}) == [3, 1]
+        # the most recently seen matches are returned, and all are counted
+        assert search(self.proj1.id, self.proj1env1.id,
+                      {'foo': 'bar'}, limit=2) == [3, 2]
+        assert ts.get_group_ids_and_hits_for_search_filter(
+            self.proj1.id, self.proj1env1.id, {'foo': 'bar'}, limit=2) == ([3, 2], 4)
+        assert search(self.proj1.id, self.proj1env2.id, {'foo': ANY}) == [4]
+        assert search(self.proj1.id, None, {'foo': 'bar'}) == [4, 3, 2, 1, 0]
+        assert search(self.proj1.id, self.proj1env1.id, {'foo': 'baz'}) is None
+        assert search(self.proj1.id, self.proj1env1.id, {'foo': EMPTY}) is None
+        assert search(self.proj2.id, None, {'foo': 'bar'}) is None
+
+    def test_incr_group_tag_values_times_seen(self):
+        ts = V2TagStorage(search_index_cluster='default')
+        tags = [('foo', 'bar'), ('baz', 'qux')]
+
+        with mock.patch.object(ts.search_index, 'record', wraps=ts.search_index.record) \
+                as record, mock.patch('sentry.tagstore.v2.backend.buffer') as buffer:
+            ts.incr_group_tag_values_times_seen(
+                self.proj1.id, self.proj1group1.id, self.proj1env1.id, tags)
+
+        # the index is written once, the counters of every environment are
+        # incremented for each tag
+        assert record.call_count == 1
+        assert buffer.incr.call_count == 4
+        assert ts.get_group_ids_for_search_filter(
+            self.proj1.id, self.proj1env1.id, dict(tags)) == [self.proj1group1.id]
+
+    def test_rebuild_search_index(self):
+        ts = V2TagStorage(search_index_cluster='default')
+        self.ts.get_or_create_group_tag_value(
+            self.proj1.id, self.proj1group1.id, self.proj1env1.id, 'foo', 'bar')
+        tags = {'foo': 'bar'}
+
+        assert ts.get_group_ids_for_search_filter(self.proj1.id, self.proj1env1.id, tags) is None
+        ts.rebuild_search_index(self.proj1.id)
+        assert ts.get_group_ids_for_search_filter(
+            self.proj1.id, self.proj1env1.id, tags) == [self.proj1group1.id]
+
+    def test_search_index_merge_group(self):
+        ts = V2TagStorage(search_index_cluster='default')
+        now = timezone.now()
+        ts.incr_group_tag_value_times_seen(
+            self.proj1.id, 1, self.proj1env1.id, 'foo', 'bar', extra={'last_seen': now})
+        ts.incr_group_tag_value_times_seen(
+            self.proj1.id, 2, self.proj1env1.id, 'foo', 'baz', extra={'last_seen': now})
+        ts.incr_group_tag_value_times_seen(
+            self.proj1.id, 3, self.proj1env1.id, 'foo', 'bar',
+            extra={'last_seen': now + timedelta(minutes=1)})
+
+        ts.merge_group_search_index(self.proj1.id, 1, 2)
+
+        search = ts.get_group_ids_for_search_filter
+        assert search(self.proj1.id, self.proj1env1.id, {'foo': 'bar'}) == [3, 2]
+        assert search(self.proj1.id, self.proj1env1.id, {'foo': 'baz'}) == [2]
+        assert search(self.proj1.id, None, {'foo': ANY}) == [3, 2]
+
+    def test_search_index_delete_group(self):
+        ts = V2TagStorage(search_index_cluster='default')
+        for group in (self.proj1group1, self.proj1group2):
+            ts.incr_group_tag_value_times_seen(
+                self.proj1.id, group.id, self.proj1env1.id, 'foo', 'bar')
+
+        ts.delete_all_group_tag_values(self.proj1.id, self.proj1group1.id)
+        assert ts.get_group_ids_for_search_filter(
+            self.proj1.id, self.proj1env1.id, {'foo': 'bar'}) == [self.proj1group2.id]
+
+        ts.delete_group_search_index(self.proj1.id, self.proj1group2.id)
+        assert ts.get_group_ids_for_search_filter(
+            self.proj1.id, self.proj1env1.id, {'foo': 'bar'}) is None
+
+    def test_search_index_delete_tag_key(self):
+        ts = V2TagStorage(search_index_cluster='default')
+        ts.incr_group_tag_value_times_seen(
+            self.proj1.id, self.proj1group1.id, self.proj1env1.id, 'foo', 'bar')
+        ts.incr_group_tag_value_times_seen(
+            self.proj1.id, self.proj1group1.id, self.proj1env1.id, 'baz', 'qux')
+
+        ts.delete_tag_key(self.proj1.id, 'foo')
+        search = ts.get_group_ids_for_search_filter
+        assert search(self.proj1.id, self.proj1env1.id, {'foo': 'bar'}) is None
+        assert search(self.proj1.id, None, {'foo': ANY}) is None
+        assert search(self.proj1.id, None, {'baz': 'qux'}) == [self.proj1group1.id]
+
     def test_update_group_for_events(self):
         v1, _ = self.ts.get_or_create_tag_value(self.proj1.id, self.proj1env1.id, 'k1', 'v1')
         v2, _ = self.ts.get_or_create_tag_value(self.proj1.id, self.proj1env1.id, 'k2', 'v2')
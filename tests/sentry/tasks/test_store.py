@@ -5,9 +5,13 @@ import uuid
 from time import time
 
 from sentry import quotas, tsdb
+from sentry.cache import default_cache
 from sentry.event_manager import EventManager, HashDiscarded
+from sentry.models import Event
 from sentry.plugins import Plugin2
-from sentry.tasks.store import preprocess_event, process_event, save_event
+from sentry.tasks.store import (
+    _queue_save_event, preprocess_event, process_event, save_event, save_events
+)
 from sentry.testutils import PluginTestCase
 from sentry.utils.dates import to_datetime
 
@@ -200,3 +204,54 @@ class StoreTasksTest(PluginTestCase):
             ],
                 timestamp=to_datetime(now),
             )
+
+    def test_save_events_stores_queued_batches(self):
+        project = self.create_project()
+
+        event_ids = []
+        for i in range(3):
+            manager = EventManager({
+                'project': project.id,
+                'platform': 'python',
+                'message': 'test',
+                'event_id': uuid.uuid4().hex,
+            })
+            manager.normalize()
+            default_cache.set('e:{}'.format(i), manager.data, 3600)
+            event_ids.append(manager.data['event_id'])
+
+        save_many = EventManager.save_many
+        with self.settings(SENTRY_SAVE_EVENT_BATCH_SIZE=2), \
+                mock.patch.object(save_events, 'delay') as mock_delay, \
+                mock.patch.object(save_event, 'delay') as mock_save_event, \
+                mock.patch.object(EventManager, 'save_many', side_effect=save_many) \
+                as mock_save_many:
+            for i, event_id in enumerate(event_ids):
+                _queue_save_event(
+                    cache_key='e:{}'.format(i), data=None, start_time=time(),
+                    event_id=event_id, project_id=project.id
+                )
+
+            assert not mock_save_event.called
+            # the queue was empty and a batch was filled
+            assert mock_delay.call_count == 2
+
+            save_events(project_id=project.id)
+            assert mock_delay.call_count == 3
+            save_events(project_id=project.id)
+            assert mock_delay.call_count == 3
+
+        assert [len(c[0][1]) for c in mock_save_many.call_args_list] == [2, 1]
+        assert set(
+            Event.objects.filter(project_id=project.id).values_list('event_id', flat=True)
+        ) == set(event_ids)
+        assert default_cache.get('e:0') is None
+
+    @mock.patch('sentry.tasks.store.save_event')
+    def test_queue_save_event_without_batching(self, mock_save_event):
+        _queue_save_event(
+            cache_key='e:1', data=None, start_time=1, event_id=None, project_id=1
+        )
+        mock_save_event.delay.assert_called_once_with(
+            cache_key='e:1', data=None, start_time=1, event_id=None, project_id=1
+        )
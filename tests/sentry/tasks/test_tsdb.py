@@ -0,0 +1,13 @@
+from __future__ import absolute_import
+
+import mock
+
+from sentry.tasks.tsdb import compact_rollups
+from sentry.testutils import TestCase
+
+
+class CompactRollupsTest(TestCase):
+    @mock.patch('sentry.tsdb.backend.compact_rollups')
+    def test_calls_backend(self, mock_compact_rollups):
+        compact_rollups()
+        mock_compact_rollups.assert_called_once_with()
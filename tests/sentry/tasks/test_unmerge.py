@@ -21,6 +21,7 @@ from sentry.models import (
     Activity, Environment, EnvironmentProject, Event, EventMapping, Group, GroupHash, GroupRelease,
     Release, UserReport
 )
+from sentry.search.redis.backend import RedisSearchBackend
 from sentry.similarity import features, _make_index_backend
 from sentry.tasks.unmerge import (
     get_caches, get_event_user_from_interface, get_fingerprint, get_group_backfill_attributes,
@@ -712,3 +713,59 @@ class UnmergeTestCase(TestCase):
         )
         assert destination_similar_items[1][0] == source.id
         assert destination_similar_items[1][1]['message:message:character-shingles'] < 1.0
+
+    def test_unmerge_indexes_new_message(self):
+        source = self.create_group(self.project, message='hello world')
+        Environment.get_or_create(self.project, 'production')
+        now = timezone.now().replace(microsecond=0)
+        events = [
+            self.create_event(
+                group=source,
+                message=message,
+                datetime=now + timedelta(seconds=i),
+                data={
+                    'environment': 'production',
+                    'sentry.interfaces.Message': {'message': message},
+                    'tags': [['environment', 'production']],
+                },
+            ) for i, message in enumerate(['hello world', 'goodbye world'])
+        ]
+        fingerprints = [get_fingerprint(event) for event in events]
+        for fingerprint in fingerprints:
+            GroupHash.objects.create(
+                project=self.project,
+                group=source,
+                hash=fingerprint,
+            )
+
+        backend = RedisSearchBackend()
+        backend.rebuild_index(self.project)
+
+        def search(query):
+            return set(backend.query(self.project, query=query))
+
+        assert search('goodbye') == set()
+
+        # unmerging the older event leaves the newer message on the source
+        with self.tasks(), \
+                patch('sentry.tasks.unmerge.search', backend), \
+                patch('sentry.tasks.unmerge.features'):
+            unmerge.delay(
+                self.project.id,
+                source.id,
+                None,
+                [fingerprints[0]],
+                None,
+                batch_size=5,
+            )
+
+        destination = Group.objects.get(
+            id=Activity.objects.get(
+                group_id=source.id,
+                type=Activity.UNMERGE_SOURCE,
+            ).data['destination_id'],
+        )
+
+        assert Group.objects.get(id=source.id).message == 'goodbye world'
+        assert search('goodbye') == {source}
+        assert search('hello') >= {destination}
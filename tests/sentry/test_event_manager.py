@@ -9,6 +9,7 @@ import uuid
 
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.db import IntegrityError
 from django.utils import timezone
 from time import time
 
@@ -1135,6 +1136,128 @@ class EventManagerTest(TransactionTestCase):
         )
         manager.normalize()
 
+    def make_batch(self, count, **kwargs):
+        rv = []
+        for i in range(count):
+            manager = EventManager(self.make_event(event_id=uuid.uuid4().hex, **kwargs))
+            manager.normalize()
+            rv.append(manager.data)
+        return rv
+
+    def test_save_many(self):
+        project = self.create_project()
+        batch = self.make_batch(
+            3,
+            release='1.0',
+            environment='production',
+            **{'sentry.interfaces.User': {'id': '1'}}
+        )
+
+        with self.tasks():
+            events = EventManager.save_many(project.id, batch)
+
+        assert len(events) == 3
+        assert all(e.id is not None for e in events)
+        assert len(set(e.group_id for e in events)) == 1
+        assert [e.event_id for e in events] == [d['event_id'] for d in batch]
+        assert Event.objects.filter(project_id=project.id).count() == 3
+
+        group = Group.objects.get(id=events[0].group_id)
+        assert group.times_seen == 3
+        assert group.first_release.version == '1.0'
+
+        assert Release.objects.filter(version='1.0').count() == 1
+        assert EventUser.objects.filter(project_id=project.id).count() == 1
+        assert GroupEnvironment.objects.filter(group_id=group.id).count() == 1
+
+    def test_save_many_resolves_environments_once(self):
+        project = self.create_project()
+        batch = self.make_batch(2, environment='production') + \
+            self.make_batch(1, environment='staging')
+
+        with mock.patch.object(Environment, 'get_or_create', wraps=Environment.get_or_create) \
+                as mock_get_or_create:
+            events = EventManager.save_many(project.id, batch)
+
+        assert mock_get_or_create.call_count == 2
+        assert set(
+            Environment.objects.filter(
+                id__in=GroupEnvironment.objects.filter(
+                    group_id=events[0].group_id,
+                ).values_list('environment_id', flat=True),
+            ).values_list('name', flat=True)
+        ) == {'production', 'staging'}
+
+    def test_save_many_matches_existing_group(self):
+        project = self.create_project()
+        manager = EventManager(self.make_event(event_id=uuid.uuid4().hex))
+        manager.normalize()
+        event = manager.save(project.id)
+
+        events = EventManager.save_many(project.id, self.make_batch(2))
+
+        assert [e.group_id for e in events] == [event.group_id] * 2
+        assert GroupHash.objects.filter(project=project).count() == 1
+
+    def test_save_many_skips_duplicates(self):
+        project = self.create_project()
+        manager = EventManager(self.make_event(event_id='b' * 32))
+        manager.normalize()
+        manager.save(project.id)
+
+        batch = self.make_batch(1)
+        manager = EventManager(self.make_event(event_id='b' * 32))
+        manager.normalize()
+        batch.append(manager.data)
+
+        events = EventManager.save_many(project.id, batch)
+
+        assert len(events) == 2
+        assert Event.objects.filter(project_id=project.id).count() == 2
+
+    @mock.patch('sentry.event_manager.should_sample', mock.Mock(return_value=True))
+    def test_save_many_skips_sampled_duplicates_before_relations(self):
+        project = self.create_project()
+        manager = EventManager(self.make_event(event_id='c' * 32))
+        manager.normalize()
+        event = manager.save(project.id)
+        EventMapping.objects.create(project=project, group=event.group, event_id='d' * 32)
+
+        batch = self.make_batch(1)
+        manager = EventManager(self.make_event(event_id='d' * 32))
+        manager.normalize()
+        batch.append(manager.data)
+
+        save_job_relations = EventManager._save_job_relations
+        with self.feature('projects:sample-events'), \
+                mock.patch.object(EventManager, '_save_job_relations', autospec=True,
+                                  side_effect=save_job_relations) as mock_relations:
+            EventManager.save_many(project.id, batch)
+
+        assert [c[0][1]['event_id'] for c in mock_relations.call_args_list] == \
+            [batch[0]['event_id']]
+        assert EventMapping.objects.filter(project_id=project.id).count() == 2
+
+    def test_save_many_discarded(self):
+        project = self.create_project()
+        batch = self.make_batch(2)
+
+        with mock.patch.object(EventManager, '_save_aggregate', side_effect=HashDiscarded):
+            events = EventManager.save_many(project.id, batch)
+
+        assert events == [None, None]
+        assert not Event.objects.filter(project_id=project.id).exists()
+
+    def test_save_many_bulk_insert_falls_back_on_conflict(self):
+        project = self.create_project()
+        batch = self.make_batch(2)
+
+        with mock.patch.object(Event.objects, 'bulk_create', side_effect=IntegrityError):
+            events = EventManager.save_many(project.id, batch)
+
+        assert all(e.id is not None for e in events)
+        assert Event.objects.filter(project_id=project.id).count() == 2
+
 
 class ProcessTimestampTest(TestCase):
     def test_iso_timestamp(self):
@@ -1,6 +1,118 @@
 from __future__ import absolute_import
 
-from sentry.stacktraces import find_stacktraces_in_data
+import threading
+
+import mock
+import pytest
+
+from sentry.stacktraces import (
+    StacktraceProcessor, find_stacktraces_in_data, local_frame_cache, process_stacktraces
+)
+
+
+class UppercaseProcessor(StacktraceProcessor):
+    def handles_frame(self, frame, stacktrace_info):
+        return True
+
+    def preprocess_frame(self, processable_frame):
+        processable_frame.set_cache_key_from_values([processable_frame['function']])
+
+    def process_frame(self, processable_frame, processing_task):
+        value = processable_frame.cache_value
+        if value is None:
+            value = processable_frame['function'].upper()
+            processable_frame.set_cache_value(value)
+        return [dict(processable_frame.frame, function=value)], None, None
+
+
+class PreprocessingProcessor(StacktraceProcessor):
+    """Handles the frames of one platform, and waits for the preprocess
+    steps of the other processors to start in its own."""
+
+    def __init__(self, data, infos, platform, started, finished):
+        super(PreprocessingProcessor, self).__init__(data, infos, project=object())
+        self.platform = platform
+        self.started = started
+        self.finished = finished
+
+    def handles_frame(self, frame, stacktrace_info):
+        return frame['platform'] == self.platform
+
+    def preprocess_step(self, processing_task):
+        self.started[self.platform].set()
+        for platform, started in self.started.items():
+            if not started.wait(5):
+                raise AssertionError('preprocess steps did not overlap')
+
+        # the native step finishes first
+        if self.platform == 'javascript':
+            self.finished.wait(5)
+        self.data.setdefault('errors', []).append({'type': self.platform})
+        self.data.setdefault('processing_issues', {})[self.platform] = {}
+        self.finished.set()
+        return True
+
+    def process_frame(self, processable_frame, processing_task):
+        return [dict(processable_frame.frame, function=self.platform)], None, None
+
+
+def make_react_native_data():
+    return {
+        'project': 1,
+        'platform': 'javascript',
+        'errors': [{'type': 'js_no_source'}],
+        'sentry.interfaces.Stacktrace': {
+            'frames': [
+                {'function': 'render', 'platform': 'javascript'},
+                {'function': 'objc_msgSend', 'platform': 'native'},
+            ],
+        },
+    }
+
+
+def make_preprocessing_processors(data, infos):
+    started = {'javascript': threading.Event(), 'native': threading.Event()}
+    finished = threading.Event()
+    return [
+        PreprocessingProcessor(data, infos, platform, started, finished)
+        for platform in ('javascript', 'native')
+    ]
+
+
+def test_preprocess_concurrently(settings):
+    settings.SENTRY_STACKTRACE_PREPROCESS_CONCURRENCY = 2
+
+    with mock.patch('sentry.stacktraces.metrics') as metrics:
+        data = process_stacktraces(
+            make_react_native_data(), make_processors=make_preprocessing_processors
+        )
+
+    assert [f['function'] for f in data['sentry.interfaces.Stacktrace']['frames']] == \
+        ['javascript', 'native']
+    # changes are merged in the order of the processors
+    assert data['errors'] == [{'type': 'js_no_source'}, {'type': 'javascript'}, {'type': 'native'}]
+    assert data['processing_issues'] == {'javascript': {}, 'native': {}}
+
+    step = mock.call('stacktraces.preprocess_step', mock.ANY, instance='PreprocessingProcessor')
+    assert metrics.timing.call_args_list == [
+        step,
+        step,
+        mock.call('stacktraces.preprocess', mock.ANY, tags={'concurrent': True}),
+    ]
+
+
+def test_preprocess_concurrently_error(settings):
+    settings.SENTRY_STACKTRACE_PREPROCESS_CONCURRENCY = 2
+
+    def make_processors(data, infos):
+        processors = make_preprocessing_processors(data, infos)
+        processors[1].preprocess_step = mock.Mock(side_effect=ValueError('native'))
+        processors[0].started['native'].set()
+        processors[0].finished.set()
+        return processors
+
+    with pytest.raises(ValueError):
+        process_stacktraces(make_react_native_data(), make_processors=make_processors)
 
 
 def test_stacktraces_basics():
@@ -63,3 +175,51 @@ def test_get_stacktraces_returns_exception_interface():
     infos = find_stacktraces_in_data(data)
     assert len(infos) == 1
     assert len(infos[0].stacktrace['frames']) == 2
+
+
+def test_frame_cache_is_batched():
+    local_frame_cache.clear()
+
+    def make_data():
+        return {
+            'project': 1,
+            'platform': 'python',
+            'sentry.interfaces.Stacktrace': {
+                'frames': [{'function': name} for name in ('foo', 'bar', 'foo')],
+            },
+        }
+
+    def make_processors(data, infos):
+        return [UppercaseProcessor(data, infos, project=object())]
+
+    with mock.patch('sentry.stacktraces.cache') as cache, \
+            mock.patch('sentry.stacktraces.metrics') as metrics:
+        cache.get_many.return_value = {}
+        data = process_stacktraces(make_data(), make_processors=make_processors)
+        assert [f['function'] for f in data['sentry.interfaces.Stacktrace']['frames']] == \
+            ['FOO', 'BAR', 'FOO']
+        assert cache.get_many.call_count == 1
+        assert len(cache.get_many.call_args[0][0]) == 2
+        assert cache.set_many.call_count == 1
+        values, ttl = cache.set_many.call_args[0]
+        assert sorted(values.values()) == ['BAR', 'FOO']
+        assert ttl == 3600
+        metrics.incr.assert_called_with('stacktraces.frame_cache.miss', 3,
+                                        instance='UppercaseProcessor')
+
+        # frames seen before are memoized in the process
+        cache.reset_mock()
+        data = process_stacktraces(make_data(), make_processors=make_processors)
+        assert [f['function'] for f in data['sentry.interfaces.Stacktrace']['frames']] == \
+            ['FOO', 'BAR', 'FOO']
+        assert not cache.get_many.called
+        assert not cache.set_many.called
+        metrics.incr.assert_called_with('stacktraces.frame_cache.hit', 3,
+                                        instance='UppercaseProcessor')
+
+    local_frame_cache.clear()
+
+
+def test_frame_cache_ttl_setting(settings):
+    settings.SENTRY_FRAME_CACHE_TTLS = {'UppercaseProcessor': 60}
+    assert UppercaseProcessor({}, [], project=object()).get_frame_cache_ttl() == 60
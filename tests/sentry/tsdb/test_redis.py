@@ -8,6 +8,7 @@ from datetime import (
     datetime,
     timedelta,
 )
+from mock import patch
 
 from sentry.testutils import TestCase
 from sentry.tsdb.base import TSDBModel, ONE_MINUTE, ONE_HOUR, ONE_DAY
@@ -207,6 +208,169 @@ class RedisTSDBTest(TestCase):
             2: 0,
         }
 
+    def test_scripted_counter_reads(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
+        dts = [now + timedelta(hours=i) for i in range(4)]
+        keys = list(range(1, 50))
+
+        for i, key in enumerate(keys):
+            self.db.incr(TSDBModel.project, key, dts[i % 4], count=i)
+            self.db.incr(TSDBModel.project, key, dts[(i + 1) % 4], environment_id=1)
+
+        def read(**kwargs):
+            return (
+                self.db.get_range(TSDBModel.project, keys, dts[0], dts[-1], **kwargs),
+                self.db.get_sums(TSDBModel.project, keys, dts[0], dts[-1], **kwargs),
+                self.db.get_range(TSDBModel.project, keys, dts[0], dts[-1], rollup=60, **kwargs),
+            )
+
+        expected = read(), read(environment_id=1)
+        assert expected[0][1][10] == 10
+
+        self.db.enable_scripted_counter_reads = True
+        assert (read(), read(environment_id=1)) == expected
+
+        assert self.db.get_range(TSDBModel.project, [], dts[0], dts[-1]) == {}
+        assert self.db.get_sums(TSDBModel.project, [], dts[0], dts[-1]) == {}
+
+    def test_rollup_compaction(self):
+        def make_db(**options):
+            return RedisTSDB(
+                rollups=(
+                    (10, 30),
+                    (ONE_MINUTE, 120),
+                    (ONE_HOUR, 24),
+                ),
+                vnodes=8,
+                hosts={i - 6: {
+                    'db': i
+                } for i in range(6, 9)},
+                **options
+            )
+
+        reference = make_db(prefix='reference:')
+        db = make_db(enable_rollup_compaction=True, compaction_delay=30)
+
+        now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=pytz.UTC)
+        start = now - timedelta(hours=2)
+        models = [TSDBModel.project, TSDBModel.group]
+
+        def incr(timestamp, count=1, environment_id=None):
+            for backend in (reference, db):
+                backend.incr_multi(
+                    [(model, key) for model in models for key in (1, 2, 'foo')],
+                    timestamp, count=count, environment_id=environment_id,
+                )
+
+        def assert_consistent(end):
+            for model in models:
+                for environment_id in (None, 1):
+                    for rollup in (10, ONE_MINUTE, ONE_HOUR):
+                        kwargs = {
+                            'rollup': rollup,
+                            'environment_id': environment_id,
+                        }
+                        assert db.get_range(model, [1, 2, 'foo'], start, end, **kwargs) == \
+                            reference.get_range(model, [1, 2, 'foo'], start, end, **kwargs)
+                        assert db.get_sums(model, [1, 2, 'foo'], start, end, **kwargs) == \
+                            reference.get_sums(model, [1, 2, 'foo'], start, end, **kwargs)
+
+        # the first write initializes the compaction cursor
+        with patch('sentry.tsdb.redis.timezone.now', return_value=now - timedelta(minutes=1)):
+            incr(now - timedelta(minutes=1))
+        assert db.get_compaction_start() == db.normalize_to_epoch(now, 10) - 50
+
+        with patch('sentry.tsdb.redis.timezone.now', return_value=now):
+            incr(now)
+            incr(now - timedelta(seconds=5), count=2, environment_id=1)
+
+            # recent counters are only written to the finest rollup
+            hash_key, _ = db.make_counter_key(TSDBModel.project, ONE_MINUTE, now, 1, None)
+            assert not db.cluster.get_local_client_for_key(hash_key).exists(hash_key)
+
+            # counters which are too late for compaction go to every rollup
+            incr(now - timedelta(minutes=5), count=3)
+
+            db.compact_rollups(now)
+            assert db.get_compaction_cursor() == db.get_compaction_horizon(now)
+            assert_consistent(now)
+
+        later = now + timedelta(minutes=2)
+        with patch('sentry.tsdb.redis.timezone.now', return_value=later):
+            incr(later, count=4)
+            incr(now + timedelta(seconds=5), environment_id=1)
+            assert_consistent(later)
+
+            db.compact_rollups(later)
+            assert db.get_compaction_cursor() == db.get_compaction_horizon(later)
+            assert db.cluster.get_local_client_for_key(hash_key).exists(hash_key)
+            assert_consistent(later)
+
+            # compacting again doesn't change anything
+            db.cluster.get_local_client_for_key(db.get_compaction_cursor_key()).set(
+                db.get_compaction_cursor_key(), db.get_compaction_start())
+            db.compact_rollups(later)
+            assert_consistent(later)
+
+            for backend in (reference, db):
+                backend.merge(TSDBModel.project, 1, [2], later, environment_ids=[1])
+            assert_consistent(later)
+
+            db.compact_rollups(later + timedelta(minutes=1))
+            assert_consistent(later)
+
+            for backend in (reference, db):
+                backend.delete([TSDBModel.group], [1], start, later, environment_ids=[1])
+            assert_consistent(later)
+
+        results = db.get_sums(TSDBModel.project, [1, 2], start, later, rollup=ONE_HOUR)
+        assert results == {1: 24, 2: 0}
+
+    def test_rollup_compaction_only_reads_written_hashes(self):
+        db = RedisTSDB(
+            rollups=(
+                (10, 30),
+                (ONE_MINUTE, 120),
+            ),
+            vnodes=8,
+            hosts={i - 6: {
+                'db': i
+            } for i in range(6, 9)},
+            enable_rollup_compaction=True,
+            compaction_delay=0,
+        )
+
+        now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=pytz.UTC)
+        with patch('sentry.tsdb.redis.timezone.now', return_value=now - timedelta(minutes=1)):
+            db.get_compaction_start()
+
+        with patch('sentry.tsdb.redis.timezone.now', return_value=now):
+            db.incr_multi([(TSDBModel.project, 1), (TSDBModel.group, 'foo')], now, count=2)
+            db.incr(TSDBModel.project, 9, now, environment_id=1)
+
+            # keys 1 and 9 share a vnode
+            epoch = db.normalize_to_epoch(now, 10)
+            sources_key = db.get_compaction_sources_key(epoch, 1)
+            client = db.cluster.get_local_client_for_key(sources_key)
+            assert client.smembers(sources_key) == set([str(TSDBModel.project.value)])
+
+        later = now + timedelta(seconds=10)
+        with patch('sentry.tsdb.redis.timezone.now', return_value=later), \
+                patch.object(db.cluster, 'execute_commands',
+                             wraps=db.cluster.execute_commands) as execute_commands:
+            db.compact_rollups(later)
+            commands, = execute_commands.call_args[0]
+            assert sorted(commands) == sorted([
+                db.make_counter_key(TSDBModel.project, 10, now, 1, None)[0],
+                db.make_counter_key(TSDBModel.group, 10, now, 'foo', None)[0],
+            ])
+            assert not client.exists(sources_key)
+
+            assert db.get_sums(TSDBModel.project, [1, 9], now, later, rollup=ONE_MINUTE) == \
+                {1: 2, 9: 1}
+            assert db.get_sums(TSDBModel.project, [9], now, later, rollup=ONE_MINUTE,
+                               environment_id=1) == {9: 1}
+
     def test_count_distinct(self):
         now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
         dts = [now + timedelta(hours=i) for i in range(4)]
@@ -238,6 +238,11 @@ class StoreViewTest(TestCase):
         resp = self._postWithHeader(body)
         assert resp.status_code == 403, (resp.status_code, resp.content)
 
+    def test_request_too_large(self):
+        with self.settings(SENTRY_MAX_EVENT_PAYLOAD_SIZE=10):
+            resp = self._postWithHeader({'message': 'foo bar'})
+        assert resp.status_code == 413, (resp.status_code, resp.content)
+
     def test_request_with_invalid_ip(self):
         self.project.update_option('sentry:blacklisted_ips', ['127.0.0.1'])
         body = {